@@ -10,6 +10,8 @@ from .utils import *
 from .themes import Theme, Themes
 from .colors import Color, Colors, RGBk
 from .grid import grid, GridLight, Dir, enlighten_grid
+from .aio import AsyncLifxLAN, AsyncGroup, AsyncLight, AsyncDevice, AsyncMultizoneLight, AsyncTileChain
+from .inventory import Inventory
 
 __version__     = '2.1.11'
 __description__ = 'API for local communication with LIFX devices over a LAN.'
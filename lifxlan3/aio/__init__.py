@@ -0,0 +1,4 @@
+from .batch import batch
+from .devices import AsyncDevice, AsyncLight, AsyncMultizoneLight, AsyncTileChain
+from .group import AsyncGroup, AsyncLifxLAN
+from .transport import AsyncTransport, async_transport, get_async_transport
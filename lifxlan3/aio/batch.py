@@ -0,0 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from lifxlan3.network.batch import Batch, _current
+from lifxlan3.network.health import Outcome
+
+__author__ = 'acushner'
+
+
+async def send_and_wait(b: Batch) -> Dict[str, Outcome]:
+    """asyncio version of `Batch.send_and_wait`: await the acks instead of blocking on them"""
+    sent = b.send()
+    acks = [asyncio.wrap_future(o) for _, o in sent if not isinstance(o, Outcome)]
+    if acks:
+        await asyncio.wait(acks)
+    return b.collect(sent)
+
+
+@asynccontextmanager
+async def batch() -> AsyncIterator[Batch]:
+    """
+    asyncio version of `network.batch.batch`, sharing its batches: sync and async set messages
+    inside the `async with` block are sent together on exit, and the acks are awaited
+    """
+    cur = _current.get()
+    if cur is not None:
+        yield cur
+        return
+
+    res = Batch()
+    token = _current.set(res)
+    try:
+        yield res
+    finally:
+        _current.reset(token)
+    await send_and_wait(res)
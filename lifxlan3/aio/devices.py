@@ -0,0 +1,469 @@
+import asyncio
+import os
+from typing import Optional, Dict, List, Tuple, Type
+
+from lifxlan3.base_api import AsyncLightAPI
+from lifxlan3.colors import Color, ColorPower, Colors
+from lifxlan3.devices.device import Device, ProductInfo, DEFAULT_ATTEMPTS
+from lifxlan3.devices.light import Light
+from lifxlan3.devices.multizonelight import MultizoneLight, Zone, ZONES_PER_RESPONSE, rapid_default
+from lifxlan3.devices.products import features_map, product_map, light_products, send_rate_map, DEFAULT_SEND_RATE
+from lifxlan3.devices.tilechain import Tile, TileChain
+from lifxlan3.inventory import device_type
+from lifxlan3.network import network
+from lifxlan3.network.batch import BatchedMessage, current_batch
+from lifxlan3.network.health import Health
+from lifxlan3.network.message import Message
+from lifxlan3.network.msgtypes import Acknowledgement, GetDeviceChain, GetLabel, GetPower, GetTileState64, \
+    GetVersion, LightGet, LightSetColor, LightSetInfrared, LightSetPower, LightSetWaveform, LightState, \
+    MultizoneGetColorZones, MultizoneSetColorZones, MultizoneStateMultizone, MultizoneStateZone, SetLabel, \
+    SetPower, SetTileState64, StateDeviceChain, StateLabel, StatePower, StateTileState64, StateVersion
+from lifxlan3.network.rtt import RttStats
+from lifxlan3.settings import PowerSettings, Waveform
+from lifxlan3.themes import Theme
+from lifxlan3.utils import init_log
+from .batch import batch
+from .transport import AsyncTransport, async_transport
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+
+class AsyncDevice:
+    """
+    asyncio version of `devices.device.Device`
+
+    every request is a coroutine awaiting the transport shared with sync devices, so it's rate limited,
+    coalesced, retransmitted and circuit-broken exactly the same way. nothing here blocks or starts a thread
+    """
+
+    def __init__(self, mac_addr, ip_addr, service=1, port=56700, source_id=os.getpid(), verbose=False):
+        self.verbose = verbose
+        self.mac_addr = mac_addr.lower()
+        self.ip_addr = ip_addr
+        self.service = service
+        self.port = port
+        self.source_id = source_id
+
+        self.label = None
+        self.power_level = None
+        self.product_info = ProductInfo()
+        self._version_received = False  # products missing from `product_map` are still only asked about once
+
+    @classmethod
+    def from_sync(cls, device: Device) -> 'AsyncDevice':
+        """create from a sync `Device`, carrying over whatever state it has already cached"""
+        res = cls(device.mac_addr, device.ip_addr, device.service, device.port, device.source_id, device.verbose)
+        for k in set(vars(res)) & set(vars(device)):
+            setattr(res, k, getattr(device, k))
+        return res
+
+    def to_sync(self) -> Device:
+        """the sync `Device`/`Light`/etc. for this device, with the same cached state"""
+        res = device_type(self.product)(self.mac_addr, self.ip_addr, self.service, self.port, self.source_id,
+                                        self.verbose)
+        for k in set(vars(res)) & set(vars(self)):
+            setattr(res, k, getattr(self, k))
+        return res
+
+    def __hash__(self):
+        return hash(self.mac_addr)
+
+    def __eq__(self, other):
+        return self.mac_addr == other.mac_addr
+
+    def __lt__(self, other: 'AsyncDevice'):
+        return (self.label or '') < (other.label or '')
+
+    def __str__(self):
+        return f'{type(self).__name__}({self.label!r}, {self.mac_addr!r})'
+
+    __repr__ = __str__
+
+    # ==================================================================================================================
+    # DEVICE PROPERTIES
+    # ==================================================================================================================
+
+    @property
+    def product(self):
+        return self.product_info.product
+
+    @property
+    def product_name(self):
+        return product_map.get(self.product)
+
+    @property
+    def product_features(self) -> Dict:
+        """empty until `refresh_version_info` has been awaited"""
+        return features_map.get(self.product, {})
+
+    @property
+    def send_rate(self) -> float:
+        """max messages per second; everything sent to this device is queued to stay under it"""
+        return send_rate_map.get(self.product, DEFAULT_SEND_RATE)
+
+    @property
+    def is_light(self) -> bool:
+        return self.product in light_products
+
+    @property
+    def supports_color(self) -> bool:
+        return bool(self.product_features.get('color'))
+
+    @property
+    def supports_infrared(self) -> bool:
+        return bool(self.product_features.get('infrared'))
+
+    @property
+    def supports_multizone(self) -> bool:
+        return bool(self.product_features.get('multizone'))
+
+    @property
+    def supports_chain(self) -> bool:
+        return bool(self.product_features.get('chain'))
+
+    # ==================================================================================================================
+    # REFRESH
+    # ==================================================================================================================
+
+    @property
+    def _refresh_funcs(self):
+        """the version is only asked for until it's known, e.g. not again after discovery classified the device"""
+        res = self.refresh_label, self.refresh_power
+        return res if self._version_received else res + (self.refresh_version_info,)
+
+    async def refresh(self) -> bool:
+        """full refresh, all requests in flight at once"""
+        res = await asyncio.gather(*(f() for f in self._refresh_funcs), return_exceptions=True)
+        errors = [r for r in res if isinstance(r, Exception)]
+        for e in errors:
+            log.warning(f'error refreshing {self}: {e!r}')
+        return not errors
+
+    async def refresh_label(self):
+        self.label = (await self.req_with_resp(GetLabel, StateLabel)).label
+
+    async def refresh_power(self):
+        self.power_level = (await self.req_with_resp(GetPower, StatePower)).power_level
+
+    async def refresh_version_info(self, *, only_if_needed=False):
+        if only_if_needed and (self._version_received or self.product in product_map):
+            return
+        r = await self.req_with_resp(GetVersion, StateVersion)
+        self.product_info = ProductInfo(r.vendor, r.product, r.version)
+        self._version_received = True
+
+    # ==================================================================================================================
+    # SETTERS
+    # ==================================================================================================================
+
+    async def set_label(self, label):
+        self.label = label[:32]
+        await self._send_set_message(SetLabel, dict(label=self.label), rapid=False)
+
+    async def set_power(self, power, rapid=False, **payload_kwargs):
+        await self._set_power(SetPower, power, rapid=rapid, **payload_kwargs)
+
+    async def _set_power(self, msg_type, power, rapid=False, **payload_kwargs):
+        power = PowerSettings.validate(power)
+        if self.power_level is not None and PowerSettings.validate(self.power_level) == power:
+            return
+        log.info(f'setting power to {power}: {payload_kwargs}')
+        self.power_level = power
+        await self._send_set_message(msg_type, {'power_level': power, **payload_kwargs}, rapid=rapid)
+
+    # ==================================================================================================================
+    # WORKFLOW METHODS
+    # ==================================================================================================================
+
+    @property
+    def transport(self) -> AsyncTransport:
+        return async_transport()
+
+    @property
+    def health(self) -> Health:
+        """whether this device has been answering; requests to an `open` device fail fast with `CircuitOpen`"""
+        return self.transport.health(self.mac_addr)
+
+    @property
+    def rtt(self) -> RttStats:
+        """this device's smoothed round trip time and retransmit timeout"""
+        return self.transport.rtt_stats(self.mac_addr)
+
+    @property
+    def _addrs(self) -> List[Tuple[str, int]]:
+        """send to the device directly if we know its ip, otherwise broadcast"""
+        if self.ip_addr:
+            return [(self.ip_addr, self.port)]
+        return [(ip_addr, self.port) for ip_addr in network.UDP_BROADCAST_IP_ADDRS]
+
+    async def _send_set_message(self, msg_type, payload: Optional[Dict] = None, timeout_secs: Optional[float] = None,
+                                max_attempts=1, *, rapid: bool):
+        """handle sending messages either rapidly or not, deferring to the current `batch` if there is one"""
+        b = current_batch()
+        if b is not None:
+            b.add(BatchedMessage(msg_type, self.mac_addr, self.source_id, payload or {}, self._addrs, rapid,
+                                 max_attempts if rapid else DEFAULT_ATTEMPTS, timeout_secs, self.send_rate,
+                                 self.label, self.verbose))
+            return
+
+        if rapid:
+            await self.fire_and_forget(msg_type, payload, num_repeats=max_attempts)
+        else:
+            await self.req_with_ack(msg_type, payload, timeout_secs)
+
+    async def fire_and_forget(self, msg_type, payload: Optional[Dict] = None, num_repeats=DEFAULT_ATTEMPTS):
+        """queued behind this device's earlier messages, then sent as fast as the device allows"""
+        self.transport.send(msg_type, self.mac_addr, self.source_id, payload or {}, self._addrs,
+                            num_repeats=num_repeats, rate=self.send_rate, verbose=self.verbose)
+
+    async def req_with_ack(self, msg_type, payload, timeout_secs: Optional[float] = None,
+                           max_attempts=DEFAULT_ATTEMPTS):
+        await self.req_with_resp(msg_type, Acknowledgement, payload, timeout_secs, max_attempts)
+
+    async def req_with_resp(self, msg_type, response_type, payload: Optional[Dict] = None,
+                            timeout_secs: Optional[float] = None, max_attempts=DEFAULT_ATTEMPTS,
+                            *, hedge=False) -> Message:
+        """`timeout_secs` of None retransmits on this device's adaptive rto (see `rtt`)"""
+        if not isinstance(response_type, list):
+            response_type = [response_type]
+        ack_requested = len(response_type) == 1 and Acknowledgement in response_type
+        response = await self.transport.request(msg_type, self.mac_addr, self.source_id, payload or {}, self._addrs,
+                                                response_type, ack_requested=ack_requested,
+                                                timeout_secs=timeout_secs, max_attempts=max_attempts,
+                                                name=self.label, verbose=self.verbose, rate=self.send_rate,
+                                                hedge=hedge)
+        self.ip_addr = response.ip_addr
+        return response
+
+
+class AsyncLight(AsyncDevice, AsyncLightAPI):
+    """asyncio version of `devices.light.Light`"""
+
+    def __init__(self, mac_addr, ip_addr, service=1, port=56700, source_id=os.getpid(), verbose=False):
+        super().__init__(mac_addr, ip_addr, service, port, source_id, verbose)
+        self.color: Optional[Color] = None
+        self.infrared_brightness = None
+
+    @property
+    def power(self):
+        return self.power_level
+
+    @property
+    def color_power(self) -> ColorPower:
+        return ColorPower(self.color, self.power)
+
+    @property
+    def _refresh_funcs(self):
+        return super()._refresh_funcs + (self.refresh_light_state,)
+
+    async def refresh_light_state(self):
+        """get and update color, power_level, and label from light"""
+        r: LightState = await self.req_with_resp(LightGet, LightState)
+        self.color = Color(*r.color)
+        self.power_level = r.power_level
+        self.label = r.label
+
+    async def set_waveform(self, waveform: Waveform, color: Color, period_msec, num_cycles,
+                           *, skew_ratio=.5, is_transient=True, rapid=False):
+        skew_ratio = int(skew_ratio * 2 ** 16 - 2 ** 15)
+        payload = dict(transient=is_transient, color=color, period=period_msec, cycles=num_cycles,
+                       skew_ratio=skew_ratio, waveform=waveform.value)
+        log.info(f'setting {self.label!r} waveform to {waveform}')
+        await self._send_set_message(LightSetWaveform, payload, rapid=rapid)
+
+    async def set_color(self, color: Color, duration=0, rapid=False, preserve_brightness: bool = None):
+        if not color:
+            return
+        color = color.clamped
+        if Light.validate_pb(preserve_brightness) and self.color:
+            color = color._replace(brightness=self.color.brightness)
+
+        log.info(f'setting {self.label!r} color to {color} over {duration} msecs')
+        self.color = color
+        await self._send_set_message(LightSetColor, dict(color=color, duration=duration), rapid=rapid)
+
+    async def turn_on(self, duration=0):
+        await self.set_power(1, duration)
+
+    async def turn_off(self, duration=0):
+        await self.set_power(0, duration)
+
+    async def set_power(self, power, duration=0, rapid=False):
+        await self._set_power(LightSetPower, power, rapid=rapid, duration=duration)
+
+    async def set_color_power(self, cp: ColorPower, duration=0, rapid=False, preserve_brightness: bool = None):
+        """set both color and power at the same time"""
+        coros = [self.set_color(cp.color, duration, rapid, preserve_brightness)]
+        if cp.power is not None:
+            coros.append(self.set_power(cp.power, duration, rapid))
+        await asyncio.gather(*coros)
+
+    async def _replace_color(self, duration, rapid, offset=False, **color_kwargs):
+        """helper func for setting various Color attributes"""
+        if self.color is None:
+            await self.refresh_light_state()
+        if offset:
+            color_kwargs = {k: getattr(self.color, k) + v for k, v in color_kwargs.items()}
+        await self.set_color(Color(*map(int, self.color._replace(**color_kwargs))), duration, rapid)
+
+    async def set_hue(self, hue, duration=0, rapid=False, offset=False):
+        await self._replace_color(duration, rapid, offset, hue=hue)
+
+    async def set_saturation(self, saturation, duration=0, rapid=False, offset=False):
+        await self._replace_color(duration, rapid, offset, saturation=saturation)
+
+    async def set_brightness(self, brightness, duration=0, rapid=False, offset=False):
+        await self._replace_color(duration, rapid, offset, brightness=brightness)
+
+    async def set_kelvin(self, kelvin, duration=0, rapid=False, offset=False):
+        await self._replace_color(duration, rapid, offset, kelvin=kelvin)
+
+    async def set_infrared(self, infrared_brightness, rapid=False):
+        await self._send_set_message(LightSetInfrared, dict(infrared_brightness=infrared_brightness), rapid=rapid)
+
+
+class AsyncMultizoneLight(AsyncLight):
+    """asyncio version of `devices.multizonelight.MultizoneLight`, with zones as a plain list of colors"""
+
+    def __init__(self, mac_addr, ip_addr, service=1, port=56700, source_id=os.getpid(), verbose=False):
+        super().__init__(mac_addr, ip_addr, service, port, source_id, verbose)
+        self.zone_colors: List[Color] = []
+
+    @classmethod
+    def from_sync(cls, device: MultizoneLight) -> 'AsyncMultizoneLight':
+        res = super().from_sync(device)
+        if '_zones' in vars(device):
+            res.zone_colors = [z.color for z in device.zones]
+        return res
+
+    def to_sync(self) -> MultizoneLight:
+        res = super().to_sync()
+        if self.zone_colors:
+            res.zones = [Zone(res, i, c) for i, c in enumerate(self.zone_colors)]
+        return res
+
+    @property
+    def _refresh_funcs(self):
+        return super()._refresh_funcs + (self.refresh_color_zones,)
+
+    async def refresh_color_zones(self) -> List[Color]:
+        """
+        one request per 8-zone chunk, all in flight at once if we already know how many zones there are.
+        otherwise, the first response's `count` tells us which chunks are still needed
+        """
+        num_zones = len(self.zone_colors) or ZONES_PER_RESPONSE
+        colors: Dict[int, Color] = {}
+        starts = range(0, num_zones, ZONES_PER_RESPONSE)
+        count = None
+        while starts:
+            for r in await asyncio.gather(*map(self._get_zone_chunk, starts)):
+                count = r.count
+                if isinstance(r, MultizoneStateZone):
+                    colors[r.index] = Color(*r.color)
+                else:
+                    colors.update((r.index + i, Color(*c)) for i, c in enumerate(r.color))
+            starts = [i for i in range(0, count, ZONES_PER_RESPONSE) if i not in colors]
+
+        self.zone_colors = [colors[i] for i in range(count)]
+        return self.zone_colors
+
+    async def _get_zone_chunk(self, start_index) -> Message:
+        return await self.req_with_resp(MultizoneGetColorZones, [MultizoneStateZone, MultizoneStateMultizone],
+                                        dict(start_index=start_index, end_index=start_index + ZONES_PER_RESPONSE - 1))
+
+    async def set_zone_color(self, color: Color, duration=0, rapid=rapid_default, apply=1, start_index=None,
+                             end_index=None):
+        """see `MultizoneLight.set_zone_color`"""
+        poss_end_idx = 255 if start_index is None else start_index
+        start_index = start_index or 0
+        end_index = end_index or poss_end_idx
+
+        log.info(f'setting {self.label!r}[{start_index}:{end_index}] color to {color} over {duration} msecs')
+        payload = dict(start_index=start_index, end_index=end_index, color=color, duration=duration, apply=apply)
+        await self._send_set_message(MultizoneSetColorZones, payload, rapid=rapid)
+
+    async def set_zone_colors(self, colors: List[Color], duration=0, rapid=False):
+        """set first `len(colors)` zones to `colors`"""
+        async with batch():
+            for i, color in enumerate(colors):
+                await self.set_zone_color(color, duration, rapid, apply=0, start_index=i, end_index=i + 1)
+        await self.set_zone_color(Colors.DEFAULT, 0, False, apply=2)
+
+    async def set_theme(self, theme: Theme, power_on=True, duration=0, rapid=rapid_default):
+        if not self.zone_colors:
+            await self.refresh_color_zones()
+        await self.set_zone_colors(theme.get_colors(len(self.zone_colors)), duration, rapid)
+        if power_on:
+            await self.turn_on()
+
+
+class AsyncTileChain(AsyncLight):
+    """asyncio version of `devices.tilechain.TileChain`: tile layout and colors, fetched on first use"""
+
+    def __init__(self, mac_addr, ip_addr, service=1, port=56700, source_id=os.getpid(), verbose=False):
+        super().__init__(mac_addr, ip_addr, service, port, source_id, verbose)
+        self._tile_info: Optional[List[Tile]] = None
+        self._tile_count: Optional[int] = None
+
+    @property
+    def tile_info(self) -> Optional[List[Tile]]:
+        """None until `get_tile_info` has been awaited"""
+        return self._tile_info
+
+    @property
+    def tile_count(self) -> Optional[int]:
+        return self._tile_count
+
+    async def get_tile_info(self, refresh_cache=False) -> List[Tile]:
+        if self._tile_info is None or refresh_cache:
+            response = await self.req_with_resp(GetDeviceChain, StateDeviceChain)
+            self._tile_info = [Tile.from_response(t)
+                               for t, _ in zip(response.tile_devices, range(response.total_count))]
+            self._tile_count = response.total_count
+        return self._tile_info
+
+    async def get_tile_count(self, refresh_cache=False) -> int:
+        await self.get_tile_info(refresh_cache)
+        return self._tile_count
+
+    async def _validate_tile_access(self, tile_idx):
+        tile_count = await self.get_tile_count()
+        if not 0 <= tile_idx < tile_count:
+            raise ValueError(f'{tile_idx} is not a valid tile_idx for TileChain with {tile_count} tiles.')
+
+    async def get_tile_colors(self, tile_idx, x=0, y=0, width=8) -> StateTileState64:
+        """get colors for individual tile"""
+        await self._validate_tile_access(tile_idx)
+        payload = dict(tile_index=tile_idx, length=1, reserved=0, x=x, y=y, width=width)
+        return await self.req_with_resp(GetTileState64, StateTileState64, payload)
+
+    async def get_tilechain_colors(self, start_tile_idx=0, num_tiles: Optional[int] = None) -> List[StateTileState64]:
+        """get colors for num_tiles starting from start_tile_idx, all requests in flight at once"""
+        tile_count = await self.get_tile_count()
+        end_tile_idx = min(start_tile_idx + (num_tiles or tile_count), tile_count)
+        return list(await asyncio.gather(*map(self.get_tile_colors, range(start_tile_idx, end_tile_idx))))
+
+    async def set_tile_colors(self, start_index, colors, duration=0, tile_count=1, x=0, y=0, width=8, rapid=False):
+        """set colors for individual tile"""
+        await self._validate_tile_access(start_index)
+        payload = dict(tile_index=start_index, length=tile_count, colors=colors, duration=duration, reserved=0, x=x,
+                       y=y, width=width)
+        await self._send_set_message(SetTileState64, payload, rapid=rapid)
+
+    async def set_tilechain_colors(self, idx_colors_map, duration=0, rapid=True):
+        """set each tile in `idx_colors_map` to its 64 colors, all in one batch"""
+        async with batch():
+            for i, c in idx_colors_map.items():
+                await self.set_tile_colors(i, c, duration, rapid=rapid)
+
+
+def async_device_type(product) -> Type[AsyncDevice]:
+    """the most specific async device class for a given product id, like `inventory.device_type`"""
+    return _async_types[device_type(product)]
+
+
+_async_types: Dict[Type[Device], Type[AsyncDevice]] = {Device: AsyncDevice, Light: AsyncLight,
+                                                       MultizoneLight: AsyncMultizoneLight,
+                                                       TileChain: AsyncTileChain}
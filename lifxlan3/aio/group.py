@@ -0,0 +1,301 @@
+import asyncio
+import os
+from functools import partial, wraps
+from itertools import repeat
+from typing import Iterable, Optional, Dict, Union, List, Any
+
+from lifxlan3.base_api import AsyncLightAPI, rapid_default
+from lifxlan3.colors import Color, ColorPower
+from lifxlan3.group import Group, Outcomes, _outcomes
+from lifxlan3.network.health import Outcome
+from lifxlan3.network.msgtypes import StateService
+from lifxlan3.network.transport import CircuitOpen, NoResponse
+from lifxlan3.settings import Waveform
+from lifxlan3.themes import Theme
+from lifxlan3.utils import init_log, timer
+from .batch import batch
+from .devices import AsyncDevice, AsyncLight, AsyncMultizoneLight, AsyncTileChain, async_device_type
+from .network import discover
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+
+def _gather_on_lights(func=None, *, func_name_override=None, light_type='color_lights'):
+    """
+    asyncio version of `group._call_on_lights`:
+    await `func.__name__` on every light of `light_type` concurrently with `asyncio.gather`,
+    inside a `batch` so every light's message is sent in one loop. return each light's `Outcome`
+    """
+    if func is None:
+        return partial(_gather_on_lights, light_type=light_type, func_name_override=func_name_override)
+    func_name = func_name_override or func.__name__
+
+    @wraps(func)
+    async def wrapper(self: 'AsyncGroup', *args, **kwargs) -> Outcomes:
+        lights = getattr(self, light_type)
+        async with batch() as b:
+            await self._gather(getattr(l, func_name)(*args, **kwargs) for l in lights)
+        return _outcomes(lights, b)
+
+    return wrapper
+
+
+def _outcome(res) -> Outcome:
+    """`Outcome` of a request awaited with `return_exceptions`"""
+    if isinstance(res, CircuitOpen):
+        return Outcome.skipped
+    if isinstance(res, NoResponse):
+        return Outcome.failed
+    return Outcome.ok
+
+
+class AsyncGroup(AsyncLightAPI):
+    """asyncio version of `group.Group`: every call fans out to its devices with `asyncio.gather`"""
+
+    def __init__(self, devices: Iterable[AsyncDevice], name: Optional[str] = None):
+        self.devices = devices
+        self.name = name or ''
+
+    @classmethod
+    def from_sync(cls, group: Group) -> 'AsyncGroup':
+        return cls((async_device_type(d.product).from_sync(d) for d in group), group.name)
+
+    def to_sync(self) -> Group:
+        return Group((d.to_sync() for d in self), self.name)
+
+    @property
+    def devices(self) -> List[AsyncDevice]:
+        return self._devices
+
+    @devices.setter
+    def devices(self, devices):
+        self._devices = sorted(set(devices))
+
+    @staticmethod
+    async def _gather(coros) -> List[Any]:
+        """run `coros` concurrently, logging rather than raising individual failures"""
+        res = await asyncio.gather(*coros, return_exceptions=True)
+        for r in res:
+            if isinstance(r, Exception):
+                log.warning(f'error in group call: {r!r}')
+        return res
+
+    # ==================================================================================================================
+    # GROUP PROPERTIES
+    # ==================================================================================================================
+
+    @property
+    def lights(self) -> 'AsyncGroup':
+        return AsyncGroup(l for l in self.devices if isinstance(l, AsyncLight))
+
+    @property
+    def color_lights(self) -> 'AsyncGroup':
+        return AsyncGroup(l for l in self.lights if l.supports_color)
+
+    @property
+    def infrared_lights(self) -> 'AsyncGroup':
+        return AsyncGroup(l for l in self.lights if l.supports_infrared)
+
+    @property
+    def multizone_lights(self) -> 'AsyncGroup':
+        return AsyncGroup(l for l in self.devices if isinstance(l, AsyncMultizoneLight))
+
+    @property
+    def tilechain_lights(self) -> 'AsyncGroup':
+        return AsyncGroup(l for l in self.devices if isinstance(l, AsyncTileChain))
+
+    @property
+    def power(self) -> Dict[AsyncDevice, int]:
+        return {d: d.power_level for d in self.devices}
+
+    @property
+    def color(self) -> Dict[AsyncLight, Color]:
+        return {l: l.color for l in self.color_lights}
+
+    @property
+    def label(self) -> Dict[AsyncDevice, str]:
+        return {d: d.label for d in self.devices}
+
+    def get_device_by_name(self, name) -> Optional[AsyncDevice]:
+        return next((d for d in self.devices if d.label == name), None)
+
+    def get_devices_by_name(self, names) -> 'AsyncGroup':
+        return AsyncGroup(d for d in self.devices if d.label in set(names))
+
+    # ==================================================================================================================
+    # REFRESH SETTINGS FROM LIGHTS
+    # ==================================================================================================================
+
+    async def refresh(self) -> Outcomes:
+        """
+        refresh every device concurrently
+
+        devices that don't respond stay in the group: their circuits open (see `AsyncDevice.health`),
+        so later calls skip them until they answer a probe
+        """
+        res = {}
+        for d, ok in zip(self.devices, await asyncio.gather(*(d.refresh() for d in self.devices))):
+            res[d] = Outcome.ok if ok else Outcome.failed
+            if not ok:
+                log.warning(f'ERROR with device with name, mac addr {d.label, d.mac_addr}')
+        return res
+
+    async def refresh_power(self) -> Outcomes:
+        """refresh all lights' power"""
+        return await self._refresh_light_states(self.lights)
+
+    async def refresh_color(self) -> Outcomes:
+        """refresh all lights' color"""
+        return await self._refresh_light_states(self.color_lights)
+
+    @staticmethod
+    async def _refresh_light_states(lights: 'AsyncGroup') -> Outcomes:
+        res = {}
+        for l, r in zip(lights, await asyncio.gather(*(l.refresh_light_state() for l in lights),
+                                                     return_exceptions=True)):
+            res[l] = _outcome(r)
+            if res[l] is not Outcome.ok:
+                log.warning(f'unable to refresh {l.label!r}: {res[l].name}')
+        return res
+
+    # ==================================================================================================================
+    # SET LIGHT VALUES IN GROUP
+    # ==================================================================================================================
+
+    async def set_power(self, power: Union[int, Dict[AsyncDevice, int]], duration=0, rapid=rapid_default) -> Outcomes:
+        devices, powers = self.devices, repeat(power)
+        if isinstance(power, dict):
+            devices, powers = zip(*power.items())
+        async with batch() as b:
+            await self._gather(d.set_power(p, duration, rapid) if isinstance(d, AsyncLight) else d.set_power(p, rapid)
+                               for d, p in zip(devices, powers))
+        return _outcomes(devices, b)
+
+    @_gather_on_lights
+    async def set_waveform(self, waveform: Waveform, color: Color, period_msec, num_cycles,
+                           *, skew_ratio=.5, is_transient=True, rapid=False):
+        """set waveform on color lights"""
+
+    @_gather_on_lights
+    async def set_color(self, color: Color, duration=0, rapid=rapid_default, preserve_brightness: bool = None):
+        """set color on color lights"""
+
+    async def set_color_power(self, cp: Union[ColorPower, Dict[AsyncLight, ColorPower]],
+                              duration=0, rapid=True, preserve_brightness: bool = None) -> Outcomes:
+        """set color and power on color lights"""
+        if isinstance(cp, ColorPower):
+            cp = dict(zip(self.color_lights, repeat(cp)))
+        async with batch() as b:
+            await self._gather(l.set_color_power(_cp, duration, rapid, preserve_brightness) for l, _cp in cp.items())
+        return _outcomes(cp, b)
+
+    @_gather_on_lights
+    async def set_hue(self, hue, duration=0, rapid=rapid_default, offset=False):
+        """set hue on color lights"""
+
+    @_gather_on_lights
+    async def set_brightness(self, brightness, duration=0, rapid=rapid_default, offset=False):
+        """set brightness on color lights"""
+
+    @_gather_on_lights
+    async def set_saturation(self, saturation, duration=0, rapid=rapid_default, offset=False):
+        """set saturation on color lights"""
+
+    @_gather_on_lights
+    async def set_kelvin(self, kelvin, duration=0, rapid=rapid_default, offset=False):
+        """set kelvin on color lights"""
+
+    @_gather_on_lights(light_type='infrared_lights')
+    async def set_infrared(self, infrared_brightness):
+        """set infrared on color lights"""
+
+    async def set_theme(self, theme: Theme, power_on=True, duration=0, rapid=True,
+                        preserve_brightness=None) -> Outcomes:
+        colors = theme.get_colors(len(self))
+        async with batch() as b:
+            await self._gather(l.set_color_power(ColorPower(c, power_on), duration, rapid, preserve_brightness)
+                               for l, c in zip(self, colors))
+        return _outcomes(self, b)
+
+    @_gather_on_lights(light_type='lights')
+    async def turn_on(self, duration=0):
+        """turn on lights"""
+
+    @_gather_on_lights(light_type='lights')
+    async def turn_off(self, duration=0):
+        """turn off lights"""
+
+    # ==================================================================================================================
+    # MAKE GROUP PYTHONIC
+    # ==================================================================================================================
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __getitem__(self, idx_or_name):
+        if isinstance(idx_or_name, int):
+            return self.devices[idx_or_name]
+        if isinstance(idx_or_name, slice):
+            return AsyncGroup(self.devices[idx_or_name])
+        return self.get_device_by_name(idx_or_name)
+
+    def __str__(self):
+        name_str = f' {self.name!r}' if self.name else ''
+        return f'{type(self).__name__}{name_str} ({len(self)} devices): {self.devices}'
+
+
+class AsyncLifxLAN(AsyncGroup):
+    """
+    asyncio version of `group.LifxLAN`
+
+    construction can't await, so use `await AsyncLifxLAN.discover()` or `await lan.populate_devices()`
+    """
+
+    def __init__(self, name: Optional[str] = None, verbose=False):
+        super().__init__([], name)
+        self.source_id = os.getpid()
+        self._devices_by_mac_addr: Dict[str, AsyncDevice] = {}
+        self._verbose = verbose
+
+    @classmethod
+    async def discover(cls, name: Optional[str] = None, verbose=False,
+                       total_num_lights: Optional[int] = None) -> 'AsyncLifxLAN':
+        res = cls(name, verbose)
+        await res.populate_devices(total_num_lights=total_num_lights)
+        return res
+
+    @timer
+    async def populate_devices(self, reset=False, total_num_lights: Optional[int] = None):
+        """discover devices, classifying and refreshing each one as soon as it responds"""
+        log.info('populating devices')
+
+        if reset:
+            self._devices_by_mac_addr.clear()
+
+        tasks = [asyncio.ensure_future(self._init_device(r))
+                 async for r in discover(self.source_id, total_num_lights=total_num_lights, verbose=self._verbose)]
+        for device in await asyncio.gather(*tasks):
+            if device is not None:
+                self._devices_by_mac_addr[device.mac_addr] = device
+        self.devices = self._devices_by_mac_addr.values()
+        self.name = self.name or 'ALL'
+
+    async def _init_device(self, r: StateService) -> Optional[AsyncDevice]:
+        """classify and refresh a newly-discovered device, returning None if it's not responding"""
+        args = r.target_addr, r.ip_addr, r.service, r.port, self.source_id, self._verbose
+        probe = AsyncDevice(*args)
+        try:
+            await probe.refresh_version_info()
+        except NoResponse:
+            pass
+        else:
+            device = async_device_type(probe.product)(*args)
+            device.product_info, device._version_received = probe.product_info, True
+            if await device.refresh():
+                return device
+        log.warning(f'ERROR with device with mac addr {r.target_addr}, ip {r.ip_addr}: not responding, skipping')
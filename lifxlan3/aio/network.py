@@ -0,0 +1,91 @@
+import asyncio
+import time
+from typing import Optional, Dict, List, AsyncIterator
+
+from lifxlan3.network import network
+from lifxlan3.network.message import BROADCAST_MAC, Message
+from lifxlan3.network.msgtypes import GetService, StateService
+from lifxlan3.network.network import DEFAULT_TIMEOUT, DEFAULT_ATTEMPTS, DISCOVERY_QUIET_SECS, DISCOVERY_MAX_SECS, \
+    DiscoverySchedule, MessageType, _create_msg
+from lifxlan3.settings import TOTAL_NUM_LIGHTS
+from lifxlan3.utils import init_log
+from .transport import get_async_transport
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+
+async def broadcast_with_resp(msg_type: MessageType, response_type: MessageType, source_id,
+                              payload: Optional[Dict] = None,
+                              timeout_secs=DEFAULT_TIMEOUT,
+                              max_attempts=DEFAULT_ATTEMPTS,
+                              total_num_lights=TOTAL_NUM_LIGHTS,
+                              *, verbose=False) -> List[Message]:
+    """asyncio version of `network.network.broadcast_with_resp`"""
+    transport = await get_async_transport()
+    msg = _create_msg(msg_type, response_type, source_id, payload or {},
+                      transport.next_seq_num(source_id, BROADCAST_MAC))
+    responses = []
+    addr_seen = set()
+
+    def found_all_lights():
+        return not (total_num_lights is None or len(addr_seen) < total_num_lights)
+
+    def is_response(r):
+        return type(r) == response_type and r.source_id == source_id and r.seq_num == msg.seq_num
+
+    async with transport.subscribe(is_response) as queue:
+        for _ in range(max_attempts):
+            if found_all_lights():
+                break
+            for ip_addr in network.UDP_BROADCAST_IP_ADDRS:
+                transport.sendto(msg.packed_message, (ip_addr, network.UDP_BROADCAST_PORT))
+            if verbose:
+                log.info("SEND: " + str(msg))
+
+            end_time = time.monotonic() + timeout_secs
+            while not found_all_lights():
+                try:
+                    response = await asyncio.wait_for(queue.get(), max(0, end_time - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+                if verbose:
+                    log.info("RECV: " + str(response))
+                if response.target_addr not in addr_seen and response.target_addr != BROADCAST_MAC:
+                    addr_seen.add(response.target_addr)
+                    responses.append(response)
+    return responses
+
+
+async def discover(source_id, msg_type: MessageType = GetService, response_type: MessageType = StateService,
+                   payload: Optional[Dict] = None, *, total_num_lights: Optional[int] = None,
+                   quiet_secs=DISCOVERY_QUIET_SECS, max_secs=DISCOVERY_MAX_SECS,
+                   verbose=False) -> AsyncIterator[Message]:
+    """asyncio version of `network.network.discover`"""
+    transport = await get_async_transport()
+    msg = _create_msg(msg_type, response_type, source_id, payload or {},
+                      transport.next_seq_num(source_id, BROADCAST_MAC))
+    schedule = DiscoverySchedule(total_num_lights, quiet_secs, max_secs)
+    addr_seen = set()
+
+    def is_response(r):
+        return type(r) == response_type and r.source_id == source_id and r.seq_num == msg.seq_num
+
+    async with transport.subscribe(is_response) as queue:
+        while not schedule.done:
+            if schedule.should_broadcast():
+                for ip_addr in network.UDP_BROADCAST_IP_ADDRS:
+                    transport.sendto(msg.packed_message, (ip_addr, network.UDP_BROADCAST_PORT))
+                if verbose:
+                    log.info("SEND: " + str(msg))
+            try:
+                response = await asyncio.wait_for(queue.get(), schedule.wait_secs)
+            except asyncio.TimeoutError:
+                continue
+            if verbose:
+                log.info("RECV: " + str(response))
+            if response.target_addr not in addr_seen and response.target_addr != BROADCAST_MAC:
+                addr_seen.add(response.target_addr)
+                schedule.found()
+                yield response
@@ -0,0 +1,109 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Type, Iterable, Optional, AsyncIterator
+
+from lifxlan3.network.encode import Payload
+from lifxlan3.network.health import Health
+from lifxlan3.network.message import Message
+from lifxlan3.network.rtt import RttStats
+from lifxlan3.network.transport import Addr, Predicate, Transport, get_transport
+from lifxlan3.utils import init_log
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+
+class LoopQueue:
+    """hand messages from the transport's receiver thread to an `asyncio.Queue` on `loop`"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: 'asyncio.Queue[Message]' = asyncio.Queue()
+
+    def put(self, msg: Message):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, msg)
+        except RuntimeError:  # loop closed while still subscribed
+            pass
+
+
+class AsyncTransport:
+    """
+    asyncio facade over the shared `network.transport.Transport`
+
+    there's one networking engine: requests from coroutines go through the same per-device send queues,
+    adaptive rto, circuit breakers and receiver thread as sync calls, and their futures are
+    awaited with `asyncio.wrap_future`. nothing here blocks the event loop
+    """
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+
+    @property
+    def port(self) -> int:
+        return self.transport.port
+
+    @property
+    def closed(self) -> bool:
+        return self.transport.closed
+
+    @property
+    def num_pending(self) -> int:
+        return self.transport.num_pending
+
+    def health(self, mac_addr: str) -> Health:
+        return self.transport.health(mac_addr)
+
+    def rtt_stats(self, mac_addr: str) -> RttStats:
+        return self.transport.rtt_stats(mac_addr)
+
+    # ==================================================================================================================
+    # SENDING
+    # ==================================================================================================================
+
+    def next_seq_num(self, source_id: int, mac_addr: str) -> int:
+        return self.transport.next_seq_num(source_id, mac_addr)
+
+    def sendto(self, data: bytes, addr: Addr):
+        self.transport.sendto(data, addr)
+
+    def send(self, msg_type: Type[Message], mac_addr: str, source_id: int, payload: Payload, addrs: List[Addr], *,
+             num_repeats=1, rate: Optional[float] = None, verbose=False):
+        """fire and forget; see `Transport.send`"""
+        self.transport.send(msg_type, mac_addr, source_id, payload, addrs, num_repeats=num_repeats, rate=rate,
+                            verbose=verbose)
+
+    async def request(self, msg_type: Type[Message], mac_addr: str, source_id: int, payload: Payload,
+                      addrs: List[Addr], response_types: Iterable[Type[Message]], *, ack_requested: bool,
+                      timeout_secs: Optional[float], max_attempts: int, name: str = '', verbose=False,
+                      rate: Optional[float] = None, hedge=False) -> Message:
+        """send a message and wait for its response; see `Transport.request`"""
+        return await asyncio.wrap_future(
+            self.transport.request(msg_type, mac_addr, source_id, payload, addrs, response_types,
+                                   ack_requested=ack_requested, timeout_secs=timeout_secs, max_attempts=max_attempts,
+                                   name=name, verbose=verbose, rate=rate, hedge=hedge))
+
+    @asynccontextmanager
+    async def subscribe(self, predicate: Predicate) -> AsyncIterator['asyncio.Queue[Message]']:
+        """yield a queue that receives every matching message while inside the `async with` block"""
+        q = LoopQueue(asyncio.get_running_loop())
+        with self.transport.subscribe(predicate, q):
+            yield q.queue
+
+
+_async_transport: Optional[AsyncTransport] = None
+
+
+def async_transport() -> AsyncTransport:
+    """facade over the module-level transport shared with sync devices; follows it if it's recreated"""
+    global _async_transport
+    transport = get_transport()
+    if _async_transport is None or _async_transport.transport is not transport:
+        _async_transport = AsyncTransport(transport)
+    return _async_transport
+
+
+async def get_async_transport() -> AsyncTransport:
+    """awaitable `async_transport`"""
+    return async_transport()
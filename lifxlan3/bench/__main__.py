@@ -0,0 +1,5 @@
+import sys
+
+from .fleet import main
+
+main(sys.argv[1:])
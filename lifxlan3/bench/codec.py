@@ -0,0 +1,279 @@
+"""
+microbenchmarks for the protocol codec, which runs for every packet sent and received
+
+    python -m lifxlan3.bench.codec [--filter pack/] [--out results.json] [--baseline old.json] [--threshold 1.25]
+    python -m lifxlan3.bench.codec --legacy
+
+covers `generate_packed_message` and the bytes-only `encode` for every message type, the specialized
+encoders, `unpack_lifx_message` (header only, as the transport does) and full payload decoding for every
+response type, `convert_MAC_to_int`, `little_endian`, and the 256-value `SetTileState64` payload. reports ns/op, the bytes allocated while an op runs, and
+the memory blocks it leaves allocated. with `--baseline`, exits non-zero if any case got more than
+`--threshold` times slower or more allocation-hungry.
+
+`--legacy` compares encoding against the original `bitstring` implementation instead
+"""
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+from timeit import Timer
+from typing import Callable, Dict, List, Optional, Type
+
+import bitstring
+
+from lifxlan3.network.encode import encode, encode_light_set_color, encode_set_tile_state64, \
+    encode_set_tile_state64_into
+from lifxlan3.network.message import Message, convert_MAC_to_int, little_endian
+from lifxlan3.network.msgtypes import *
+from lifxlan3.network.unpack import unpack_lifx_message
+
+__author__ = 'acushner'
+
+MAC = 'd0:73:d5:01:02:03'
+SOURCE_ID = 42
+COLOR = 21845, 65535, 32768, 3500
+
+
+# ======================================================================================================================
+# ORIGINAL (BITSTRING) ENCODER - reference for "before" numbers
+
+def _pack(fmt, *vals) -> bytes:
+    return little_endian(bitstring.pack(fmt, *vals))
+
+
+def _legacy_header(msg: Message, payload_size) -> bytes:
+    frame = (_pack('uint:16', 36 + payload_size)
+             + _pack('uint:2, uint:1, uint:1, uint:12', msg.origin, msg.tagged, msg.addressable, msg.protocol)
+             + _pack('uint:32', msg.source_id))
+    frame_addr = (_pack('uint:64', convert_MAC_to_int(msg.target_addr))
+                  + _pack('uint:48', 0)
+                  + _pack('uint:6, uint:1, uint:1', 0, msg.ack_requested, msg.response_requested)
+                  + _pack('uint:8', msg.seq_num))
+    protocol_header = _pack('uint:64', 0) + _pack('uint:16', msg.message_type) + _pack('uint:16', 0)
+    return frame + frame_addr + protocol_header
+
+
+def _legacy_color(color) -> bytes:
+    return b''.join(_pack('uint:16', v) for v in color)
+
+
+_legacy_payloads: Dict[Type[Message], Callable[[Message], bytes]] = {
+    LightSetColor: lambda m: _pack('uint:8', 0) + _legacy_color(m.color) + _pack('uint:32', m.duration),
+    SetPower: lambda m: _pack('uint:16', m.power_level),
+    MultizoneSetColorZones: lambda m: (_pack('uint:8', m.start_index) + _pack('uint:8', m.end_index)
+                                       + _legacy_color(m.color) + _pack('uint:32', m.duration)
+                                       + _pack('uint:8', m.apply)),
+}
+
+
+def legacy_packed_message(msg: Message) -> bytes:
+    payload = _legacy_payloads[type(msg)](msg)
+    return _legacy_header(msg, len(payload)) + payload
+
+
+# ======================================================================================================================
+# SAMPLE MESSAGES - one payload per message type
+
+_TILE = dict(reserved1=0, reserved2=0, reserved3=0, reserved4=0, user_x=1.5, user_y=-.5, width=8, height=8,
+             reserved5=0, device_version_vendor=1, device_version_product=55, device_version_version=10,
+             firmware_build=1_548_000_000, reserved6=0, firmware_version=3 << 16 | 50, reserved7=0)
+_WIFI = dict(signal=1e-5, tx=1234, rx=5678, reserved1=0)
+_FIRMWARE = dict(build=1_548_000_000, reserved1=0, version=3 << 16 | 70)
+
+PAYLOADS: Dict[Type[Message], Dict] = {
+    GetService: {}, StateService: dict(service=1, port=56700),
+    GetHostInfo: {}, StateHostInfo: _WIFI,
+    GetHostFirmware: {}, StateHostFirmware: _FIRMWARE,
+    GetWifiInfo: {}, StateWifiInfo: _WIFI,
+    GetWifiFirmware: {}, StateWifiFirmware: _FIRMWARE,
+    GetPower: {}, SetPower: dict(power_level=65535), StatePower: dict(power_level=65535),
+    GetLabel: {}, SetLabel: dict(label='kitchen'), StateLabel: dict(label='kitchen'),
+    GetVersion: {}, StateVersion: dict(vendor=1, product=27, version=0),
+    GetInfo: {}, StateInfo: dict(time=1_548_000_000, uptime=1000, downtime=0),
+    Acknowledgement: {},
+    GetLocation: {}, StateLocation: dict(location=bytes(range(16)), label='home', updated_at=1_548_000_000),
+    GetGroup: {}, StateGroup: dict(group=bytes(range(16)), label='living room', updated_at=1_548_000_000),
+    EchoRequest: dict(byte_array=bytes(64)), EchoResponse: dict(byte_array=bytes(64)),
+    LightGet: {}, LightSetColor: dict(color=COLOR, duration=0),
+    LightSetWaveform: dict(transient=1, color=COLOR, period=1000, cycles=2., skew_ratio=0, waveform=1),
+    LightState: dict(color=COLOR, reserved1=0, power_level=65535, label='kitchen', reserved2=0),
+    LightGetPower: {}, LightSetPower: dict(power_level=65535, duration=0), LightStatePower: dict(power_level=65535),
+    LightGetInfrared: {}, LightStateInfrared: dict(infrared_brightness=0), LightSetInfrared: dict(infrared_brightness=0),
+    MultizoneSetColorZones: dict(start_index=0, end_index=8, color=COLOR, duration=0, apply=1),
+    MultizoneGetColorZones: dict(start_index=0, end_index=255),
+    MultizoneStateZone: dict(count=16, index=0, color=COLOR),
+    MultizoneStateMultizone: dict(count=16, index=0, color=[COLOR] * 8),
+    GetDeviceChain: {}, StateDeviceChain: dict(start_index=0, tile_devices=[_TILE] * 5, total_count=5),
+    SetUserPosition: dict(tile_index=0, reserved=0, user_x=1., user_y=0.),
+    GetTileState64: dict(tile_index=0, length=1, reserved=0, x=0, y=0, width=8),
+    StateTileState64: dict(tile_index=0, reserved=0, x=0, y=0, width=8, colors=[COLOR] * 64),
+    SetTileState64: dict(tile_index=0, length=1, reserved=0, x=0, y=0, width=8, duration=0, colors=[COLOR] * 64),
+}
+
+if set(PAYLOADS) != set(MSG_IDS):
+    raise AssertionError(f'missing sample payloads for {sorted(t.__name__ for t in set(MSG_IDS) - set(PAYLOADS))}')
+
+RESPONSE_TYPES = [t for t in PAYLOADS if t.__name__.startswith(('State', 'LightState', 'MultizoneState'))
+                  or t in (Acknowledgement, EchoResponse)]
+
+
+def sample(msg_type: Type[Message]) -> Message:
+    return msg_type(MAC, SOURCE_ID, seq_num=7, payload=PAYLOADS[msg_type], ack_requested=True)
+
+
+def _decode(data: bytes) -> Message:
+    msg = unpack_lifx_message(data)
+    if msg.fields:
+        getattr(msg, msg.fields[0].name)
+    return msg
+
+
+def cases() -> Dict[str, Callable]:
+    res = {f'pack/{t.__name__}': sample(t).generate_packed_message for t in PAYLOADS}
+    for t, payload in PAYLOADS.items():
+        res[f'encode/{t.__name__}'] = lambda t=t, payload=payload: encode(t, MAC, SOURCE_ID, 7, payload, True)
+    res['encode_light_set_color'] = lambda: encode_light_set_color(MAC, SOURCE_ID, 7, COLOR, 0, True)
+    for t in RESPONSE_TYPES:
+        data = sample(t).packed_message
+        res[f'unpack/{t.__name__}'] = lambda data=data: unpack_lifx_message(data)
+        res[f'decode/{t.__name__}'] = lambda data=data: _decode(data)
+
+    tile_msg = sample(SetTileState64)
+    tile_data = tile_msg.packed_message
+    res['tile64/build'] = lambda: SetTileState64(MAC, SOURCE_ID, 7, PAYLOADS[SetTileState64])
+    res['tile64/decode'] = lambda: unpack_lifx_message(tile_data).colors
+    tile_colors = PAYLOADS[SetTileState64]['colors']
+    tile_buf = bytearray(len(tile_data))
+    res['tile64/encode'] = lambda: encode_set_tile_state64(MAC, SOURCE_ID, 7, 0, tile_colors, ack_requested=True)
+    res['tile64/encode_into'] = lambda: encode_set_tile_state64_into(tile_buf, 0, MAC, SOURCE_ID, 7, 0, tile_colors,
+                                                                     ack_requested=True)
+
+    bits = bitstring.pack('uint:64', convert_MAC_to_int(MAC))
+    res['convert_MAC_to_int'] = lambda: convert_MAC_to_int(MAC)
+    res['little_endian'] = lambda: little_endian(bits)
+    return res
+
+
+# ======================================================================================================================
+# MEASUREMENT
+
+def ops_per_sec(func: Callable, min_time_secs=.2) -> float:
+    t = Timer(func)
+    num_loops, total_secs = t.autorange()
+    while total_secs < min_time_secs:
+        num_loops *= 2
+        total_secs = t.timeit(num_loops)
+    return num_loops / total_secs
+
+
+def ns_per_op(func: Callable, repeats=5, repeat_secs=.04) -> float:
+    """best of `repeats` short runs, the least noisy estimate on a busy machine"""
+    t = Timer(func)
+    num_loops, total_secs = t.autorange()
+    num_loops = max(1, int(num_loops * repeat_secs / total_secs))
+    return 1e9 * min(t.repeat(repeats, num_loops)) / num_loops
+
+
+def allocations(func: Callable, num_ops=100) -> Dict[str, float]:
+    """
+    `alloc_bytes`: high-water mark of memory allocated while one op runs, temporaries included
+    `live_blocks`: memory blocks still allocated per op afterwards, i.e. what the result holds on to
+    """
+    func()  # warm up any caches so they aren't counted
+    gc.disable()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    results = [None] * num_ops
+    try:
+        before = sys.getallocatedblocks()
+        for i in range(num_ops):
+            results[i] = func()
+        live_blocks = (sys.getallocatedblocks() - before) / num_ops
+    finally:
+        gc.enable()
+    return dict(alloc_bytes=peak - base, live_blocks=max(0., live_blocks))
+
+
+def run(name_filter: str = '') -> Dict[str, Dict[str, float]]:
+    return {name: dict(ns_per_op=ns_per_op(func), **allocations(func))
+            for name, func in cases().items() if name_filter in name}
+
+
+def regressions(res: Dict, baseline: Dict, threshold: float) -> List[str]:
+    msgs = []
+    for name, r in res.items():
+        b = baseline.get(name)
+        if not b:
+            continue
+        for k in ('ns_per_op', 'alloc_bytes'):
+            if b[k] and r[k] > threshold * b[k]:
+                msgs.append(f'{name}: {k} {b[k]:,.0f} -> {r[k]:,.0f} ({r[k] / b[k]:.2f}x)')
+    return msgs
+
+
+# ======================================================================================================================
+# LEGACY COMPARISON
+
+_legacy_messages = LightSetColor, SetPower, MultizoneSetColorZones
+
+
+def legacy_comparison() -> Dict[str, Dict[str, float]]:
+    res = {}
+    for msg_type in _legacy_messages:
+        msg = sample(msg_type)
+        if legacy_packed_message(msg) != msg.generate_packed_message():
+            raise AssertionError(f'encoders disagree for {msg_type.__name__}')
+
+        before = ops_per_sec(lambda: legacy_packed_message(msg))
+        after = ops_per_sec(msg.generate_packed_message)
+        res[msg_type.__name__] = dict(before=before, after=after, speedup=after / before)
+    return res
+
+
+def __main(args: List[str]):
+    parser = argparse.ArgumentParser(prog='python -m lifxlan3.bench.codec', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--out', help='write json results here')
+    parser.add_argument('--baseline', help='json results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='allowed slowdown vs. the baseline')
+    parser.add_argument('--legacy', action='store_true', help='compare against the original bitstring encoder')
+    opts = parser.parse_args(args)
+
+    if opts.legacy:
+        print(f'{"message":<24}{"before (ops/s)":>16}{"after (ops/s)":>16}{"speedup":>10}')
+        for name, r in legacy_comparison().items():
+            print(f'{name:<24}{r["before"]:>16,.0f}{r["after"]:>16,.0f}{r["speedup"]:>9.1f}x')
+        return
+
+    res = run(opts.filter)
+    baseline: Optional[Dict] = None
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+
+    print(f'{"case":<36}{"ns/op":>10}{"alloc B":>10}{"blocks":>8}{"vs base":>10}')
+    for name, r in res.items():
+        b = (baseline or {}).get(name)
+        vs = f'{r["ns_per_op"] / b["ns_per_op"]:.2f}x' if b else ''
+        print(f'{name:<36}{r["ns_per_op"]:>10,.0f}{r["alloc_bytes"]:>10,}{r["live_blocks"]:>8.1f}{vs:>10}')
+
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(res, f, indent=1)
+
+    failures = regressions(res, baseline, opts.threshold) if baseline else []
+    if failures:
+        print(f'\nREGRESSIONS (more than {opts.threshold}x the baseline):', *failures, sep='\n  ')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    __main(sys.argv[1:])
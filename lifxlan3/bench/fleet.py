@@ -0,0 +1,191 @@
+"""
+fleet-scale load test against simulated devices
+
+    python -m lifxlan3.bench [--sizes 10,100,1000] [--wifi] [--out results.json] [--baseline old.json]
+
+for each fleet size, in a fresh interpreter: discovery (`LifxLAN()`), `refresh()`, `set_color` on the whole
+lan and on half of it, `set_theme`, and acked tile chain frames. reports p50/p95/p99 latency, packets the
+library sent, how often the packet cache saved encoding one, and peak threads and rss as json.
+
+the simulator is seeded and every operation runs a fixed number of times, so results from two commits
+can be compared directly: `--baseline` flags anything more than `REGRESSION_RATIO` slower
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+__author__ = 'acushner'
+
+FLEET_SIZES = 10, 100, 1000
+SEED = 1
+REGRESSION_RATIO = 1.1
+PERCENTILES = 50, 95, 99
+
+# how many times each operation runs
+DISCOVERY_RUNS = 3
+REFRESH_RUNS = 10
+SET_RUNS = 50
+THEME_RUNS = 20
+FRAMES = 100
+
+
+# ======================================================================================================================
+# MEASUREMENT
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """nearest-rank percentiles, in milliseconds"""
+    s = sorted(samples)
+    res = {f'p{p}': 1000 * s[min(len(s) - 1, max(0, -(-p * len(s) // 100) - 1))] for p in PERCENTILES}
+    res['mean'] = 1000 * sum(s) / len(s)
+    return res
+
+
+def max_rss_mb() -> float:
+    rss_unit = 1 << 20 if sys.platform == 'darwin' else 1 << 10  # ru_maxrss is bytes on macos, kB elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / rss_unit
+
+
+class Recorder:
+    """time repeated runs of each operation, counting the packets that reached the simulator while they ran"""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.results: Dict[str, Dict] = {}
+        self.peak_threads = threading.active_count()
+
+    def __call__(self, name: str, func: Callable, num_runs: int, **extra):
+        samples = []
+        packets = self.sim.stats['received']
+        for _ in range(num_runs):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+        self.results[name] = dict(runs=num_runs, packets=(self.sim.stats['received'] - packets) / num_runs,
+                                  **percentiles(samples), **extra)
+        return samples
+
+
+# ======================================================================================================================
+# BENCHMARK
+
+def _quiet_logs():
+    for name in list(logging.Logger.manager.loggerDict):
+        if name.startswith('lifxlan3'):
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+
+def _fleet_sizes(num_devices: int) -> Dict[str, int]:
+    """mostly bulbs, with one strip and one tile chain per 10 devices"""
+    num_other = max(1, num_devices // 10)
+    return dict(num_lights=num_devices - 2 * num_other, num_strips=num_other, num_chains=num_other)
+
+
+def run(num_devices: int, wifi=False) -> Dict:
+    from lifxlan3 import LifxLAN, Group, Color, Themes
+    from lifxlan3.devices.tilechain import TileChain
+    from lifxlan3.network.encode import packet_cache_info
+    from lifxlan3.sim import Simulator, fleet, PERFECT, WIFI
+
+    _quiet_logs()
+    with Simulator(fleet(**_fleet_sizes(num_devices)), faults=WIFI if wifi else PERFECT, seed=SEED) as sim:
+        record = Recorder(sim)
+        lans = []
+        record('discovery', lambda: lans.append(LifxLAN()), DISCOVERY_RUNS)
+        lan = lans[-1]
+        found = len(lan)
+        _quiet_logs()
+
+        colors = iter(Color(h, 65535, 32768, 3500) for h in range(0, 1 << 30, 97))
+        half = Group(lan.devices[::2])
+        record('refresh', lan.refresh, REFRESH_RUNS)
+        record('set_color', lambda: lan.set_color(next(colors), rapid=False), SET_RUNS)
+        record('set_color_half', lambda: half.set_color(next(colors), rapid=False), SET_RUNS)
+        record('set_theme', lambda: lan.set_theme(Themes.xmas), THEME_RUNS)
+
+        chain = next(d for d in lan if isinstance(d, TileChain))
+        frames = [{i: [next(colors)] * 64 for i in range(chain.tile_count)} for _ in range(FRAMES)]
+        frames_iter = iter(frames)
+        samples = record('tile_frame', lambda: chain.set_tilechain_colors(next(frames_iter), rapid=False), FRAMES)
+        record.results['tile_frame']['fps'] = FRAMES / sum(samples)
+
+    cache = packet_cache_info()
+    return dict(num_devices=num_devices, found=found, ops=record.results, threads=record.peak_threads,
+                max_rss_mb=max_rss_mb(), packet_cache=dict(hits=cache.hits, misses=cache.misses))
+
+
+def _run_isolated(num_devices: int, wifi: bool) -> Dict:
+    args = [sys.executable, '-m', __spec__.name, '--child', str(num_devices)] + (['--wifi'] if wifi else [])
+    env = dict(os.environ, LIFX_NUM_LIGHTS=str(num_devices))
+    out = subprocess.run(args, check=True, stdout=subprocess.PIPE, env=env).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, cwd=os.path.dirname(__file__)).stdout.decode().strip() or None
+    except OSError:
+        return None
+
+
+# ======================================================================================================================
+# REPORTING
+
+def _print_table(res: Dict, baseline: Optional[Dict]):
+    base = {f['num_devices']: f for f in baseline['fleets']} if baseline else {}
+    if baseline and (baseline.get('wifi'), baseline.get('seed')) != (res['wifi'], res['seed']):
+        print(f'WARNING: baseline {baseline.get("commit")} ran with different network conditions')
+    for f in res['fleets']:
+        cache = f.get('packet_cache', {})
+        print(f'\n{f["num_devices"]} devices ({f["found"]} found), {f["threads"]} threads, '
+              f'{f["max_rss_mb"]:.1f} MB max rss, packet cache {cache.get("hits", 0)} hits/'
+              f'{cache.get("misses", 0)} misses')
+        print(f'{"op":<16}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"packets":>10}{"vs base p50":>13}')
+        for op, r in f['ops'].items():
+            vs = ''
+            b = base.get(f['num_devices'], {}).get('ops', {}).get(op)
+            if b and b['p50']:
+                ratio = r['p50'] / b['p50']
+                vs = f'{ratio:.2f}x' + (' !!' if ratio > REGRESSION_RATIO else '')
+            print(f'{op:<16}{r["p50"]:>10.2f}{r["p95"]:>10.2f}{r["p99"]:>10.2f}{r["packets"]:>10.1f}{vs:>13}')
+
+
+def main(args: List[str]):
+    parser = argparse.ArgumentParser(prog='python -m lifxlan3.bench', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, FLEET_SIZES)), help='comma-separated fleet sizes')
+    parser.add_argument('--wifi', action='store_true', help='simulate a lossy, rate-limited wi-fi network')
+    parser.add_argument('--out', help='write json results here')
+    parser.add_argument('--baseline', help='json results from another commit to compare against')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    opts = parser.parse_args(args)
+
+    if opts.child:
+        print(json.dumps(run(opts.child, opts.wifi)))
+        return
+
+    res = dict(commit=_git_commit(), python=platform.python_version(), wifi=opts.wifi, seed=SEED,
+               fleets=[_run_isolated(int(n), opts.wifi) for n in opts.sizes.split(',')])
+    baseline = None
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+
+    _print_table(res, baseline)
+    if opts.out:
+        with open(opts.out, 'w') as f:
+            json.dump(res, f, indent=1)
+    else:
+        print(json.dumps(res))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+"""
+threads and memory used to drive a fleet of simulated devices through nested group fan-out
+
+    python -m lifxlan3.bench.threads [--num-devices N]
+
+each fleet size runs in a fresh interpreter so peak rss isn't inherited from the previous one
+"""
+import json
+import resource
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from lifxlan3.colors import Color
+from lifxlan3.devices.device import ProductInfo
+from lifxlan3.devices.light import Light
+from lifxlan3.group import Group
+from lifxlan3.network.msgtypes import LightGet, LightState
+from lifxlan3.sim import Simulator, fleet
+from lifxlan3.utils import WaitPool
+
+__author__ = 'acushner'
+
+FLEET_SIZES = 10, 100, 1000
+LIGHTS_PER_GROUP = 10
+PRODUCT = 27  # the simulator's bulbs are a19s; set up front so nothing has to ask for its version
+
+
+# ======================================================================================================================
+# BENCHMARK
+
+def _refresh_group(g: Group):
+    """inner level of the fan-out: one task per light, waited on from inside an outer task"""
+    with WaitPool() as wp:
+        for l in g:
+            wp.submit(l.req_with_resp, LightGet, LightState)
+    return len(wp.results)
+
+
+def run(num_devices: int) -> Dict:
+    sim = Simulator(fleet(num_lights=num_devices)).start()
+    lights = [Light(d.mac_addr, sim.host, port=d.port) for d in sim]
+    for l in lights:
+        l.product_info, l.power_level = ProductInfo(1, PRODUCT, 0), 0
+    groups = [Group(lights[i:i + LIGHTS_PER_GROUP]) for i in range(0, num_devices, LIGHTS_PER_GROUP)]
+    everything = Group(lights)
+    peak_threads = threading.active_count()
+
+    start = time.perf_counter()
+    everything.set_color(Color(0, 0, 0, 3500), rapid=False)
+    everything.turn_on()
+    peak_threads = max(peak_threads, threading.active_count())
+
+    with WaitPool() as wp:
+        for g in groups:
+            wp.submit(_refresh_group, g)
+    if sum(wp.results) != num_devices:
+        raise AssertionError('not every light answered')
+    peak_threads = max(peak_threads, threading.active_count())
+
+    secs = time.perf_counter() - start
+    sim.stop()
+    rss_unit = 1 << 20 if sys.platform == 'darwin' else 1 << 10  # ru_maxrss is bytes on macos, kB elsewhere
+    return dict(num_devices=num_devices, secs=secs, threads=peak_threads,
+                max_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / rss_unit)
+
+
+def _run_isolated(num_devices: int) -> Dict:
+    out = subprocess.run([sys.executable, '-m', __spec__.name, '--num-devices', str(num_devices)],
+                         check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def __main(args: List[str]):
+    if args[:1] == ['--num-devices']:
+        print(json.dumps(run(int(args[1]))))
+        return
+
+    print(f'{"devices":>8}{"threads":>10}{"max rss (MB)":>15}{"secs":>8}')
+    for n in FLEET_SIZES:
+        r = _run_isolated(n)
+        print(f'{r["num_devices"]:>8}{r["threads"]:>10}{r["max_rss_mb"]:>15.1f}{r["secs"]:>8.2f}')
+
+
+if __name__ == '__main__':
+    __main(sys.argv[1:])
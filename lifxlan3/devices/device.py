@@ -13,23 +13,25 @@
 # Currently service and port are set during initialization and never updated.
 # This may need to change in the future to support multiple (service, port) pairs
 # per device, and also to capture in real time when a service is down (port = 0).
-import netifaces as ni
 from contextlib import suppress
 from datetime import datetime
-from socket import timeout
-from time import sleep, time
-from typing import NamedTuple, Optional, Dict
+from concurrent.futures import Future
+from typing import NamedTuple, Optional, Dict, List, Tuple, Type, Union, Callable, Iterable
 
-from lifxlan3.network.message import BROADCAST_MAC
+from lifxlan3.network.message import Message, header_templates
 from lifxlan3.network.msgtypes import Acknowledgement, GetGroup, GetHostFirmware, GetInfo, GetLabel, GetLocation, GetPower,\
     GetVersion, GetWifiFirmware, GetWifiInfo, SERVICE_IDS, SetLabel, SetPower, StateGroup, StateHostFirmware,\
     StateInfo, StateLabel, StateLocation, StatePower, StateVersion, StateWifiFirmware, StateWifiInfo, str_map
-from .products import features_map, product_map, light_products
+from .products import features_map, product_map, light_products, send_rate_map, DEFAULT_SEND_RATE
 from lifxlan3.settings import UNKNOWN, PowerSettings
-from lifxlan3.network.unpack import unpack_lifx_message
-from lifxlan3.utils import timer, exhaust, init_socket, WaitPool, init_log
-
-DEFAULT_TIMEOUT = .8  # second
+from lifxlan3.network import network
+from lifxlan3.network.batch import BatchedMessage, current_batch
+from lifxlan3.network.health import Health, Outcome
+from lifxlan3.network.rtt import RttStats
+from lifxlan3.network.transport import Transport, NoResponse, get_transport, outcome
+from lifxlan3.utils import timer, init_log
+
+DEFAULT_TIMEOUT = .8  # second. only for fixed timeouts: requests default to each device's adaptive rto
 DEFAULT_ATTEMPTS = 4
 
 VERBOSE = False
@@ -37,24 +39,9 @@ VERBOSE = False
 log = init_log(__name__)
 
 
-class NoResponse(Exception):
-    """raised when no response is recv'd"""
-
-
-def get_broadcast_addrs():
-    broadcast_addrs = []
-    for iface in ni.interfaces():
-        try:
-            ifaddr = ni.ifaddresses(iface)[ni.AF_INET][0]
-            if ifaddr['addr'] != '127.0.0.1':
-                broadcast_addrs.append(ifaddr['broadcast'])
-        except:  # for interfaces that don't support ni.AF_INET
-            pass
-    return broadcast_addrs
-
-
-UDP_BROADCAST_IP_ADDRS = get_broadcast_addrs()
-UDP_BROADCAST_PORT = 56700
+get_broadcast_addrs = network._get_broadcast_addrs
+UDP_BROADCAST_IP_ADDRS = network.UDP_BROADCAST_IP_ADDRS  # the same list, so `network.set_broadcast_addrs` applies here too
+UDP_BROADCAST_PORT = network.UDP_BROADCAST_PORT
 
 
 class TimeInfo(NamedTuple):
@@ -80,6 +67,18 @@ class ProductInfo(NamedTuple):
     version: str = UNKNOWN
 
 
+class RefreshRequest(NamedTuple):
+    """a Get message, the response(s) it expects, and how to cache the response on the device"""
+    msg_type: Type[Message]
+    response_type: Union[Type[Message], List[Type[Message]]]
+    update: Callable[[Message], None]
+    payload: Optional[Dict] = None
+
+
+# how to cache a response, and the future that will resolve to it
+PendingRefresh = Tuple[Callable[[Message], None], 'Future[Message]']
+
+
 class SupportsDesc:
     """return whether or not a certain feature is supported based on the member name"""
 
@@ -105,6 +104,7 @@ class Device(object):
         self.service = service
         self.source_id = source_id
         self.ip_addr = ip_addr  # IP addresses can change, though...
+        self.header_templates = header_templates(self.mac_addr, source_id)
 
         self.label = None
         self.location = None
@@ -113,8 +113,7 @@ class Device(object):
         self.host_firmware_info = FirmwareInfo()
         self.wifi_firmware_info = FirmwareInfo()
         self.product_info = ProductInfo()
-
-        self._wait_pool = WaitPool(12)
+        self._version_received = False  # products missing from `product_map` are still only asked about once
 
     ###########################################################################
     #                                                                          #
@@ -147,6 +146,11 @@ class Device(object):
     def product_features(self):
         return features_map.get(self.product)
 
+    @property
+    def send_rate(self) -> float:
+        """max messages per second; everything sent to this device is queued to stay under it"""
+        return send_rate_map.get(self.product, DEFAULT_SEND_RATE)
+
     @property
     def is_light(self) -> bool:
         self._refresh_version_info(only_if_needed=True)
@@ -183,66 +187,91 @@ class Device(object):
     # REFRESH LOCAL VALUES (grab data from lights and cache)
     # ==================================================================================================================
     @property
-    def _refresh_funcs(self):
-        return (self._refresh_label,
-                self._refresh_location,
-                self._refresh_group,
-                self._refresh_power,
-                self._refresh_host_firmware_info,
-                self._refresh_wifi_firmware_info,
-                self._refresh_version_info)
-
-    # noinspection PyUnreachableCode
+    def _refresh_requests(self) -> Tuple[RefreshRequest, ...]:
+        """the version is only asked for until it's known, e.g. not again after discovery classified the device"""
+        res = (RefreshRequest(GetLabel, StateLabel, self._update_label),
+               RefreshRequest(GetLocation, StateLocation, self._update_location),
+               RefreshRequest(GetGroup, StateGroup, self._update_group),
+               RefreshRequest(GetPower, StatePower, self._update_power),
+               RefreshRequest(GetHostFirmware, StateHostFirmware, self._update_host_firmware_info),
+               RefreshRequest(GetWifiFirmware, StateWifiFirmware, self._update_wifi_firmware_info))
+        if self._version_received:
+            return res
+        return res + (RefreshRequest(GetVersion, StateVersion, self._update_version_info),)
+
     @timer
     def refresh(self):
         """full refresh for all interesting values"""
-        with self._wait_pool as wp:
-            exhaust(map(wp.submit, self._refresh_funcs))
-
-        with suppress(NoResponse):
-            exhaust(f.result() for f in wp.futures)
-            return True
-
-        return False
+        return self._apply_refresh(self._request_refresh())
+
+    def _request_refresh(self) -> List[PendingRefresh]:
+        """send every Get for this device back-to-back without waiting for any responses"""
+        return [(r.update, self.send_request(r.msg_type, r.response_type, r.payload)) for r in self._refresh_requests]
+
+    @staticmethod
+    def _apply_refresh(pending: Iterable[PendingRefresh]) -> bool:
+        """
+        cache responses as they're resolved, returning whether all of them arrived
+
+        the transport retransmits each request until it's answered, so only the missing ones are retried
+        """
+        success = True
+        for update, fut in pending:
+            try:
+                update(fut.result())
+            except NoResponse:
+                success = False
+        return success
 
     def _refresh_label(self):
-        response = self.req_with_resp(GetLabel, StateLabel)
-        self.label = response.label.encode('utf-8')
-        if type(self.label).__name__ == 'bytes':  # Python 3
-            self.label = self.label.decode('utf-8')
+        self._update_label(self.req_with_resp(GetLabel, StateLabel))
 
     def _refresh_location(self):
-        response = self.req_with_resp(GetLocation, StateLocation)
-        self.location = response.label.encode('utf-8')
-        if type(self.location).__name__ == 'bytes':  # Python 3
-            self.location = self.location.decode('utf-8')
+        self._update_location(self.req_with_resp(GetLocation, StateLocation))
 
     def _refresh_group(self):
-        response = self.req_with_resp(GetGroup, StateGroup)
-        self.group = response.label.encode('utf-8')
-        if type(self.group).__name__ == 'bytes':  # Python 3
-            self.group = self.group.decode('utf-8')
+        self._update_group(self.req_with_resp(GetGroup, StateGroup))
 
     def _refresh_power(self):
-        response = self.req_with_resp(GetPower, StatePower)
-        self.power_level = response.power_level
+        self._update_power(self.req_with_resp(GetPower, StatePower))
 
     def _refresh_host_firmware_info(self):
-        response = self.req_with_resp(GetHostFirmware, StateHostFirmware)
-        build = response.build
-        version = float(str(str(response.version >> 16) + "." + str(response.version & 0xff)))
-        self.host_firmware_info = FirmwareInfo(build, version)
+        self._update_host_firmware_info(self.req_with_resp(GetHostFirmware, StateHostFirmware))
 
     def _refresh_wifi_firmware_info(self):
-        response = self.req_with_resp(GetWifiFirmware, StateWifiFirmware)
-        build = response.build
-        version = float(str(str(response.version >> 16) + "." + str(response.version & 0xff)))
-        self.wifi_firmware_info = FirmwareInfo(build, version)
+        self._update_wifi_firmware_info(self.req_with_resp(GetWifiFirmware, StateWifiFirmware))
 
     def _refresh_version_info(self, *, only_if_needed=False):
-        if not only_if_needed or (self.product is None or UNKNOWN in self.product_info):
-            r = self.req_with_resp(GetVersion, StateVersion)
-            self.product_info = ProductInfo(r.vendor, r.product, r.version)
+        if only_if_needed and (self._version_received or self.product in product_map):
+            return
+        self._update_version_info(self.req_with_resp(GetVersion, StateVersion))
+
+    def _update_label(self, response: StateLabel):
+        self.label = response.label
+
+    def _update_location(self, response: StateLocation):
+        self.location = response.label
+
+    def _update_group(self, response: StateGroup):
+        self.group = response.label
+
+    def _update_power(self, response: StatePower):
+        self.power_level = response.power_level
+
+    @staticmethod
+    def _firmware_info(response) -> FirmwareInfo:
+        version = float(str(str(response.version >> 16) + "." + str(response.version & 0xff)))
+        return FirmwareInfo(response.build, version)
+
+    def _update_host_firmware_info(self, response: StateHostFirmware):
+        self.host_firmware_info = self._firmware_info(response)
+
+    def _update_wifi_firmware_info(self, response: StateWifiFirmware):
+        self.wifi_firmware_info = self._firmware_info(response)
+
+    def _update_version_info(self, r: StateVersion):
+        self.product_info = ProductInfo(r.vendor, r.product, r.version)
+        self._version_received = True
 
     # ==================================================================================================================
     # GET DATA (grab data from lights but don't cache)
@@ -327,86 +356,89 @@ class Device(object):
     #                                                                          #
     ############################################################################
 
-    def _send_set_message(self, msg_type, payload: Optional[Dict] = None, timeout_secs=DEFAULT_TIMEOUT,
-                          max_attempts=1, *, rapid: bool):
-        """handle sending messages either rapidly or not"""
-        args = msg_type, payload, timeout_secs
+    def _send_set_message(self, msg_type, payload: Optional[Dict] = None, timeout_secs: Optional[float] = None,
+                          max_attempts=1, *, rapid: bool, on_done: Optional[Callable[[Outcome], None]] = None):
+        """
+        handle sending messages either rapidly or not, deferring to the current `batch` if there is one
+
+        `on_done` is called with the message's `Outcome`: `sent` for rapid messages, otherwise once it's acked or not
+        """
+        batch = current_batch()
+        if batch is not None:
+            batch.add(BatchedMessage(msg_type, self.mac_addr, self.source_id, payload or {}, self._addrs, rapid,
+                                     max_attempts if rapid else DEFAULT_ATTEMPTS, timeout_secs, self.send_rate,
+                                     self.label, self.verbose, on_done))
+            return
+
         if rapid:
-            self.fire_and_forget(*args, num_repeats=max_attempts)
-        else:
-            self.req_with_ack(*args)
+            self.fire_and_forget(msg_type, payload, timeout_secs, num_repeats=max_attempts)
+            if on_done is not None:
+                on_done(Outcome.sent)
+            return
+
+        fut = self.send_request(msg_type, Acknowledgement, payload, timeout_secs)
+        if on_done is not None:
+            on_done(outcome(fut))
+        fut.result()
+
+    @property
+    def transport(self) -> Transport:
+        return get_transport()
+
+    @property
+    def health(self) -> Health:
+        """whether this device has been answering; requests to an `open` device fail fast with `CircuitOpen`"""
+        return self.transport.health(self.mac_addr)
+
+    @property
+    def rtt(self) -> RttStats:
+        """this device's smoothed round trip time and retransmit timeout"""
+        return self.transport.rtt_stats(self.mac_addr)
 
-    # Don't wait for Acks or Responses, just send the same message repeatedly as fast as possible
-    def fire_and_forget(self, msg_type, payload: Optional[Dict] = None, timeout_secs=DEFAULT_TIMEOUT,
+    @property
+    def _addrs(self) -> List[Tuple[str, int]]:
+        """send to the device directly if we know its ip, otherwise broadcast"""
+        if self.ip_addr:
+            return [(self.ip_addr, self.port)]
+        return [(ip_addr, self.port) for ip_addr in network.UDP_BROADCAST_IP_ADDRS]
+
+    # Don't wait for Acks or Responses, just send the same message repeatedly as fast as the device allows
+    def fire_and_forget(self, msg_type, payload: Optional[Dict] = None, timeout_secs: Optional[float] = None,
                         num_repeats=DEFAULT_ATTEMPTS):
-        payload = payload or {}
-        with init_socket(timeout_secs) as sock:
-            msg = msg_type(self.mac_addr, self.source_id, seq_num=0, payload=payload, ack_requested=False,
-                           response_requested=False)
-            sent_msg_count = 0
-            sleep_interval = 0.05 if num_repeats > 20 else 0
-            while sent_msg_count < num_repeats:
-                if self.ip_addr:
-                    sock.sendto(msg.packed_message, (self.ip_addr, self.port))
-                else:
-                    for ip_addr in UDP_BROADCAST_IP_ADDRS:
-                        sock.sendto(msg.packed_message, (ip_addr, self.port))
-                if self.verbose:
-                    log.info("SEND: " + str(msg))
-                sent_msg_count += 1
-                sleep(sleep_interval)  # Max num of messages device can handle is 20 per second.
+        self.transport.send(msg_type, self.mac_addr, self.source_id, payload or {}, self._addrs,
+                            num_repeats=num_repeats, rate=self.send_rate, verbose=self.verbose)
 
     # Usually used for Set messages
-    def req_with_ack(self, msg_type, payload, timeout_secs=DEFAULT_TIMEOUT, max_attempts=DEFAULT_ATTEMPTS):
+    def req_with_ack(self, msg_type, payload, timeout_secs: Optional[float] = None, max_attempts=DEFAULT_ATTEMPTS):
         self.req_with_resp(msg_type, Acknowledgement, payload, timeout_secs, max_attempts)
 
     # Usually used for Get messages, or for state confirmation after Set (hence the optional payload)
-    def req_with_resp(self, msg_type, response_type, payload: Optional[Dict] = None, timeout_secs=DEFAULT_TIMEOUT,
-                      max_attempts=DEFAULT_ATTEMPTS):
+    def req_with_resp(self, msg_type, response_type, payload: Optional[Dict] = None,
+                      timeout_secs: Optional[float] = None, max_attempts=DEFAULT_ATTEMPTS, *, hedge=False):
+        return self.send_request(msg_type, response_type, payload, timeout_secs, max_attempts, hedge=hedge).result()
+
+    def send_request(self, msg_type, response_type, payload: Optional[Dict] = None,
+                     timeout_secs: Optional[float] = None, max_attempts=DEFAULT_ATTEMPTS,
+                     *, hedge=False) -> 'Future[Message]':
+        """
+        like `req_with_resp`, but return a future immediately instead of blocking
+
+        the transport's receiver thread resolves it, so there's no need for a thread per request.
+        `timeout_secs` of None retransmits on this device's adaptive rto (see `rtt`);
+        `hedge` sends an early duplicate for latency-sensitive calls
+        """
         # Need to put error checking here for arguments
         payload = payload or {}
         if not isinstance(response_type, list):
             response_type = [response_type]
-        success = False
-        device_response = None
-        with init_socket(timeout_secs) as sock:
-            ack_requested = len(response_type) == 1 and Acknowledgement in response_type
-            msg = msg_type(self.mac_addr, self.source_id, seq_num=0, payload=payload, ack_requested=ack_requested,
-                           response_requested=not ack_requested)
-            response_seen = False
-            attempts = 0
-            while not response_seen and attempts < max_attempts:
-                sent = False
-                start_time = time()
-                timedout = False
-                while not response_seen and not timedout:
-                    if not sent:
-                        if self.ip_addr:
-                            sock.sendto(msg.packed_message, (self.ip_addr, self.port))
-                        else:
-                            for ip_addr in UDP_BROADCAST_IP_ADDRS:
-                                sock.sendto(msg.packed_message, (ip_addr, self.port))
-                        sent = True
-                        if self.verbose:
-                            log.info("SEND: " + str(msg))
-                    try:
-                        data, (ip_addr, port) = sock.recvfrom(1024)
-                        response = unpack_lifx_message(data)
-                        if self.verbose:
-                            log.info("RECV: " + str(response))
-                        if type(response) in response_type:
-                            if response.source_id == self.source_id and (
-                                    response.target_addr == self.mac_addr or response.target_addr == BROADCAST_MAC):
-                                response_seen = True
-                                device_response = response
-                                self.ip_addr = ip_addr
-                                success = True
-                    except timeout:
-                        pass
-                    elapsed_time = time() - start_time
-                    timedout = True if elapsed_time > timeout_secs else False
-                attempts += 1
-            if not success:
-                raise NoResponse(f'WorkflowException: Did not receive {response_type!r} from {self.mac_addr!r} '
-                                 f'(Name: {self.label!r}) in response to {msg_type!r}')
-            return device_response
+        ack_requested = len(response_type) == 1 and Acknowledgement in response_type
+        fut = self.transport.request(msg_type, self.mac_addr, self.source_id, payload, self._addrs, response_type,
+                                     ack_requested=ack_requested, timeout_secs=timeout_secs,
+                                     max_attempts=max_attempts, name=self.label, verbose=self.verbose,
+                                     rate=self.send_rate, hedge=hedge)
+        fut.add_done_callback(self._update_ip_addr)
+        return fut
+
+    def _update_ip_addr(self, fut: 'Future[Message]'):
+        with suppress(Exception):
+            self.ip_addr = fut.result().ip_addr
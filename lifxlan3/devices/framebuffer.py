@@ -0,0 +1,187 @@
+"""
+a tile chain's canvas as one contiguous array of colors, flushed straight into `SetTileState64` packets
+
+    fb = Framebuffer.from_tile_chain(tc)
+    fb.draw(color_matrix)
+    fb[3, 4] = Colors.RED
+    fb.flush()
+"""
+import sys
+from array import array
+from itertools import chain
+from struct import Struct
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from lifxlan3.network.batch import batch
+from lifxlan3.network.encode import Packed, encode_set_tile_state64_into
+from lifxlan3.network.message import HEADER_SIZE_BYTES
+from lifxlan3.network.msgtypes import SetTileState64
+from lifxlan3.network.sendqueue import coalesce_key
+
+if TYPE_CHECKING:
+    from .tilechain import TileChain
+
+__author__ = 'acushner'
+
+HSBK = Sequence[int]
+Run = Tuple[int, int, int]  # offset into the packet, offset into the canvas, number of bytes
+
+TILE_WIDTH = TILE_HEIGHT = 8
+COLORS_PER_TILE = TILE_WIDTH * TILE_HEIGHT
+BYTES_PER_COLOR = 8  # 4 uint16s
+DURATION_OFFSET = HEADER_SIZE_BYTES + 6  # after tile_index, length, reserved, x, y, width
+COLORS_OFFSET = DURATION_OFFSET + 4
+
+_duration = Struct('<I')
+_swap_bytes = sys.byteorder != 'little'  # the canvas is kept in wire order
+_black = 0, 0, 0, 0
+
+
+def _wire_order(a: array) -> array:
+    if _swap_bytes:
+        a.byteswap()
+    return a
+
+
+def pack_colors(colors: Iterable[HSBK]) -> bytes:
+    """colors as they're laid out in a packet, e.g. to compare with what a tile was last sent"""
+    return _wire_order(array('H', chain.from_iterable(colors))).tobytes()
+
+
+class Placement(NamedTuple):
+    """where a tile's 8x8 pixels are on the canvas, and how many times they're rotated clockwise on the way"""
+    tile_idx: int
+    row: int
+    col: int
+    rotation: int = 0
+
+
+def _source_pixel(row, col, rotation) -> Tuple[int, int]:
+    """pixel of the unrotated 8x8 that ends up at (row, col) once rotated clockwise `rotation` times"""
+    for _ in range(rotation % 4):
+        row, col = TILE_HEIGHT - 1 - col, row
+    return row, col
+
+
+def _runs(p: Placement, canvas_width: int) -> List[Run]:
+    """slices that copy a tile's colors from the canvas into its packet, merged where they're contiguous"""
+    res = []
+    for i in range(COLORS_PER_TILE):
+        r, c = _source_pixel(*divmod(i, TILE_WIDTH), p.rotation)
+        dst = COLORS_OFFSET + i * BYTES_PER_COLOR
+        src = ((p.row + r) * canvas_width + p.col + c) * BYTES_PER_COLOR
+        if res and res[-1][0] + res[-1][2] == dst and res[-1][1] + res[-1][2] == src:
+            res[-1] = res[-1][0], res[-1][1], res[-1][2] + BYTES_PER_COLOR
+        else:
+            res.append((dst, src, BYTES_PER_COLOR))
+    return res
+
+
+class Framebuffer:
+    """
+    a canvas `shape` (rows, cols) pixels big for a `TileChain`, stored as one contiguous `array('H')` of hsbk values
+
+    draw on it, then `flush` to send each placed tile its 8x8 piece. every tile has a preallocated packet,
+    and the slices that copy its colors out of the canvas are worked out up front from its `Placement`, covering
+    both where the tile sits and how it's rotated. flushing never creates a python object per pixel,
+    and only sends tiles whose colors differ from what the chain last sent them
+    """
+
+    def __init__(self, tile_chain: 'TileChain', shape: Tuple[int, int], placements: Iterable[Placement]):
+        self.tile_chain = tile_chain
+        self.height, self.width = shape
+        self.canvas = array('H', bytes(self.height * self.width * BYTES_PER_COLOR))
+        self._canvas_bytes = memoryview(self.canvas).cast('B')
+
+        self.placements: Dict[int, Placement] = {}
+        self._runs: Dict[int, List[Run]] = {}
+        self._packets: Dict[int, bytearray] = {}
+        for p in placements:
+            if not (0 <= p.row <= self.height - TILE_HEIGHT and 0 <= p.col <= self.width - TILE_WIDTH):
+                raise ValueError(f'tile {p.tile_idx} at ({p.row}, {p.col}) does not fit on a {shape} canvas')
+            self.placements[p.tile_idx] = p
+            self._runs[p.tile_idx] = _runs(p, self.width)
+            packet = self._packets[p.tile_idx] = bytearray(SetTileState64._struct.size)
+            encode_set_tile_state64_into(packet, 0, tile_chain.mac_addr, tile_chain.source_id, 0, p.tile_idx,
+                                         [_black] * COLORS_PER_TILE)
+
+    @classmethod
+    def from_tile_chain(cls, tile_chain: 'TileChain') -> 'Framebuffer':
+        """a canvas laid out like the chain's tiles themselves, the same way `TileChain.tile_map` is"""
+        x_vals, y_vals = tile_chain._get_xy_vals()
+        x_vals = tile_chain._shift_axis_upper_left(x_vals)
+        y_vals = tile_chain._shift_axis_upper_left(y_vals, is_y=True)
+        width, height = tile_chain.canvas_dimensions
+        return cls(tile_chain, (height, width),
+                   (Placement(i, int(y * TILE_HEIGHT), int(x * TILE_WIDTH)) for i, (x, y) in
+                    enumerate(zip(x_vals, y_vals))))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.height, self.width
+
+    # ==================================================================================================================
+    # DRAWING
+    # ==================================================================================================================
+
+    def _index(self, row, col) -> int:
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise IndexError(f'({row}, {col}) is not on a {self.shape} canvas')
+        return (row * self.width + col) * 4
+
+    def __getitem__(self, rc: Tuple[int, int]) -> Tuple[int, int, int, int]:
+        i = self._index(*rc)
+        return tuple(_wire_order(self.canvas[i:i + 4]))
+
+    def __setitem__(self, rc: Tuple[int, int], color: HSBK):
+        i = self._index(*rc)
+        self.canvas[i:i + 4] = _wire_order(array('H', color))
+
+    def fill(self, color: HSBK):
+        self.canvas[:] = _wire_order(array('H', color)) * (self.height * self.width)
+
+    def draw(self, rows: Iterable[Iterable[HSBK]], offset: Tuple[int, int] = (0, 0)):
+        """copy rows of colors, e.g. a `ColorMatrix`, with their upper left at `offset`. what's off the canvas is dropped"""
+        row_offset, col_offset = offset
+        skip = max(0, -col_offset) * 4
+        start_col = max(0, col_offset)
+        for r, row in enumerate(rows, row_offset):
+            if r < 0:
+                continue
+            if r >= self.height:
+                break
+            vals = array('H', chain.from_iterable(row))
+            vals = vals[skip:skip + (self.width - start_col) * 4]
+            if vals:
+                i = (r * self.width + start_col) * 4
+                self.canvas[i:i + len(vals)] = _wire_order(vals)
+
+    # ==================================================================================================================
+    # SENDING
+    # ==================================================================================================================
+
+    def packet(self, tile_idx: int, duration=0) -> bytearray:
+        """tile `tile_idx`'s `SetTileState64` with its current colors, less seq_num and response flags"""
+        packet, canvas = self._packets[tile_idx], self._canvas_bytes
+        _duration.pack_into(packet, DURATION_OFFSET, duration)
+        for dst, src, num_bytes in self._runs[tile_idx]:
+            packet[dst:dst + num_bytes] = canvas[src:src + num_bytes]
+        return packet
+
+    def flush(self, duration=0, rapid=True, tile_idxs: Optional[Iterable[int]] = None, only_changed=True):
+        """
+        send every placed tile, or just `tile_idxs`, what's on the canvas
+
+        with `only_changed`, tiles already showing what's there are skipped, so an unchanged frame sends nothing.
+        see `TileChain.forget_sent_colors` for when that's not what you want
+        """
+        tc = self.tile_chain
+        with batch():
+            for idx in self.placements if tile_idxs is None else tile_idxs:
+                packet = self.packet(idx, duration)
+                colors = bytes(memoryview(packet)[COLORS_OFFSET:])
+                if only_changed and not tc._needs_sending(idx, colors):
+                    continue
+                key = coalesce_key(SetTileState64, dict(tile_index=idx, length=1, x=0, y=0, width=TILE_WIDTH))
+                tc._send_set_message(SetTileState64, Packed(packet[:], key), rapid=rapid,
+                                     on_done=tc._on_sent(idx, colors))
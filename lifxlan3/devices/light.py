@@ -4,15 +4,16 @@
 import os
 from contextlib import contextmanager
 from copy import copy
-from typing import Callable, Tuple
+from typing import Tuple
 
 from lifxlan3.base_api import LightAPI
 from lifxlan3.colors import ColorPower, Color, Colors
-from .device import Device
+from .device import Device, RefreshRequest
+from lifxlan3.network.batch import batch
 from lifxlan3.network.msgtypes import LightGet, LightGetInfrared, LightSetColor, LightSetInfrared, LightSetPower, LightSetWaveform, \
     LightState, LightStateInfrared
 from lifxlan3.settings import UNKNOWN, Waveform, global_settings
-from lifxlan3.utils import WaitPool, init_log
+from lifxlan3.utils import init_log
 
 log = init_log(__name__)
 
@@ -22,7 +23,6 @@ class Light(Device, LightAPI):
         super(Light, self).__init__(mac_addr, ip_addr, service, port, source_id, verbose)
         self.color = None
         self.infrared_brightness = None
-        self._wait_pool = WaitPool(2)
 
     ############################################################################
     #                                                                          #
@@ -44,8 +44,11 @@ class Light(Device, LightAPI):
         return f'{self.label}|||{self.product_name}'
 
     @property
-    def _refresh_funcs(self) -> Tuple[Callable]:
-        return super()._refresh_funcs + (self._refresh_light_state, self._refresh_infrared)
+    def _refresh_requests(self) -> Tuple[RefreshRequest, ...]:
+        res = super()._refresh_requests + (RefreshRequest(LightGet, LightState, self._update_light_state),)
+        if self.supports_infrared:
+            res += RefreshRequest(LightGetInfrared, LightStateInfrared, self._update_infrared),
+        return res
 
     @property
     def power(self):
@@ -72,7 +75,9 @@ class Light(Device, LightAPI):
 
     def _refresh_light_state(self):
         """get and update color, power_level, and label from light"""
-        response = self.req_with_resp(LightGet, LightState)
+        self._update_light_state(self.req_with_resp(LightGet, LightState))
+
+    def _update_light_state(self, response: LightState):
         self.color = Color(*response.color)
         self.power_level = response.power_level
         self.label = response.label
@@ -80,8 +85,10 @@ class Light(Device, LightAPI):
     def _refresh_infrared(self):
         """update infrared_brightness if supported"""
         if self.supports_infrared:
-            response = self.req_with_resp(LightGetInfrared, LightStateInfrared)
-            self.infrared_brightness = response.infrared_brightness
+            self._update_infrared(self.req_with_resp(LightGetInfrared, LightStateInfrared))
+
+    def _update_infrared(self, response: LightStateInfrared):
+        self.infrared_brightness = response.infrared_brightness
 
     def set_color(self, color: Color, duration=0, rapid=False, preserve_brightness: bool = None):
         if color:
@@ -105,11 +112,11 @@ class Light(Device, LightAPI):
 
     def set_color_power(self, cp: ColorPower, duration=0, rapid=False, preserve_brightness: bool = None):
         """set both color and power at the same time"""
-        with self._wait_pool as wp:
-            wp.submit(self.set_color, cp.color, duration=duration, rapid=rapid,
-                      preserve_brightness=self.validate_pb(preserve_brightness))
+        with batch():
+            self.set_color(cp.color, duration=duration, rapid=rapid,
+                           preserve_brightness=self.validate_pb(preserve_brightness))
             if cp.power is not None:
-                wp.submit(self.set_power, cp.power, duration=duration, rapid=rapid)
+                self.set_power(cp.power, duration=duration, rapid=rapid)
 
     def _replace_color(self, color: Color, duration, rapid, offset=False, **color_kwargs):
         """helper func for setting various Color attributes"""
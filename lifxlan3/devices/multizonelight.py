@@ -2,21 +2,26 @@
 # multizonelight.py
 
 import os
-from itertools import count
-from typing import List, Tuple, Callable
+from concurrent.futures import Future
+from typing import List, Dict
 
-from lifxlan3.utils import init_log, exhaust
+from lifxlan3.utils import init_log
 from lifxlan3.grid import GridLight, Dir
 from lifxlan3.themes import Theme
 from lifxlan3.colors import Color, ColorPower, Colors
+from .device import PendingRefresh
+from lifxlan3.network.batch import batch
 from .light import Light
 from lifxlan3.network.msgtypes import MultizoneGetColorZones, MultizoneSetColorZones, MultizoneStateMultizone, MultizoneStateZone
+from lifxlan3.network.transport import NoResponse
 
 log = init_log(__name__)
 rapid_default = True
 
 _reversed = {'strip 1'}
 
+ZONES_PER_RESPONSE = 8
+
 
 # TODO: store all multizone lights as groups of their constituent zones - ignore the base light - maybe?
 
@@ -39,7 +44,7 @@ class MultizoneLight(Light):
 
     @zones.setter
     def zones(self, vals: List['Zone']):
-        from .group import Group
+        from lifxlan3.group import Group
         self._zones = Group(vals, allow_dupes=True)
         self._init_grid()
 
@@ -51,20 +56,48 @@ class MultizoneLight(Light):
             cur_gl[Dir.right] = next_gl
             cur_gl = next_gl
 
-    @property
-    def _refresh_funcs(self) -> Tuple[Callable]:
-        # noinspection PyTypeChecker
-        return super()._refresh_funcs + (self._refresh_color_zones,)
+    def _request_refresh(self) -> List[PendingRefresh]:
+        return super()._request_refresh() + self._request_color_zones()
 
     def _refresh_color_zones(self):
-        zones = []
-        for i in count(step=8):
-            response = self.req_with_resp(MultizoneGetColorZones, [MultizoneStateZone, MultizoneStateMultizone],
-                                          dict(start_index=i, end_index=255))
-            zones.extend(Zone(self, i + ci, Color(*c)) for ci, c in enumerate(response.color))
-            if len(zones) >= response.count:
-                break
-        self.zones = zones
+        for update, fut in self._request_color_zones():
+            update(fut.result())
+
+    def _request_color_zones(self) -> List[PendingRefresh]:
+        """
+        one request per 8-zone chunk, all sent at once if we already know how many zones there are.
+        otherwise, the first response's `count` tells us which chunks are still needed
+        """
+        num_zones = len(self._zones) if '_zones' in vars(self) else ZONES_PER_RESPONSE
+        colors: Dict[int, Color] = {}
+        counts: List[int] = []
+
+        def update(response):
+            counts.append(response.count)
+            if isinstance(response, MultizoneStateZone):
+                colors[response.index] = Color(*response.color)
+            else:
+                colors.update((response.index + i, Color(*c)) for i, c in enumerate(response.color))
+
+        def finish(_):
+            if not counts:
+                return
+            count = counts[-1]
+            missing = [i for i in range(0, count, ZONES_PER_RESPONSE) if i not in colors]
+            if missing:
+                self._apply_refresh([(update, self._request_zone_chunk(i)) for i in missing])
+            if not all(i in colors for i in range(count)):
+                raise NoResponse(f'WorkflowException: missing zones from {self.label!r}')
+            self.zones = [Zone(self, i, colors[i]) for i in range(count)]
+
+        done = Future()
+        done.set_result(None)
+        pending = [(update, self._request_zone_chunk(i)) for i in range(0, num_zones, ZONES_PER_RESPONSE)]
+        return pending + [(finish, done)]
+
+    def _request_zone_chunk(self, start_index) -> 'Future[MultizoneStateMultizone]':
+        return self.send_request(MultizoneGetColorZones, [MultizoneStateZone, MultizoneStateMultizone],
+                                 dict(start_index=start_index, end_index=start_index + ZONES_PER_RESPONSE - 1))
 
     def set_zone_color(self, color: Color, duration=0, rapid=rapid_default, apply=1, start_index=None, end_index=None):
         """
@@ -85,9 +118,9 @@ class MultizoneLight(Light):
 
     def set_zone_colors(self, colors: List[Color], duration=0, rapid=False):
         """set first `len(colors)` zones to `colors`"""
-        with self._wait_pool as wp:
-            exhaust(wp.submit(self.set_zone_color, color, duration, rapid, apply=0, start_index=i, end_index=i + 1)
-                    for (i, color) in enumerate(colors))
+        with batch():
+            for i, color in enumerate(colors):
+                self.set_zone_color(color, duration, rapid, apply=0, start_index=i, end_index=i + 1)
         self.set_zone_color(Colors.DEFAULT, 0, False, apply=2)
 
     def set_theme(self, theme: Theme, power_on=True, duration=0, rapid=rapid_default):
@@ -232,3 +232,11 @@ features_map = {1: {"color": True,
                      "min_kelvin": 2700,
                      "max_kelvin": 2700}
                 }
+
+# messages per second a device can keep up with. lifx recommends no more than 20.
+# strips and tiles are driven with a message per zone range/tile, so they're allowed more
+DEFAULT_SEND_RATE = 20
+send_rate_map = {31: 50,
+                 32: 50,
+                 38: 50,
+                 55: 100}
@@ -1,40 +1,70 @@
 import os
-from typing import Optional
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional, Tuple, Callable
 
+from .framebuffer import Framebuffer, Placement, pack_colors
 from .light import Light
 from lifxlan3.network.msgtypes import GetTileState64, StateTileState64, SetTileState64, GetDeviceChain, StateDeviceChain, \
-    SetUserPosition
-from lifxlan3.utils import exhaust, init_log, WaitPool
+    SetUserPosition, LightSetColor, LightSetWaveform
+from lifxlan3.network.batch import batch
+from lifxlan3.network.health import Outcome
+from lifxlan3.utils import init_log
 
 log = init_log(__name__)
 
+# messages that recolor every tile at once
+_recolors = frozenset({LightSetColor, LightSetWaveform})
+
+# frames an unchanged tile whose last send wasn't acked is skipped before it's sent again, in case that packet was lost
+RESEND_AFTER = 30
+
 
 class TileChain(Light):
     def __init__(self, mac_addr, ip_addr, service=1, port=56700, source_id=os.getpid(), verbose=False):
         super(TileChain, self).__init__(mac_addr, ip_addr, service, port, source_id, verbose)
-        self._wait_pool = WaitPool(5)
-        self.tile_info = None
-        self.tile_count = None
-        self.tile_map = None
-        self.canvas_dimensions = None
-        self.get_tile_info()
-        self._get_tile_map()
-        self._get_canvas_dimensions()
+
+        # chain layout is fetched on first use rather than on construction
+        self._tile_info = None
+        self._tile_count = None
+        self._tile_map = None
+        self._canvas_dimensions = None
+
+        # tile index -> colors it was last sent whole, as packed by `pack_colors`, once that send went out
+        self._sent_colors: Dict[int, bytes] = {}
+        # tile index -> frames skipped since its last send, for tiles whose last send was rapid (so never acked)
+        self._unacked_skips: Dict[int, int] = {}
+        # bumped by `forget_sent_colors`, so a send made before it can't put its colors back
+        self._forgotten = 0
+
+    @property
+    def tile_info(self):
+        return self.get_tile_info()
+
+    @property
+    def tile_count(self):
+        return self.get_tile_count()
+
+    @property
+    def tile_map(self):
+        return self._get_tile_map()
+
+    @property
+    def canvas_dimensions(self):
+        return self._get_canvas_dimensions()
 
     def get_tile_info(self, refresh_cache=False):
         """set tile info and count"""
-        if self.tile_info is None or refresh_cache:
+        if self._tile_info is None or refresh_cache:
             response = self.req_with_resp(GetDeviceChain, StateDeviceChain)
-            self.tile_info = [Tile.from_response(t) for t, _ in zip(response.tile_devices, range(response.total_count))]
-            self.tile_count = response.total_count
-        return self.tile_info
+            self._tile_info = [Tile.from_response(t) for t, _ in zip(response.tile_devices, range(response.total_count))]
+            self._tile_count = response.total_count
+        return self._tile_info
 
     def get_tile_count(self, refresh_cache=False):
         """set tile count"""
-        if self.tile_count is None or refresh_cache:
-            response = self.req_with_resp(GetDeviceChain, StateDeviceChain)
-            self.tile_count = response.total_count
-        return self.tile_count
+        if self._tile_count is None or refresh_cache:
+            self.get_tile_info(refresh_cache=True)
+        return self._tile_count
 
     def _validate_tile_access(self, tile_idx):
         """ensure valid tile index"""
@@ -47,29 +77,103 @@ class TileChain(Light):
 
     def get_tile_colors(self, tile_idx, x=0, y=0, width=8):
         """get colors for individual tile"""
+        return self._request_tile_colors(tile_idx, x, y, width).result()
+
+    def _request_tile_colors(self, tile_idx, x=0, y=0, width=8) -> 'Future[StateTileState64]':
         self._validate_tile_access(tile_idx)
         payload = dict(tile_index=tile_idx, length=1, reserved=0, x=x, y=y, width=width)
-        return self.req_with_resp(GetTileState64, StateTileState64, payload)
+        return self.send_request(GetTileState64, StateTileState64, payload)
 
     def get_tilechain_colors(self, start_tile_idx=0, num_tiles: Optional[int] = None):
         """get colors for num_tiles starting from start_tile_idx"""
-        with self._wait_pool as wp:
-            exhaust(wp.submit(self.get_tile_colors, tile_idx)
-                    for tile_idx in self._get_tile_range(start_tile_idx, num_tiles))
-        return wp.results
+        futures = [self._request_tile_colors(tile_idx) for tile_idx in self._get_tile_range(start_tile_idx, num_tiles)]
+        return [f.result() for f in futures]
 
     def set_tile_colors(self, start_index, colors, duration=0, tile_count=1, x=0, y=0, width=8, rapid=False):
         """set colors for individual tile"""
         self._validate_tile_access(start_index)
+        self.forget_sent_colors(range(start_index, start_index + tile_count))
+        return self._set_tile_colors(start_index, colors, duration, tile_count, x, y, width, rapid)
 
+    def _set_tile_colors(self, start_index, colors, duration, tile_count, x, y, width, rapid, on_done=None):
         payload = dict(tile_index=start_index, length=tile_count, colors=colors, duration=duration, reserved=0, x=x,
                        y=y, width=width)
-        return self._send_set_message(SetTileState64, payload, rapid=rapid)
+        return self._send_set_message(SetTileState64, payload, rapid=rapid, on_done=on_done)
+
+    def set_tilechain_colors(self, idx_colors_map, duration=0, rapid=True, only_changed=True):
+        """
+        set each tile in `idx_colors_map` to its 64 colors
+
+        with `only_changed`, tiles already showing their colors are skipped, so an unchanged frame sends nothing.
+        a tile only counts as showing them once they've gone out: acked, or sent rapidly (see `RESEND_AFTER`)
+        """
+        with batch():
+            for i, c in idx_colors_map.items():
+                self._validate_tile_access(i)
+                packed = pack_colors(c)
+                if only_changed and not self._needs_sending(i, packed):
+                    continue
+                self._set_tile_colors(i, c, duration, 1, 0, 0, 8, rapid, on_done=self._on_sent(i, packed))
+
+    def _needs_sending(self, tile_idx, packed_colors: bytes) -> bool:
+        """
+        whether tile `tile_idx` might not be showing `packed_colors`: it was last sent something else,
+        or it's been `RESEND_AFTER` frames since it was sent them without an ack
+        """
+        if self._sent_colors.get(tile_idx) != packed_colors:
+            return True
+        if tile_idx not in self._unacked_skips:
+            return False
+        self._unacked_skips[tile_idx] += 1
+        return self._unacked_skips[tile_idx] >= RESEND_AFTER
+
+    def _on_sent(self, tile_idx, packed_colors: bytes) -> Callable[[Outcome], None]:
+        """for `_send_set_message`: remember what tile `tile_idx` was sent if it went out, forget the tile if not"""
+        forgotten = self._forgotten
+
+        def on_done(o: Outcome):
+            if o not in (Outcome.ok, Outcome.sent):
+                self._sent_colors.pop(tile_idx, None)
+                self._unacked_skips.pop(tile_idx, None)
+            elif forgotten == self._forgotten:
+                self._sent_colors[tile_idx] = packed_colors
+                if o is Outcome.sent:
+                    self._unacked_skips[tile_idx] = 0
+                else:
+                    self._unacked_skips.pop(tile_idx, None)
+
+        return on_done
+
+    def forget_sent_colors(self, tile_idxs: Optional[Iterable[int]] = None):
+        """
+        forget what tiles, all by default, were last sent, so the next frame sends them whatever it is
+
+        needed when something else changes them, e.g. another app or a power cycle
+        """
+        self._forgotten += 1
+        if tile_idxs is None:
+            self._sent_colors.clear()
+            self._unacked_skips.clear()
+        for i in tile_idxs or ():
+            self._sent_colors.pop(i, None)
+            self._unacked_skips.pop(i, None)
+
+    def _send_set_message(self, msg_type, payload: Optional[Dict] = None, timeout_secs: Optional[float] = None,
+                          max_attempts=1, *, rapid: bool, on_done: Optional[Callable[[Outcome], None]] = None):
+        if msg_type in _recolors:
+            self.forget_sent_colors()
+        return super()._send_set_message(msg_type, payload, timeout_secs, max_attempts, rapid=rapid, on_done=on_done)
+
+    def framebuffer(self, shape: Optional[Tuple[int, int]] = None,
+                    placements: Optional[Iterable[Placement]] = None) -> Framebuffer:
+        """
+        a `Framebuffer` to draw frames on and flush to this chain
 
-    def set_tilechain_colors(self, idx_colors_map, duration=0, rapid=True):
-        """set colors for num_tiles starting from start_tile_idx"""
-        exhaust(self._wait_pool.dispatch(self.set_tile_colors, i, c, duration, 1, 0, 0, 8, rapid)
-                for i, c in idx_colors_map.items())
+        laid out like the tiles themselves by default, or as `placements` on a canvas `shape` (rows, cols) big
+        """
+        if placements is None:
+            return Framebuffer.from_tile_chain(self)
+        return Framebuffer(self, shape, placements)
 
     # ==================================================================================================================
     # HELPER FUNCTIONS
@@ -116,7 +220,7 @@ class TileChain(Light):
         return axis_vals
 
     def _get_canvas_dimensions(self, refresh_cache=False):
-        if (self.canvas_dimensions is None) or refresh_cache:
+        if (self._canvas_dimensions is None) or refresh_cache:
             x_vals, y_vals = self._get_xy_vals()
             min_x = min(x_vals)
             max_x = max(x_vals)
@@ -128,11 +232,11 @@ class TileChain(Light):
             tile_height = 8  # TO DO: get these programmatically for each light from the tile info
             canvas_x = int(x_tilespan * tile_width)
             canvas_y = int(y_tilespan * tile_height)
-            self.canvas_dimensions = (canvas_x, canvas_y)
-        return self.canvas_dimensions
+            self._canvas_dimensions = (canvas_x, canvas_y)
+        return self._canvas_dimensions
 
     def _get_tile_map(self, refresh_cache=False):
-        if (self.tile_map is None) or refresh_cache:
+        if (self._tile_map is None) or refresh_cache:
             num_tiles = self.get_tile_count()
             tile_width = 8  # TO DO: get these programmatically for each light from the tile info
             tile_height = 8  # TO DO: get these programmatically for each light from the tile info
@@ -159,8 +263,8 @@ class TileChain(Light):
 
             # for row in tile_map:
             #    print(row)
-            self.tile_map = tile_map
-        return self.tile_map
+            self._tile_map = tile_map
+        return self._tile_map
 
 
 class Tile(object):
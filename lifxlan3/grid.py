@@ -29,13 +29,14 @@ class Dir(Enum):
     left = 'left'
 
     def __neg__(self):
-        return dirs[(dirs[self] + 2) % len(dirs)]
+        return _dirs_list[(dirs[self] + 2) % len(dirs)]
 
     def __next__(self):
-        return dirs[(dirs[self] + 1) % len(dirs)]
+        return _dirs_list[(dirs[self] + 1) % len(dirs)]
 
 
 dirs = {d: idx for idx, d in enumerate(Dir)}
+_dirs_list = list(Dir)
 
 
 class GridLight:
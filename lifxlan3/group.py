@@ -1,26 +1,34 @@
 import os
+from threading import Lock
+from concurrent.futures import Future
 from contextlib import suppress, contextmanager
 from functools import partial, wraps
 from itertools import chain, repeat, groupby
-from typing import List, Union, Dict, Optional, Iterable, Any
+from typing import List, Union, Dict, Optional, Iterable, Any, NamedTuple, Tuple, Set
 
 from lifxlan3.base_api import LightAPI
 from .colors import ColorPower, Color
+from .inventory import Inventory, DeviceRecord, device_type
 from .devices.device import Device
 from .devices.light import Light
-from lifxlan3.network.msgtypes import GetService, StateService
+from .devices.tilechain import TileChain
+from lifxlan3.network.msgtypes import Acknowledgement, GetGroup, GetLabel, GetLocation, GetPower, GetVersion, \
+    LightGet, LightSetColor, LightSetPower, LightState, StateGroup, StateLabel, StateLocation, StatePower, \
+    StateService, StateVersion
 from lifxlan3.devices.multizonelight import MultizoneLight
-from lifxlan3.network.network import broadcast_with_resp
-from .settings import Waveform, TOTAL_NUM_LIGHTS
+from lifxlan3.network.batch import Batch, batch, current_batch
+from lifxlan3.network.health import Outcome
+from lifxlan3.network.network import broadcast, discover, sweep, MessageType, SWEEP_TIMEOUT
+from lifxlan3.network.sendqueue import coalesce_key
+from lifxlan3.network.transport import NoResponse, outcome, get_transport
+from .settings import Waveform, TOTAL_NUM_LIGHTS, PowerSettings
 from .themes import Theme
-from .devices.tilechain import TileChain
-from .utils import WaitPool, exhaust, timer, init_log
+from .utils import WaitPool, timer, init_log
 
 rapid_default = True
 
 log = init_log(__name__)
 
-
 def _call_on_lights(func=None, *, func_name_override=None, light_type='color_lights'):
     """
     call the wrapped `func.__name__` on all lights in the given
@@ -29,21 +37,58 @@ def _call_on_lights(func=None, *, func_name_override=None, light_type='color_lig
 
     changing `light_type` in the decorator call will allow you to
     forward calls to multizone and tile light types
+
+    the calls run inline in a `batch`, so every light's message is sent in one
+    loop from the shared socket rather than from a thread per light.
+    return each light's `Outcome`
     """
     if func is None:
         return partial(_call_on_lights, light_type=light_type, func_name_override=func_name_override)
     func_name = func_name_override or func.__name__
 
     @wraps(func)
-    def wrapper(self: 'Group', *args, **kwargs):
-        with self._wait_pool as wp:
-            exhaust(wp.submit(getattr(l, func_name), *args, **kwargs) for l in getattr(self, light_type))
-        return self._wait_pool.futures
+    def wrapper(self: 'Group', *args, **kwargs) -> 'Outcomes':
+        lights = getattr(self, light_type)
+        with batch() as b:
+            for l in lights:
+                getattr(l, func_name)(*args, **kwargs)
+        return _outcomes(lights, b)
 
     return wrapper
 
 
 LightAttrDict = Dict[Light, Any]
+Outcomes = Dict[Device, Outcome]
+
+
+def _outcomes(devices: Iterable[Device], b: Batch) -> Outcomes:
+    """per-device results of a batch. devices with nothing to send count as `ok`"""
+    return {d: b.outcomes.get(d.mac_addr, Outcome.ok) for d in devices}
+
+
+def _merge_outcomes(*outcomes: Outcomes) -> Outcomes:
+    res = {}
+    for o in outcomes:
+        for d, v in o.items():
+            res[d] = Outcome.worst((res.get(d, Outcome.ok), v))
+    return res
+
+
+class SweepType(NamedTuple):
+    """a Get that can be broadcast to the whole lan and the `Device` method that caches its response"""
+    msg_type: MessageType
+    response_type: MessageType
+    update: str
+    lights_only: bool = False
+
+
+SWEEP_TYPES = dict(light_state=SweepType(LightGet, LightState, '_update_light_state', lights_only=True),
+                   power=SweepType(GetPower, StatePower, '_update_power'),
+                   label=SweepType(GetLabel, StateLabel, '_update_label'),
+                   group=SweepType(GetGroup, StateGroup, '_update_group'),
+                   location=SweepType(GetLocation, StateLocation, '_update_location'),
+                   version=SweepType(GetVersion, StateVersion, '_update_version_info'))
+DEFAULT_SWEEP = 'light_state', 'label', 'group', 'location'
 
 
 class _GetFromLights:
@@ -73,11 +118,13 @@ class Group(LightAPI):
     everything can be done through `Groups`. you will use this all the time
     """
 
-    def __init__(self, devices: Iterable[Device], name: Optional[str] = None, *, allow_dupes=False):
+    def __init__(self, devices: Iterable[Device], name: Optional[str] = None, *, allow_dupes=False,
+                 lan: Optional['LifxLAN'] = None):
+        """`lan`: the `LifxLAN` these devices came from, if any. lets a group that is the whole lan use broadcasts"""
         self.allow_dupes = allow_dupes
+        self._lan = lan
         self.devices = devices
         self.name = name or ''
-        self._wait_pool = WaitPool(TOTAL_NUM_LIGHTS)
 
     @property
     def devices(self):
@@ -89,15 +136,22 @@ class Group(LightAPI):
             devices = set(devices)
         self._devices = sorted(devices)
 
-    def refresh(self):
-        with self._wait_pool as wp:
-            futures = {d: wp.submit(d.refresh) for d in self.devices}
+    def refresh(self) -> Outcomes:
+        """
+        every Get for every device goes out before waiting on any of them
 
-        for d, fut in futures.items():
-            if not fut.result():
-                print(f'ERROR with device with name, mac addr {d.label, d.mac_addr}, '
-                      f'removing from group. result: {fut.result()}')
-                self.remove_device(d)
+        devices that don't respond stay in the group: their circuits open (see `Device.health`),
+        so later calls skip them until they answer a probe
+        """
+        pending = {d: d._request_refresh() for d in self.devices}
+
+        res = {}
+        for d, p in pending.items():
+            d._apply_refresh(p)
+            res[d] = Outcome.worst(outcome(fut) for _, fut in p)
+            if res[d] is not Outcome.ok:
+                log.warning(f'ERROR with device with name, mac addr {d.label, d.mac_addr}: {res[d].name}')
+        return res
 
     # ==================================================================================================================
     # GROUP PROPERTIES
@@ -106,37 +160,37 @@ class Group(LightAPI):
     # noinspection PyTypeChecker
     @property
     def lights(self) -> 'LightGroup':
-        return LightGroup(l for l in self.devices if l.is_light)
+        return LightGroup((l for l in self.devices if l.is_light), lan=self._lan)
 
     # noinspection PyTypeChecker
     @property
     def color_lights(self) -> 'LightGroup':
-        return LightGroup(l for l in self.devices if l.supports_color)
+        return LightGroup((l for l in self.devices if l.supports_color), lan=self._lan)
 
     # noinspection PyTypeChecker
     @property
     def multizone_lights(self) -> 'MultizoneLightGroup':
-        return MultizoneLightGroup(l for l in self.devices if l.supports_multizone)
+        return MultizoneLightGroup((l for l in self.devices if l.supports_multizone), lan=self._lan)
 
     # noinspection PyTypeChecker
     @property
     def infrared_lights(self) -> 'LightGroup':
-        return LightGroup(l for l in self.devices if l.supports_infrared)
+        return LightGroup((l for l in self.devices if l.supports_infrared), lan=self._lan)
 
     # noinspection PyTypeChecker
     @property
     def tilechain_lights(self) -> 'LightGroup':
-        return LightGroup(l for l in self.devices if l.supports_chain)
+        return LightGroup((l for l in self.devices if l.supports_chain), lan=self._lan)
 
     @property
     def on_lights(self) -> 'Group':
         """group of lights that are currently on"""
-        return Group((l for l, p in self.power.items() if p), 'ON')
+        return Group((l for l, p in self.power.items() if p), 'ON', lan=self._lan)
 
     @property
     def off_lights(self) -> 'Group':
         """group of lights that are currently off"""
-        return Group((l for l, p in self.power.items() if not p), 'OFF')
+        return Group((l for l, p in self.power.items() if not p), 'OFF', lan=self._lan)
 
     # ==================================================================================================================
     # ALTER GROUP IN MEMORY
@@ -157,13 +211,22 @@ class Group(LightAPI):
     # SET LIGHT VALUES IN GROUP
     # ==================================================================================================================
 
-    def set_power(self, power: Union[int, LightAttrDict], duration=0, rapid=rapid_default):
+    def set_power(self, power: Union[int, LightAttrDict], duration=0, rapid=rapid_default) -> Outcomes:
         devices, powers = self.devices, repeat(power)
         if isinstance(power, dict):
             devices, powers = zip(*power.items())
+            if len(set(map(PowerSettings.validate, powers))) == 1:
+                power = powers[0]
 
-        with self._wait_pool as wp:
-            exhaust(wp.submit(self._set_power_helper, d, p, duration, rapid) for d, p in zip(devices, powers))
+        if not isinstance(power, dict):
+            res = self._broadcast_power(devices, power, duration, rapid)
+            if res is not None:
+                return res
+
+        with batch() as b:
+            for d, p in zip(devices, powers):
+                self._set_power_helper(d, p, duration, rapid)
+        return _outcomes(devices, b)
 
     @staticmethod
     def _set_power_helper(device, power, duration, rapid):
@@ -177,18 +240,39 @@ class Group(LightAPI):
                      *, skew_ratio=.5, is_transient=True, rapid=False):
         """set waveform on color lights"""
 
-    @_call_on_lights
-    def set_color(self, color: Color, duration=0, rapid=rapid_default, preserve_brightness: bool = None):
+    def set_color(self, color: Color, duration=0, rapid=rapid_default, preserve_brightness: bool = None) -> Outcomes:
+        """set color on color lights"""
+        res = self._broadcast_color(self.color_lights, color, duration, rapid, preserve_brightness)
+        if res is None:
+            res = self._set_color(color, duration, rapid, preserve_brightness)
+        return res
+
+    @_call_on_lights(func_name_override='set_color')
+    def _set_color(self, color: Color, duration=0, rapid=rapid_default, preserve_brightness: bool = None):
         """set color on color lights"""
 
     def set_color_power(self, cp: Union[ColorPower, Dict[Light, ColorPower]],
-                        duration=0, rapid=True, preserve_brightness: bool = None):
+                        duration=0, rapid=True, preserve_brightness: bool = None) -> Outcomes:
         """set color and power on color lights"""
         if isinstance(cp, ColorPower):
-            return self._set_color_power(cp, duration, rapid)
+            lights = self.color_lights
+            res = self._broadcast_color(lights, cp.color, duration, rapid, preserve_brightness)
+            if res is None:
+                return self._set_color_power(cp, duration, rapid)
+            if cp.power is not None:
+                power = self._broadcast_power(lights, cp.power, duration, rapid)
+                if power is None:
+                    with batch() as b:
+                        for l in lights:
+                            l.set_power(cp.power, duration, rapid)
+                    power = _outcomes(lights, b)
+                res = _merge_outcomes(res, power)
+            return res
 
-        with self._wait_pool as wp:
-            exhaust(wp.submit(l.set_color_power, _cp, duration, rapid, preserve_brightness) for l, _cp in cp.items())
+        with batch() as b:
+            for l, _cp in cp.items():
+                l.set_color_power(_cp, duration, rapid, preserve_brightness)
+        return _outcomes(cp, b)
 
     @_call_on_lights(func_name_override='set_color_power')
     def _set_color_power(self, cp: ColorPower, duration=0, rapid=True, preserve_brightness: bool = None):
@@ -214,20 +298,100 @@ class Group(LightAPI):
     def set_infrared(self, infrared_brightness):
         """set infrared on color lights"""
 
-    def set_theme(self, theme: Theme, power_on=True, duration=0, rapid=True, preserve_brightness=None):
+    def set_theme(self, theme: Theme, power_on=True, duration=0, rapid=True, preserve_brightness=None) -> Outcomes:
         colors = theme.get_colors(len(self))
-        with self._wait_pool as wp:
-            exhaust(wp.submit(l.set_color_power, ColorPower(c, power_on), duration, rapid, preserve_brightness)
-                    for l, c in zip(self, colors))
+        with batch() as b:
+            for l, c in zip(self, colors):
+                l.set_color_power(ColorPower(c, power_on), duration, rapid, preserve_brightness)
+        return _outcomes(self, b)
 
-    @_call_on_lights
-    def turn_on(self, duration=0):
+    def turn_on(self, duration=0) -> Outcomes:
         """turn on lights"""
+        res = self._broadcast_power(self.color_lights, 1, duration, rapid=False)
+        return self._turn_on(duration) if res is None else res
 
-    @_call_on_lights
-    def turn_off(self, duration=0):
+    def turn_off(self, duration=0) -> Outcomes:
+        """turn off lights"""
+        res = self._broadcast_power(self.color_lights, 0, duration, rapid=False)
+        return self._turn_off(duration) if res is None else res
+
+    @_call_on_lights(func_name_override='turn_on')
+    def _turn_on(self, duration=0):
+        """turn on lights"""
+
+    @_call_on_lights(func_name_override='turn_off')
+    def _turn_off(self, duration=0):
         """turn off lights"""
 
+    # ==================================================================================================================
+    # LAN-WIDE BROADCAST FAST PATH
+    # ==================================================================================================================
+    def _covers_lan(self, devices: Iterable[Device]) -> bool:
+        """whether `devices` is this group's whole lan, so a tagged broadcast reaches them and only them"""
+        return self._lan is not None and self._lan._covers(devices)
+
+    @staticmethod
+    def _clear_to_broadcast(devices: Iterable[Device], msg_type: MessageType, payload: Dict) -> bool:
+        """
+        whether a broadcast would be the last word for all `devices`: nothing for them is waiting in an open batch,
+        and once the queued messages it supersedes are dropped, nothing's left in their send queues either.
+        otherwise a unicast sent after the broadcast would override it and the cache would be wrong
+        """
+        if current_batch() is not None:
+            return False
+        return get_transport().discard_queued((d.mac_addr for d in devices), coalesce_key(msg_type, payload))
+
+    def _broadcast_color(self, lights: Iterable[Light], color: Color, duration, rapid,
+                         preserve_brightness) -> Optional[Outcomes]:
+        """set every light to the same color with a single broadcast, if possible"""
+        lights = list(lights)
+        if not color or Light.validate_pb(preserve_brightness) or not self._covers_lan(lights):
+            return None
+        color = color.clamped
+        payload = dict(color=color, duration=duration)
+        if not self._clear_to_broadcast(lights, LightSetColor, payload):
+            return None
+        log.info(f'setting lan color to {color} over {duration} msecs')
+        for l in lights:
+            l.color = color
+            if isinstance(l, TileChain):
+                l.forget_sent_colors()
+        return self._broadcast_set(lights, LightSetColor, payload, rapid)
+
+    def _broadcast_power(self, devices: Iterable[Device], power, duration, rapid) -> Optional[Outcomes]:
+        """set every light to the same power with a single broadcast, if possible"""
+        devices = list(devices)
+        if not all(d.is_light for d in devices) or not self._covers_lan(devices):
+            return None
+        power = PowerSettings.validate(power)
+        payload = dict(power_level=power, duration=duration)
+        if not self._clear_to_broadcast(devices, LightSetPower, payload):
+            return None
+        log.info(f'setting lan power to {power} over {duration} msecs')
+        for d in devices:
+            d.power_level = power
+        return self._broadcast_set(devices, LightSetPower, payload, rapid)
+
+    @staticmethod
+    def _broadcast_set(devices: List[Device], msg_type: MessageType, payload: Dict, rapid) -> Outcomes:
+        """
+        `rapid`: fire the broadcast a few times and move on
+        otherwise: broadcast once asking for acks, then unicast to whoever didn't ack
+        """
+        if rapid:
+            broadcast(msg_type, os.getpid(), payload)
+            return dict.fromkeys(devices, Outcome.sent)
+
+        acks = sweep(os.getpid(), {msg_type: Acknowledgement}, payloads={msg_type: payload},
+                     expected={msg_type: [d.mac_addr for d in devices]})[msg_type]
+        res = {d: Outcome.ok for d in devices if d.mac_addr in acks}
+        for d in devices:
+            if d not in res:
+                res[d] = outcome(d.send_request(msg_type, Acknowledgement, payload))
+                if res[d] is Outcome.failed:
+                    log.warning(f'{d.label!r} did not ack broadcast {msg_type.__name__}')
+        return res
+
     # ==================================================================================================================
     # GET SETTINGS FROM LIGHTS (reads currently stored values)
     # ==================================================================================================================
@@ -240,14 +404,73 @@ class Group(LightAPI):
     # REFRESH SETTINGS FROM LIGHTS (calls out to lights)
     # ==================================================================================================================
     @timer
-    @_call_on_lights(func_name_override='_refresh_light_state', light_type='devices')
     def refresh_power(self):
         """refresh all lights' power"""
+        return self._refresh_light_states(self.lights)
 
     @timer
-    @_call_on_lights(func_name_override='_refresh_light_state', light_type='color_lights')
     def refresh_color(self):
         """refresh all lights' color"""
+        return self._refresh_light_states(self.color_lights)
+
+    @timer
+    def sweep(self, *sweep_types: str, timeout_secs=SWEEP_TIMEOUT, follow_up=True) -> List[Device]:
+        """
+        refresh cached state with one tagged broadcast per Get type instead of one request per device
+
+        `sweep_types` are keys of `SWEEP_TYPES` (default: `DEFAULT_SWEEP`). every device on the lan answers
+        each broadcast once and responses are matched to this group's devices by mac, so a refresh costs
+        O(types) packets rather than O(devices * types). devices that miss the window get a unicast
+        follow-up if `follow_up` is set. return the devices that never answered
+        """
+        res = self._sweep(sweep_types, timeout_secs, follow_up)
+        return sorted(d for d, o in res.items() if o is not Outcome.ok)
+
+    def _sweep(self, sweep_types: Iterable[str], timeout_secs=SWEEP_TIMEOUT, follow_up=True) -> Outcomes:
+        """`sweep`, returning every swept device's worst `Outcome` across the sweep types"""
+        types = [SWEEP_TYPES[t] for t in sweep_types or DEFAULT_SWEEP]
+        targets = {t: [d for d in self.devices if d.is_light or not t.lights_only] for t in types}
+        responses = sweep(os.getpid(), {t.msg_type: t.response_type for t in types},
+                          expected={t.msg_type: [d.mac_addr for d in ds] for t, ds in targets.items()},
+                          timeout_secs=timeout_secs)
+
+        missing: List[Tuple[Device, SweepType]] = []
+        for t, devices in targets.items():
+            for d in devices:
+                r = responses[t.msg_type].get(d.mac_addr)
+                if r is None:
+                    missing.append((d, t))
+                    continue
+                d.ip_addr = r.ip_addr
+                getattr(d, t.update)(r)
+
+        # by mac: a light's hash changes with its color, which the updates above and below can change
+        failed: Dict[str, Outcome] = {}
+        if follow_up:
+            futures = {(d, t): d.send_request(t.msg_type, t.response_type) for d, t in missing}
+            for (d, t), fut in futures.items():
+                o = outcome(fut)
+                if o is Outcome.ok:
+                    getattr(d, t.update)(fut.result())
+                else:
+                    log.warning(f'unable to refresh {d.label!r}: {o.name}')
+                    failed[d.mac_addr] = Outcome.worst((failed.get(d.mac_addr, Outcome.ok), o))
+        else:
+            failed = {d.mac_addr: Outcome.failed for d, _ in missing}
+        return {d: failed.get(d.mac_addr, Outcome.ok) for d in chain.from_iterable(targets.values())}
+
+    @staticmethod
+    def _refresh_light_states(lights: Iterable[Light]) -> Outcomes:
+        """send every request up front, then wait: the transport resolves them all concurrently"""
+        futures = {l: l.send_request(LightGet, LightState, hedge=True) for l in lights}
+        res = {}
+        for l, fut in futures.items():
+            res[l] = outcome(fut)
+            if res[l] is Outcome.ok:
+                l._update_light_state(fut.result())
+            else:
+                log.warning(f'unable to refresh {l.label!r}: {res[l].name}')
+        return res
 
     # ==================================================================================================================
     # ACCESS DEVICES MORE EASILY
@@ -256,13 +479,13 @@ class Group(LightAPI):
         return next((d for d in self.devices if d.label == name), None)
 
     def get_devices_by_name(self, names) -> 'Group':
-        return Group(d for d in self.devices if d.label in set(names))
+        return Group((d for d in self.devices if d.label in set(names)), lan=self._lan)
 
     def get_devices_by_group(self, group) -> 'Group':
-        return Group(d for d in self.devices if d.group == group)
+        return Group((d for d in self.devices if d.group == group), lan=self._lan)
 
     def get_devices_by_location(self, location) -> 'Group':
-        return Group(d for d in self.devices if d.location == location)
+        return Group((d for d in self.devices if d.location == location), lan=self._lan)
 
     def auto_group(self) -> Dict[str, 'Group']:
         """group lights together by labels"""
@@ -272,7 +495,7 @@ class Group(LightAPI):
             return split_names[0] if len(split_names) == 1 else '_'.join(split_names[:-1])
 
         devices = sorted(self.devices, key=key)
-        return {k: Group(v, k, allow_dupes=self.allow_dupes) for k, v in groupby(devices, key)}
+        return {k: Group(v, k, allow_dupes=self.allow_dupes, lan=self._lan) for k, v in groupby(devices, key)}
 
     @contextmanager
     def reset_to_orig(self, duration=3000, *, orig_override=None):
@@ -299,11 +522,11 @@ class Group(LightAPI):
         if isinstance(idx_or_name, int):
             return self.devices[idx_or_name]
         if isinstance(idx_or_name, slice):
-            return Group(self.devices[idx_or_name], allow_dupes=self.allow_dupes)
+            return Group(self.devices[idx_or_name], allow_dupes=self.allow_dupes, lan=self._lan)
 
         res = self.get_device_by_name(idx_or_name)
         if res:
-            return Group([res], allow_dupes=self.allow_dupes)
+            return Group([res], allow_dupes=self.allow_dupes, lan=self._lan)
         return self.auto_group()[idx_or_name]
 
     def __str__(self):
@@ -315,11 +538,11 @@ class Group(LightAPI):
     def __add__(self, other):
         allow_dupes = self.allow_dupes
         if isinstance(other, Device):
-            return Group(self.devices + [other], allow_dupes=allow_dupes)
+            return Group(self.devices + [other], allow_dupes=allow_dupes, lan=self._lan)
         if isinstance(other, Iterable):
             if isinstance(other, Group):
                 allow_dupes = allow_dupes or other.allow_dupes
-            return Group(chain(self, other), allow_dupes=allow_dupes)
+            return Group(chain(self, other), allow_dupes=allow_dupes, lan=self._lan)
         return NotImplemented
 
     def __iadd__(self, other):
@@ -330,13 +553,13 @@ class Group(LightAPI):
 
 class LightGroup(Group):
 
-    def __init__(self, lights: List[Light]):
-        super().__init__(lights)
+    def __init__(self, lights: List[Light], *, lan: Optional['LifxLAN'] = None):
+        super().__init__(lights, lan=lan)
 
 
 class MultizoneLightGroup(Group):
-    def __init__(self, lights: List[MultizoneLight]):
-        super().__init__(lights, allow_dupes=True)
+    def __init__(self, lights: List[MultizoneLight], *, lan: Optional['LifxLAN'] = None):
+        super().__init__(lights, allow_dupes=True, lan=lan)
 
 
 def _populate(func):
@@ -353,6 +576,18 @@ def _populate(func):
     return wrapper
 
 
+PROBE_TIMEOUT = .25  # second
+PROBE_ATTEMPTS = 2
+
+
+def _init_inventory(inventory: Union[bool, str, Inventory, None]) -> Optional[Inventory]:
+    if isinstance(inventory, Inventory):
+        return inventory
+    if isinstance(inventory, str):
+        return Inventory(inventory)
+    return Inventory() if inventory else None
+
+
 class LifxLAN(Group):
     """
     represent all the lights on the lan
@@ -363,13 +598,53 @@ class LifxLAN(Group):
     """
 
     @_populate
-    def __init__(self, name: Optional[str] = None, verbose=False):
-        super().__init__([], name)
-        self.source_id = os.getpid()
+    def __init__(self, name: Optional[str] = None, verbose=False, *,
+                 inventory: Union[bool, str, Inventory, None] = None):
+        """
+        `inventory`: opt in to the on-disk device cache by passing True (default location),
+        a path, or an `Inventory`. startup then skips discovery and the full per-device refresh
+        """
+        # guards what's published about the lan's devices; `_reconcile_inventory` updates it from the background
+        self._lock = Lock()
+        self._macs: Set[str] = set()
+        self._unclassified: Set[str] = set()  # answered discovery (or are in the inventory) but aren't in `devices`
         self._devices_by_mac_addr: Dict[str, Device] = {}
+        super().__init__([], name, lan=self)
+        self.source_id = os.getpid()
         self._verbose = verbose
-        self._wait_pool = WaitPool(60)
-        self._wait_pool.dispatch(self._check_for_new_lights)
+        self._inventory = _init_inventory(inventory)
+        self._wait_pool = WaitPool()
+        self._reconciling: Optional[Future] = None
+        if not self._inventory:
+            self._wait_pool.dispatch(self._check_for_new_lights)
+
+    @property
+    def devices(self):
+        return self._devices
+
+    @devices.setter
+    def devices(self, devices):
+        """also record the lan's macs so its groups know when they can be set with a broadcast"""
+        with self._lock:
+            Group.devices.fset(self, devices)
+            self._macs = {d.mac_addr for d in self._devices}
+
+    def _publish(self, devices_by_mac_addr: Dict[str, Device], unclassified: Set[str]):
+        """replace everything known about the lan's devices at once, so readers never see half an update"""
+        with self._lock:
+            self._devices_by_mac_addr = devices_by_mac_addr
+            Group.devices.fset(self, devices_by_mac_addr.values())
+            self._macs = set(devices_by_mac_addr)
+            self._unclassified = unclassified
+
+    def _covers(self, devices: Iterable[Device]) -> bool:
+        """
+        whether `devices` is everything on the lan. a device that responded but couldn't be classified
+        would get a broadcast too, so while there are any, nothing is covered and groups fall back to unicast
+        """
+        macs = {d.mac_addr for d in devices}
+        with self._lock:
+            return bool(macs) and not self._unclassified and macs == self._macs
 
     ############################################################################
     #                                                                          #
@@ -378,29 +653,128 @@ class LifxLAN(Group):
     ############################################################################
 
     @timer
-    def populate_devices(self, reset=False, total_num_lights=TOTAL_NUM_LIGHTS):
-        """populate available devices"""
+    def populate_devices(self, reset=False, total_num_lights: Optional[int] = None):
+        """
+        populate available devices
+
+        each device is classified and refreshed as soon as it answers discovery,
+        so that work overlaps with waiting for the rest of the lan to respond
+        """
         log.info('populating devices')
+        self.wait_for_reconcile()
+
+        records = self._inventory.load() if self._inventory and not reset else {}
+        if records:
+            self._populate_from_inventory(records)
+            self._reconciling = self._wait_pool.dispatch(self._reconcile_inventory)
+            return
+
+        responders = set()
+        with self._wait_pool as wp:
+            for r in discover(self.source_id, total_num_lights=total_num_lights, verbose=self._verbose):
+                responders.add(r.target_addr)
+                wp.submit(self._init_device, r)
+
+        with self._lock:
+            by_mac_addr = {} if reset else dict(self._devices_by_mac_addr)
+        by_mac_addr.update((d.mac_addr, d) for d in filter(None, wp.results))
+        self._publish(by_mac_addr, responders - by_mac_addr.keys())
+        self.name = self.name or 'ALL'
+        if self._inventory:
+            self._inventory.save(self.devices)
 
-        if reset:
-            self._devices_by_mac_addr.clear()
+    @timer
+    def refresh_power(self) -> Outcomes:
+        """the whole lan answers a single broadcast `LightGet`"""
+        return self._sweep(['light_state'])
 
-        responses = broadcast_with_resp(GetService, StateService, self.source_id, total_num_lights=total_num_lights)
-        for device in map(self._proc_device_response, responses):
-            self._devices_by_mac_addr[device.mac_addr] = device
-        self.devices = self._devices_by_mac_addr.values()
+    @timer
+    def refresh_color(self) -> Outcomes:
+        """the whole lan answers a single broadcast `LightGet`. like `Group`'s, only color lights are reported"""
+        color_macs = {l.mac_addr for l in self.color_lights}
+        return {l: o for l, o in self._sweep(['light_state']).items() if l.mac_addr in color_macs}
+
+    def _populate_from_inventory(self, records: Dict[str, DeviceRecord]):
+        """build devices from the inventory and confirm each one with a single unicast probe"""
+        devices = [r.to_device(self.source_id, self._verbose) for r in records.values()]
+        with self._lock:
+            by_mac_addr = dict(self._devices_by_mac_addr)
+        by_mac_addr.update((d.mac_addr, d) for d in self._probe(devices))
+        self._publish(by_mac_addr, records.keys() - by_mac_addr.keys())
         self.name = self.name or 'ALL'
-        self.refresh()
-        self.devices = self.devices  # force re-sorting via property after refresh
 
-    def _proc_device_response(self, r):
+    @staticmethod
+    def _probe(devices: Iterable[Device]) -> List[Device]:
+        """
+        one request per device, all in flight at once, which also fetches current power/color.
+        return the devices that answered; `_reconcile_inventory` picks up the rest if they've moved
+        """
+        futures = {d: d.send_request(LightGet, LightState, timeout_secs=PROBE_TIMEOUT, max_attempts=PROBE_ATTEMPTS)
+                   if d.is_light else
+                   d.send_request(GetPower, StatePower, timeout_secs=PROBE_TIMEOUT, max_attempts=PROBE_ATTEMPTS)
+                   for d in devices}
+        res = []
+        for d, fut in futures.items():
+            try:
+                response = fut.result()
+            except NoResponse:
+                log.info(f'cached device {d.label!r} ({d.mac_addr}) did not respond')
+                continue
+            if d.is_light:
+                d._update_light_state(response)
+            else:
+                d.power_level = response.power_level
+            res.append(d)
+        return res
+
+    @timer
+    def _reconcile_inventory(self):
+        """
+        background rediscovery: pick up new and moved devices, then rewrite the inventory
+
+        works on a copy of the lan's devices and publishes the result in one go when it's done
+        """
+        try:
+            with self._lock:
+                by_mac_addr = dict(self._devices_by_mac_addr)
+            responders = set()
+            for r in discover(self.source_id):
+                responders.add(r.target_addr)
+                device = by_mac_addr.get(r.target_addr)
+                if device:
+                    device.ip_addr, device.port = r.ip_addr, r.port
+                    continue
+                device = self._init_device(r)
+                if device:
+                    log.info(f'found new device: {device}')
+                    by_mac_addr[device.mac_addr] = device
+            self._publish(by_mac_addr, responders - by_mac_addr.keys())
+            self._inventory.save(by_mac_addr.values())
+        except Exception as e:
+            log.error(f'error in _reconcile_inventory: {e!r}')
+
+    def wait_for_reconcile(self):
+        """block until a warm start's background rediscovery, if any, has published what it found"""
+        if self._reconciling is not None:
+            self._reconciling.result()
+            self._reconciling = None
+
+    def _init_device(self, r: StateService) -> Optional[Device]:
+        """classify and refresh a newly-discovered device, returning None if it's not responding"""
+        try:
+            device = self._proc_device_response(r)
+            if device.refresh():
+                return device
+        except NoResponse:
+            pass
+        log.warning(f'ERROR with device with mac addr {r.target_addr}, ip {r.ip_addr}: not responding, skipping')
+
+    def _proc_device_response(self, r: StateService) -> Device:
+        """one GetVersion to classify, then construct the right device type exactly once"""
         args = r.target_addr, r.ip_addr, r.service, r.port, self.source_id, self._verbose
-        device = Light(*args)
-        if device.is_light:
-            if device.supports_multizone:
-                device = MultizoneLight(*args)
-            elif device.supports_chain:
-                device = TileChain(*args)
+        response = Device(*args).req_with_resp(GetVersion, StateVersion)
+        device = device_type(response.product)(*args)
+        device._update_version_info(response)
         return device
 
     @timer
@@ -410,7 +784,7 @@ class LifxLAN(Group):
         that we haven't accounted for in `TOTAL_NUM_LIGHTS`
         """
         try:
-            num_resps = len(broadcast_with_resp(GetService, StateService, self.source_id, total_num_lights=10000))
+            num_resps = sum(1 for _ in discover(self.source_id))
             if num_resps != TOTAL_NUM_LIGHTS:
                 import warnings
                 msg = f'WARNING: found {num_resps} devices, but TOTAL_NUM_LIGHTS is set to {TOTAL_NUM_LIGHTS}'
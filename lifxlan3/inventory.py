@@ -0,0 +1,109 @@
+import json
+import os
+from typing import NamedTuple, Dict, Iterable, Type, Optional, List
+
+from .devices.device import Device, FirmwareInfo, ProductInfo
+from .devices.light import Light
+from .devices.multizonelight import MultizoneLight
+from .devices.products import features_map, light_products
+from .devices.tilechain import TileChain
+from .settings import INVENTORY_PATH
+from .utils import init_log
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+INVENTORY_VERSION = 1
+
+
+def device_type(product) -> Type[Device]:
+    """the most specific device class for a given product id"""
+    if product not in light_products:
+        return Device
+    features = features_map.get(product, {})
+    if features.get('multizone'):
+        return MultizoneLight
+    if features.get('chain'):
+        return TileChain
+    return Light
+
+
+class DeviceRecord(NamedTuple):
+    """everything about a device that's worth remembering between runs"""
+    mac_addr: str
+    ip_addr: str
+    port: int
+    service: int
+    product_info: ProductInfo
+    host_firmware_info: FirmwareInfo
+    wifi_firmware_info: FirmwareInfo
+    label: Optional[str]
+    group: Optional[str]
+    location: Optional[str]
+
+    @classmethod
+    def from_device(cls, d: Device) -> 'DeviceRecord':
+        return cls(d.mac_addr, d.ip_addr, d.port, d.service, d.product_info, d.host_firmware_info,
+                   d.wifi_firmware_info, d.label, d.group, d.location)
+
+    @classmethod
+    def from_json(cls, d: Dict) -> 'DeviceRecord':
+        return cls(**{**d,
+                      'product_info': ProductInfo(*d['product_info']),
+                      'host_firmware_info': FirmwareInfo(*d['host_firmware_info']),
+                      'wifi_firmware_info': FirmwareInfo(*d['wifi_firmware_info'])})
+
+    def to_json(self) -> Dict:
+        return self._asdict()
+
+    def to_device(self, source_id, verbose=False) -> Device:
+        """build the right kind of device without talking to it"""
+        device = device_type(self.product_info.product)(self.mac_addr, self.ip_addr, self.service, self.port,
+                                                        source_id, verbose)
+        for k in ('product_info', 'host_firmware_info', 'wifi_firmware_info', 'label', 'group', 'location'):
+            setattr(device, k, getattr(self, k))
+        return device
+
+
+class Inventory:
+    """
+    json file of `DeviceRecords`, keyed by mac address
+
+    lets `LifxLAN` skip discovery and the full per-device refresh on startup.
+    the default location is under the user cache dir; override with `LIFX_INVENTORY_PATH`
+    """
+
+    def __init__(self, path: str = INVENTORY_PATH):
+        self.path = path
+
+    def load(self) -> Dict[str, DeviceRecord]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') != INVENTORY_VERSION:
+                return {}
+            return {r.mac_addr: r for r in map(DeviceRecord.from_json, data['devices'])}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log.warning(f'ignoring unreadable inventory {self.path!r}: {e!r}')
+            return {}
+
+    def save(self, devices: Iterable[Device]):
+        """write atomically so a concurrent reader never sees a partial file"""
+        records: List[Dict] = [DeviceRecord.from_device(d).to_json() for d in devices]
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(dict(version=INVENTORY_VERSION, devices=records), f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log.warning(f'unable to save inventory to {self.path!r}: {e!r}')
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,110 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple, Dict, List, Type, Optional, Iterator, Tuple, Union, Callable
+
+from .encode import Payload
+from .message import Message
+from .msgtypes import Acknowledgement
+from .health import Outcome
+from .transport import Addr, get_transport, outcome
+from lifxlan3.utils import init_log
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+
+class BatchedMessage(NamedTuple):
+    """everything needed to send one device's set message later"""
+    msg_type: Type[Message]
+    mac_addr: str
+    source_id: int
+    payload: Payload
+    addrs: List[Addr]
+    rapid: bool
+    num_attempts: int  # rapid: times to send it. otherwise: max attempts while waiting for the ack
+    timeout_secs: Optional[float]
+    rate: Optional[float] = None
+    name: str = ''
+    verbose: bool = False
+    on_done: Optional[Callable[[Outcome], None]] = None  # called with the message's own outcome once it's known
+
+
+class Batch:
+    """
+    set messages for many devices, sent together from the shared socket
+
+    every message is sent in one loop, in the order added, through each device's send queue. rapid
+    messages are fired and forgotten; the rest are transport requests, so their acks are all collected
+    in a single shared window by the receiver thread instead of one blocked thread per device
+    """
+
+    def __init__(self):
+        self.messages: List[BatchedMessage] = []
+        self.outcomes: Dict[str, Outcome] = {}  # filled in once sent
+
+    def add(self, msg: BatchedMessage):
+        self.messages.append(msg)
+
+    def send(self) -> List[Tuple[str, Union[Outcome, 'Future[Message]']]]:
+        """send everything in order. return (mac_addr, outcome) for rapid messages, (mac_addr, ack future) otherwise"""
+        transport = get_transport()
+        res = []
+        for m in self.messages:
+            if m.rapid:
+                transport.send(m.msg_type, m.mac_addr, m.source_id, m.payload, m.addrs, num_repeats=m.num_attempts,
+                               rate=m.rate, verbose=m.verbose)
+                res.append((m.mac_addr, Outcome.sent))
+            else:
+                res.append((m.mac_addr, transport.request(m.msg_type, m.mac_addr, m.source_id, m.payload, m.addrs,
+                                                          [Acknowledgement], ack_requested=True,
+                                                          timeout_secs=m.timeout_secs, max_attempts=m.num_attempts,
+                                                          name=m.name, verbose=m.verbose, rate=m.rate)))
+        return res
+
+    def send_and_wait(self) -> Dict[str, Outcome]:
+        """send everything and wait for the acks. return the worst outcome for each device, by mac"""
+        return self.collect(self.send())
+
+    def collect(self, sent: List[Tuple[str, Union[Outcome, 'Future[Message]']]]) -> Dict[str, Outcome]:
+        """wait for whatever `send` returned and record the worst outcome for each device, by mac"""
+        by_mac: Dict[str, List[Outcome]] = {}
+        for m, (mac_addr, o) in zip(self.messages, sent):
+            if not isinstance(o, Outcome):
+                o = outcome(o)
+                if o is Outcome.failed:
+                    log.warning(f'no ack from {mac_addr!r}')
+            if m.on_done is not None:
+                m.on_done(o)
+            by_mac.setdefault(mac_addr, []).append(o)
+        self.outcomes = {mac_addr: Outcome.worst(outcomes) for mac_addr, outcomes in by_mac.items()}
+        return self.outcomes
+
+
+_current: ContextVar[Optional[Batch]] = ContextVar('batch', default=None)
+
+
+def current_batch() -> Optional[Batch]:
+    return _current.get()
+
+
+@contextmanager
+def batch() -> Iterator[Batch]:
+    """
+    collect every set message sent inside the `with` block and send them together on exit,
+    waiting for any acks. nested blocks join the outermost batch.
+    per-device results are in the batch's `outcomes` after the outermost block exits
+    """
+    cur = _current.get()
+    if cur is not None:
+        yield cur
+        return
+
+    res = Batch()
+    token = _current.set(res)
+    try:
+        yield res
+    finally:
+        _current.reset(token)
+    res.send_and_wait()
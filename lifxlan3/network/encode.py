@@ -0,0 +1,165 @@
+"""
+packets straight to bytes, without building a `Message`
+
+hot loops send the same few set messages many times a second and only ever need their bytes. these
+encoders pack header template, seq_num and payload in one call to the message type's precompiled `Struct`,
+producing exactly what the `Message` classes do. those stay the way to inspect and debug packets, e.g.
+`str(unpack_lifx_message(data))`
+"""
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, NamedTuple, Optional, Sequence, Tuple, Type, Union
+
+from .message import BROADCAST_MAC, RESPONSE_FLAGS_OFFSET, SEQ_NUM_OFFSET, Message, header_templates
+from .msgtypes import GetDeviceChain, GetService, GetTileState64, LightSetColor, LightSetPower, \
+    MultizoneSetColorZones, SetPower, SetTileState64, SetUserPosition, StateDeviceChain, StateTileState64, MSG_IDS
+
+__author__ = 'acushner'
+
+HSBK = Sequence[int]
+
+# types whose constructors always address every device, whatever target they're given
+_broadcast_types = frozenset({GetService, GetDeviceChain, StateDeviceChain, SetUserPosition, GetTileState64,
+                              StateTileState64, SetTileState64})
+
+_FLAGS = 1 << 12 | 1024  # addressable, protocol
+_TAGGED = 1 << 13
+
+PACKET_CACHE_SIZE = 4096
+_seq_num_bytes = [bytes((i,)) for i in range(256)]
+
+
+def _header(msg_type: Type[Message], mac_addr: str, source_id: int, ack_requested, response_requested) -> Tuple:
+    """(before_seq, after_seq) halves of the header template for this packet"""
+    if msg_type in _broadcast_types:
+        mac_addr = BROADCAST_MAC
+    flags = _FLAGS | _TAGGED if mac_addr == BROADCAST_MAC else _FLAGS
+    return header_templates(mac_addr, source_id)[MSG_IDS[msg_type], msg_type._struct.size, flags,
+                                                 ack_requested << 1 | response_requested]
+
+
+def encode(msg_type: Type[Message], mac_addr: str, source_id: int, seq_num: int, payload: Dict,
+           ack_requested=False, response_requested=False) -> bytes:
+    """
+    the same bytes as `msg_type(mac_addr, source_id, seq_num, payload, ...).packed_message`
+
+    like the constructors, a `reserved` field is always packed as 0
+    """
+    before_seq, after_seq = _header(msg_type, mac_addr, source_id, ack_requested, response_requested)
+    values = [before_seq, seq_num, after_seq]
+    for name, encode_field in msg_type._encoders:
+        v = 0 if name == 'reserved' else payload[name]
+        if encode_field is None:
+            values.append(v)
+        else:
+            values.extend(encode_field(v))
+    return msg_type._struct.pack(*values)
+
+
+class Packed(NamedTuple):
+    """
+    a message someone else already packed, e.g. straight from a framebuffer, to pass as a transport payload
+
+    the transport fills in its seq_num and response flags when sending it. `coalesce_key` is what
+    `sendqueue.coalesce_key` would return for its payload
+    """
+    data: bytearray
+    coalesce_key: Optional[Hashable] = None
+
+    def finish(self, seq_num: int, ack_requested=False, response_requested=False) -> bytearray:
+        self.data[RESPONSE_FLAGS_OFFSET] = ack_requested << 1 | response_requested
+        self.data[SEQ_NUM_OFFSET] = seq_num
+        return self.data
+
+
+Payload = Union[Dict, Packed]
+
+
+# ======================================================================================================================
+# PACKET CACHE
+
+def _frozen(v):
+    return tuple(v) if isinstance(v, (list, bytearray)) else v
+
+
+@lru_cache(maxsize=PACKET_CACHE_SIZE)
+def _packet(msg_type: Type[Message], mac_addr: str, source_id: int, ack_requested, response_requested,
+            payload_items: Tuple[Tuple[str, Hashable], ...]) -> Tuple[bytes, bytes]:
+    """a packet split around its seq_num"""
+    data = encode(msg_type, mac_addr, source_id, 0, dict(payload_items), ack_requested, response_requested)
+    return data[:SEQ_NUM_OFFSET], data[SEQ_NUM_OFFSET + 1:]
+
+
+def encode_cached(msg_type: Type[Message], mac_addr: str, source_id: int, seq_num: int, payload: Dict,
+                  ack_requested=False, response_requested=False) -> bytes:
+    """
+    `encode`, remembering the most recent `PACKET_CACHE_SIZE` packets by device, type and payload
+
+    effects that repeat the same few colors/power levels only pay for a lookup and filling in seq_num
+    """
+    args = msg_type, mac_addr, source_id, ack_requested, response_requested
+    try:
+        before_seq, after_seq = _packet(*args, tuple(payload.items()))
+    except TypeError:  # a list in the payload, e.g. tile colors
+        try:
+            before_seq, after_seq = _packet(*args, tuple((k, _frozen(v)) for k, v in payload.items()))
+        except TypeError:  # e.g. a chain's tile descriptions, not worth caching
+            return encode(msg_type, mac_addr, source_id, seq_num, payload, ack_requested, response_requested)
+    return b''.join((before_seq, _seq_num_bytes[seq_num], after_seq))
+
+
+def packet_cache_info():
+    """hits, misses, maxsize and currsize of `encode_cached`'s cache"""
+    return _packet.cache_info()
+
+
+def clear_packet_cache():
+    _packet.cache_clear()
+
+
+# ======================================================================================================================
+# SET MESSAGES
+
+def encode_set_power(mac_addr: str, source_id: int, seq_num: int, power_level: int, ack_requested=False) -> bytes:
+    before_seq, after_seq = _header(SetPower, mac_addr, source_id, ack_requested, False)
+    return SetPower._struct.pack(before_seq, seq_num, after_seq, power_level)
+
+
+def encode_light_set_power(mac_addr: str, source_id: int, seq_num: int, power_level: int, duration=0,
+                           ack_requested=False) -> bytes:
+    before_seq, after_seq = _header(LightSetPower, mac_addr, source_id, ack_requested, False)
+    return LightSetPower._struct.pack(before_seq, seq_num, after_seq, power_level, duration)
+
+
+def encode_light_set_color(mac_addr: str, source_id: int, seq_num: int, color: HSBK, duration=0,
+                           ack_requested=False) -> bytes:
+    before_seq, after_seq = _header(LightSetColor, mac_addr, source_id, ack_requested, False)
+    return LightSetColor._struct.pack(before_seq, seq_num, after_seq, 0, *color, duration)
+
+
+def encode_set_color_zones(mac_addr: str, source_id: int, seq_num: int, start_index: int, end_index: int,
+                           color: HSBK, duration=0, apply=1, ack_requested=False) -> bytes:
+    before_seq, after_seq = _header(MultizoneSetColorZones, mac_addr, source_id, ack_requested, False)
+    return MultizoneSetColorZones._struct.pack(before_seq, seq_num, after_seq, start_index, end_index, *color,
+                                               duration, apply)
+
+
+def encode_set_tile_state64(mac_addr: str, source_id: int, seq_num: int, tile_index: int, colors: Iterable[HSBK],
+                            duration=0, x=0, y=0, width=8, length=1, ack_requested=False) -> bytes:
+    before_seq, after_seq = _header(SetTileState64, mac_addr, source_id, ack_requested, False)
+    return SetTileState64._struct.pack(before_seq, seq_num, after_seq, tile_index, length, 0, x, y, width, duration,
+                                       *(v for c in colors for v in c))
+
+
+def encode_set_tile_state64_into(buf, offset: int, mac_addr: str, source_id: int, seq_num: int, tile_index: int,
+                                 colors: Iterable[HSBK], duration=0, x=0, y=0, width=8, length=1,
+                                 ack_requested=False) -> int:
+    """
+    write a `SetTileState64` into writable `buf` at `offset`, e.g. to fill one preallocated buffer per frame
+
+    `colors` are the 64 colors for the rectangle. returns the number of bytes written
+    """
+    before_seq, after_seq = _header(SetTileState64, mac_addr, source_id, ack_requested, False)
+    SetTileState64._struct.pack_into(buf, offset, before_seq, seq_num, after_seq, tile_index, length, 0, x, y, width,
+                                     duration, *(v for c in colors for v in c))
+    return SetTileState64._struct.size
+
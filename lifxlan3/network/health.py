@@ -0,0 +1,68 @@
+from enum import Enum
+from typing import Iterable
+
+__author__ = 'acushner'
+
+OPEN_AFTER = 2  # consecutive requests without a response
+PROBE_INITIAL_BACKOFF = 1.  # second
+PROBE_MAX_BACKOFF = 60.
+
+
+class Health(Enum):
+    healthy = 'healthy'
+    suspect = 'suspect'  # the last request went unanswered
+    open = 'open'  # requests fail fast until a probe gets an answer
+
+
+class Outcome(Enum):
+    """what happened to one device in a group operation, from best to worst"""
+    ok = 0  # acked/answered
+    sent = 1  # fire and forget: nothing to wait for
+    skipped = 2  # circuit open: sent without waiting, or not at all
+    failed = 3  # no response
+
+    @staticmethod
+    def worst(outcomes: Iterable['Outcome']) -> 'Outcome':
+        return max(outcomes, key=lambda o: o.value, default=Outcome.ok)
+
+
+class CircuitBreaker:
+    """
+    one device's health, judged by whether its requests get answered
+
+    after `OPEN_AFTER` consecutive unanswered requests the circuit opens: requests fail fast and
+    the device is probed with exponential backoff instead. any message from the device closes it again
+    """
+
+    def __init__(self):
+        self.consecutive_failures = 0
+        self.backoff = PROBE_INITIAL_BACKOFF
+        self.next_probe = 0.
+
+    @property
+    def state(self) -> Health:
+        if not self.consecutive_failures:
+            return Health.healthy
+        if self.consecutive_failures < OPEN_AFTER:
+            return Health.suspect
+        return Health.open
+
+    def succeeded(self):
+        self.consecutive_failures = 0
+        self.backoff = PROBE_INITIAL_BACKOFF
+
+    def failed(self, now: float):
+        self.consecutive_failures += 1
+        if self.consecutive_failures == OPEN_AFTER:
+            self._schedule_probe(now)
+
+    def probe_due(self, now: float) -> bool:
+        """whether it's time to probe an open circuit. if so, the next probe is scheduled"""
+        if self.state is not Health.open or now < self.next_probe:
+            return False
+        self._schedule_probe(now)
+        return True
+
+    def _schedule_probe(self, now: float):
+        self.next_probe = now + self.backoff
+        self.backoff = min(2 * self.backoff, PROBE_MAX_BACKOFF)
@@ -3,20 +3,93 @@
 # Author: Meghan Clark
 
 import struct
-
-import bitstring
+from functools import lru_cache
+from struct import Struct
+from typing import NamedTuple, Callable, Optional, Any, Tuple, Dict
 
 BROADCAST_MAC = "00:00:00:00:00:00"
 
 HEADER_SIZE_BYTES = 36
 
+# size, flags (origin/tagged/addressable/protocol), source_id, target, 6 reserved, response flags, seq_num,
+# 8 reserved, message_type, 2 reserved
+HEADER_FORMAT = '<HHI8s6xBB8xHxx'
+HEADER_STRUCT = Struct(HEADER_FORMAT)
+
+# a header template split around seq_num, the only header byte that changes from one packet to the next
+RESPONSE_FLAGS_OFFSET = 22
+SEQ_NUM_OFFSET = 23
+TEMPLATE_FORMAT = f'<{SEQ_NUM_OFFSET}sB{HEADER_SIZE_BYTES - SEQ_NUM_OFFSET - 1}s'
+MAX_TEMPLATE_TARGETS = 4096  # (device, source_id) pairs to keep templates for
+
+
+class Field(NamedTuple):
+    """
+    declarative description of a single payload field
+
+    `fmt` is a `struct` format (without byte order) and may expand to multiple values.
+    `encode` turns the attribute's value into a tuple of values for `fmt`, and `decode` turns
+    a tuple of unpacked values back into the attribute's value.
+    if they're not provided, `fmt` is assumed to map to exactly one value
+    """
+    name: str
+    fmt: str
+    label: str
+    encode: Optional[Callable[[Any], Tuple]] = None
+    decode: Optional[Callable[[Tuple], Any]] = None
+
+
+def _encode_label(label: str) -> Tuple[bytes]:
+    return label.encode('utf-8'),
+
+
+def _decode_label(vals) -> str:
+    return vals[0].replace(b'\x00', b'').decode('utf-8')
+
+
+def _encode_byte_array(byte_array) -> Tuple[bytes]:
+    return bytes(byte_array),
+
+
+def _decode_byte_array(vals):
+    return list(vals[0])
+
+
+def _flatten_colors(colors) -> Tuple[int, ...]:
+    return tuple(v for c in colors for v in c)
+
+
+def _unflatten_colors(vals):
+    return [vals[i:i + 4] for i in range(0, len(vals), 4)]
+
+
+def label_field(name='label', label='Label', size=32) -> Field:
+    """utf-8 string padded with nulls"""
+    return Field(name, f'{size}s', label, _encode_label, _decode_label)
+
+
+def byte_array_field(name, label, size) -> Field:
+    """fixed-size sequence of uint8s"""
+    return Field(name, f'{size}s', label, _encode_byte_array, _decode_byte_array)
+
+
+def color_field(name='color', label='Color (HSBK)') -> Field:
+    """single HSBK color"""
+    return Field(name, '4H', label, tuple, tuple)
+
+
+def colors_field(name, label, num_colors) -> Field:
+    """sequence of `num_colors` HSBK colors"""
+    return Field(name, f'{4 * num_colors}H', label, _flatten_colors, _unflatten_colors)
+
 
 class Message(object):
+    fields: Tuple[Field, ...] = ()
+
     def __init__(self, msg_type, target_addr, source_id, seq_num, ack_requested=False, response_requested=False):
 
         # @formatter:off
         # Frame
-        self.frame_format = ["16", "2, 1, 1, 12", "32"]
         self.size = None                                                # 16 bits/uint16
         self.origin = 0                                                 # 2 bits/uint8, must be zero
         self.tagged = 1 if target_addr == BROADCAST_MAC else 0          # 1 bit/bool, also must be one if getservice
@@ -25,81 +98,113 @@ class Message(object):
         self.source_id = source_id                                      # 32 bits/uint32, unique ID set by client. If zero, broadcast reply requested. If non-zero, unicast reply requested.
 
         # Frame Address
-        self.frame_addr_format = ["64", "48", "6, 1, 1", "8"]
         self.target_addr = target_addr                                  # 64 bits/uint64, either single MAC address or all zeroes for broadcast.
         self.reserved = 0                                               # 48 bits/uint8 x 6, all zero
-        self.reserved = 0                                               # 6 bits, all zero
         self.ack_requested = 1 if ack_requested else 0                  # 1 bit/bool, 1 = yes
         self.response_requested = 1 if response_requested else 0        # 1 bit/bool, 1 = yes
         self.seq_num = seq_num                                          # 8 bits/uint8, wraparound
 
         # Protocol Header
-        self.protocol_header_format = ["64", "16", "16"]
-        self.reserved = 0                                               # 64 bits/uint64, all zero
         self.message_type = msg_type                                    # 16 bits/uint16
-        self.reserved = 0                                               # 16 bits/uint16, all zero
         # @formatter:on
 
-        self.payload_fields = []  # tuples of ("label", value)
-
         self.packed_message = self.generate_packed_message()
 
-    def generate_packed_message(self):
-        self.payload = self.get_payload()
-        self.header = self.get_header()
-        packed_message = self.header + self.payload
-        return packed_message
-
-    # frame (and thus header) needs to be generated after payload (for size field)
-    def get_header(self):
-        if self.size is None:
-            self.size = self.get_msg_size()
-        frame_addr = self.get_frame_addr()
-        frame = self.get_frame()
-        protocol_header = self.get_protocol_header()
-        header = frame + frame_addr + protocol_header
-        return header
-
-    # Default: No payload unless method overridden
-    def get_payload(self):
-        return little_endian(bitstring.pack(""))
-
-    def get_frame(self):
-        size_format = self.frame_format[0]
-        flags_format = self.frame_format[1]
-        source_id_format = self.frame_format[2]
-        size = little_endian(bitstring.pack(size_format, self.size))
-        flags = little_endian(bitstring.pack(flags_format, self.origin, self.tagged, self.addressable, self.protocol))
-        source_id = little_endian(bitstring.pack(source_id_format, self.source_id))
-        frame = size + flags + source_id
-        return frame
-
-    def get_frame_addr(self):
-        mac_addr_format = self.frame_addr_format[0]
-        reserved_48_format = self.frame_addr_format[1]
-        response_flags_format = self.frame_addr_format[2]
-        seq_num_format = self.frame_addr_format[3]
-        mac_addr = little_endian(bitstring.pack(mac_addr_format, convert_MAC_to_int(self.target_addr)))
-        reserved_48 = little_endian(bitstring.pack(reserved_48_format, self.reserved))
-        response_flags = little_endian(
-            bitstring.pack(response_flags_format, self.reserved, self.ack_requested, self.response_requested))
-        seq_num = little_endian(bitstring.pack(seq_num_format, self.seq_num))
-        frame_addr = mac_addr + reserved_48 + response_flags + seq_num
-        return frame_addr
-
-    def get_protocol_header(self):
-        reserved_64_format = self.protocol_header_format[0]
-        message_type_format = self.protocol_header_format[1]
-        reserved_16_format = self.protocol_header_format[2]
-        reserved_64 = little_endian(bitstring.pack(reserved_64_format, self.reserved))
-        message_type = little_endian(bitstring.pack(message_type_format, self.message_type))
-        reserved_16 = little_endian(bitstring.pack(reserved_16_format, self.reserved))
-        protocol_header = reserved_64 + message_type + reserved_16
-        return protocol_header
+    # ==================================================================================================================
+    # SCHEMA
+    # ==================================================================================================================
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compile()
+
+    @classmethod
+    def _compile(cls):
+        """build the `Struct`s for this message type once, at import, from its `fields`"""
+        payload_fmt = ''.join(f.fmt for f in cls.fields)
+        cls._payload_struct = Struct('<' + payload_fmt)
+        cls._struct = Struct(TEMPLATE_FORMAT + payload_fmt)
+        cls._encoders = tuple((f.name, f.encode) for f in cls.fields)
+        cls._decoders = tuple((f.name, _num_values(f.fmt), f.decode) for f in cls.fields)
+        cls._field_names = frozenset(f.name for f in cls.fields)
+
+    # ==================================================================================================================
+    # LAZY DECODING (for messages created by `unpack_lifx_message`)
+    # ==================================================================================================================
+
+    def __getattr__(self, item):
+        """payload fields of received messages are only decoded the first time one is accessed"""
+        if self.__dict__.get('_lazy_payload') and item in self._field_names:
+            self._decode_payload()
+            return self.__dict__[item]
+        raise AttributeError(f'{type(self).__name__!r} object has no attribute {item!r}')
+
+    def _decode_payload(self):
+        self._lazy_payload = False
+        buf = self.packed_message
+        if len(buf) < self._struct.size:
+            buf = bytes(buf).ljust(self._struct.size, b'\x00')
+        vals = self._payload_struct.unpack_from(buf, HEADER_SIZE_BYTES)
+        offset = 0
+        for name, num_values, decode in self._decoders:
+            if decode is None:
+                setattr(self, name, vals[offset])
+            else:
+                setattr(self, name, decode(vals[offset:offset + num_values]))
+            offset += num_values
+
+    # ==================================================================================================================
+    # PACKING
+    # ==================================================================================================================
+
+    def generate_packed_message(self) -> bytes:
+        """fill in the target's header template and the payload with a single call to the precompiled `Struct`"""
+        self.size = self._struct.size
+        templates = _header_templates.get((self.target_addr, self.source_id))
+        if templates is None:
+            templates = header_templates(self.target_addr, self.source_id)
+        # flags inlined rather than through the properties: this runs for every packet sent
+        before_seq, after_seq = templates[
+            self.message_type, self.size, self.origin << 14 | self.tagged << 13 | self.addressable << 12 | self.protocol,
+            self.ack_requested << 1 | self.response_requested]
+        values = [before_seq, self.seq_num, after_seq]
+        for name, encode in self._encoders:
+            if encode is None:
+                values.append(getattr(self, name))
+            else:
+                values.extend(encode(getattr(self, name)))
+        return self._struct.pack(*values)
+
+    @property
+    def flags(self) -> int:
+        return self.origin << 14 | self.tagged << 13 | self.addressable << 12 | self.protocol
+
+    @property
+    def response_flags(self) -> int:
+        return self.ack_requested << 1 | self.response_requested
+
+    @property
+    def header(self) -> bytes:
+        return self.packed_message[:HEADER_SIZE_BYTES]
+
+    @property
+    def payload(self) -> bytes:
+        return self.packed_message[HEADER_SIZE_BYTES:]
+
+    def get_header(self) -> bytes:
+        return HEADER_STRUCT.pack(self.get_msg_size(), self.flags, self.source_id, mac_to_bytes(self.target_addr),
+                                  self.response_flags, self.seq_num, self.message_type)
+
+    def get_payload(self) -> bytes:
+        return self.payload
 
     def get_msg_size(self):
-        payload_size_bytes = len(self.payload)
-        return HEADER_SIZE_BYTES + payload_size_bytes
+        return HEADER_SIZE_BYTES + self._payload_struct.size
+
+    @property
+    def payload_fields(self):
+        """tuples of ("label", value)"""
+        return [(f.label, getattr(self, f.name)) for f in self.fields]
 
     def __str__(self):
         indent = "  "
@@ -126,6 +231,70 @@ class Message(object):
         return s
 
 
+Message._compile()
+
+
+class HeaderTemplate(NamedTuple):
+    before_seq: bytes
+    after_seq: bytes
+
+
+TemplateKey = Tuple[int, int, int, int]  # message_type, size, flags, response_flags
+
+
+class HeaderTemplates(Dict[TemplateKey, HeaderTemplate]):
+    """
+    the headers this client sends to one device, packed the first time each message type is sent
+
+    a header only depends on the target, source_id, message type, size and flags, except for seq_num.
+    messages fill in seq_num between the two halves of a template instead of packing a new header every time
+    """
+
+    def __init__(self, target_addr: str, source_id: int):
+        super().__init__()
+        self.target_addr = target_addr
+        self.source_id = source_id
+
+    def __missing__(self, key: TemplateKey) -> HeaderTemplate:
+        message_type, size, flags, response_flags = key
+        header = HEADER_STRUCT.pack(size, flags, self.source_id, mac_to_bytes(self.target_addr), response_flags, 0,
+                                    message_type)
+        res = self[key] = HeaderTemplate(header[:SEQ_NUM_OFFSET], header[SEQ_NUM_OFFSET + 1:])
+        return res
+
+
+_header_templates: Dict[Tuple[str, int], HeaderTemplates] = {}
+
+
+def header_templates(target_addr: str, source_id: int) -> HeaderTemplates:
+    """shared by every message to `target_addr` from `source_id`, and held by the `Device` it belongs to"""
+    key = target_addr, source_id
+    res = _header_templates.get(key)
+    if res is None:
+        if len(_header_templates) >= MAX_TEMPLATE_TARGETS:
+            _header_templates.clear()
+        res = _header_templates[key] = HeaderTemplates(target_addr, source_id)
+    return res
+
+
+def _num_values(fmt) -> int:
+    """number of values a `struct` format packs/unpacks"""
+    st = Struct('<' + fmt)
+    return len(st.unpack(bytes(st.size)))
+
+
+@lru_cache(maxsize=1024)
+def mac_to_bytes(addr: str) -> bytes:
+    """mac address in wire order, e.g. 'd0:73:d5:01:02:03' -> b'\\xd0\\x73\\xd5\\x01\\x02\\x03'"""
+    return bytes.fromhex(addr.replace(':', ''))
+
+
+@lru_cache(maxsize=1024)
+def mac_from_bytes(addr: bytes) -> str:
+    """inverse of `mac_to_bytes`; ignores padding after the 6th byte"""
+    return ':'.join(f'{b:02x}' for b in addr[:6])
+
+
 # reverses bytes for little endian, then converts to int
 def convert_MAC_to_int(addr):
     reverse_bytes_str = addr.split(':')
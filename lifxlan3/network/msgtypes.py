@@ -8,15 +8,11 @@
 from collections import defaultdict
 from typing import Optional, Dict
 
-import bitstring
-
 from lifxlan3.settings import UNKNOWN
-from .message import BROADCAST_MAC, Message, little_endian
+from .message import BROADCAST_MAC, Message, Field, label_field, byte_array_field, color_field, colors_field
 
 ##### DEVICE MESSAGES #####
 
-from struct import Struct, pack
-
 
 class GetService(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -28,20 +24,15 @@ class GetService(Message):
 
 
 class StateService(Message):
+    fields = (Field('service', 'B', 'Service'),
+              Field('port', 'I', 'Port'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.service = payload["service"]
         self.port = payload["port"]
         super(StateService, self).__init__(MSG_IDS[StateService], target_addr, source_id, seq_num, ack_requested,
                                            response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Service", self.service))
-        self.payload_fields.append(("Port", self.port))
-        service = little_endian(bitstring.pack("8", self.service))
-        port = little_endian(bitstring.pack("32", self.port))
-        payload = service + port
-        return payload
-
 
 class GetHostInfo(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -52,6 +43,13 @@ class GetHostInfo(Message):
 
 
 class StateHostInfo(Message):
+    # float32, as the protocol specifies and `unpack_lifx_message` has always read it. the original bitstring
+    # encoder wrote `int(signal)` as a uint32 here instead, so encoded signal values differ from before
+    fields = (Field('signal', 'f', 'Signal (mW)'),
+              Field('tx', 'I', 'TX (bytes since on)'),
+              Field('rx', 'I', 'RX (bytes since on)'),
+              Field('reserved1', 'h', 'Reserved'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.signal = payload["signal"]
         self.tx = payload["tx"]
@@ -60,18 +58,6 @@ class StateHostInfo(Message):
         super(StateHostInfo, self).__init__(MSG_IDS[StateHostInfo], target_addr, source_id, seq_num, ack_requested,
                                             response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Signal (mW)", self.signal))
-        self.payload_fields.append(("TX (bytes since on)", self.tx))
-        self.payload_fields.append(("RX (bytes since on)", self.rx))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        signal = little_endian(bitstring.pack("32", self.signal))
-        tx = little_endian(bitstring.pack("32", self.tx))
-        rx = little_endian(bitstring.pack("32", self.rx))
-        reserved1 = little_endian(bitstring.pack("16", self.reserved1))
-        payload = signal + tx + rx + reserved1
-        return payload
-
 
 class GetHostFirmware(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -82,6 +68,10 @@ class GetHostFirmware(Message):
 
 
 class StateHostFirmware(Message):
+    fields = (Field('build', 'Q', 'Timestamp of Build'),
+              Field('reserved1', 'Q', 'Reserved'),
+              Field('version', 'I', 'Version'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.build = payload["build"]
         self.reserved1 = payload["reserved1"]
@@ -89,16 +79,6 @@ class StateHostFirmware(Message):
         super(StateHostFirmware, self).__init__(MSG_IDS[StateHostFirmware], target_addr, source_id, seq_num,
                                                 ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Timestamp of Build", self.build))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Version", self.version))
-        build = little_endian(bitstring.pack("64", self.build))
-        reserved1 = little_endian(bitstring.pack("64", self.reserved1))
-        version = little_endian(bitstring.pack("32", self.version))
-        payload = build + reserved1 + version
-        return payload
-
 
 class GetWifiInfo(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -109,6 +89,12 @@ class GetWifiInfo(Message):
 
 
 class StateWifiInfo(Message):
+    # float32: see `StateHostInfo`
+    fields = (Field('signal', 'f', 'Signal (mW)'),
+              Field('tx', 'I', 'TX (bytes since on)'),
+              Field('rx', 'I', 'RX (bytes since on)'),
+              Field('reserved1', 'h', 'Reserved'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.signal = payload["signal"]
         self.tx = payload["tx"]
@@ -117,18 +103,6 @@ class StateWifiInfo(Message):
         super(StateWifiInfo, self).__init__(MSG_IDS[StateWifiInfo], target_addr, source_id, seq_num, ack_requested,
                                             response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Signal (mW)", self.signal))
-        self.payload_fields.append(("TX (bytes since on)", self.tx))
-        self.payload_fields.append(("RX (bytes since on)", self.rx))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        signal = little_endian(bitstring.pack("32", self.signal))
-        tx = little_endian(bitstring.pack("32", self.tx))
-        rx = little_endian(bitstring.pack("32", self.rx))
-        reserved1 = little_endian(bitstring.pack("16", self.reserved1))
-        payload = signal + tx + rx + reserved1
-        return payload
-
 
 class GetWifiFirmware(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -139,6 +113,10 @@ class GetWifiFirmware(Message):
 
 
 class StateWifiFirmware(Message):
+    fields = (Field('build', 'Q', 'Timestamp of Build'),
+              Field('reserved1', 'Q', 'Reserved'),
+              Field('version', 'I', 'Version'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.build = payload["build"]
         self.reserved1 = payload["reserved1"]
@@ -146,16 +124,6 @@ class StateWifiFirmware(Message):
         super(StateWifiFirmware, self).__init__(MSG_IDS[StateWifiFirmware], target_addr, source_id, seq_num,
                                                 ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Timestamp of Build", self.build))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Version", self.version))
-        build = little_endian(bitstring.pack("64", self.build))
-        reserved1 = little_endian(bitstring.pack("64", self.reserved1))
-        version = little_endian(bitstring.pack("32", self.version))
-        payload = build + reserved1 + version
-        return payload
-
 
 class GetPower(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -166,30 +134,22 @@ class GetPower(Message):
 
 
 class SetPower(Message):
+    fields = (Field('power_level', 'H', 'Power'),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.power_level = payload["power_level"]
         super(SetPower, self).__init__(MSG_IDS[SetPower], target_addr, source_id, seq_num, ack_requested,
                                        response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Power", self.power_level))
-        power_level = little_endian(bitstring.pack("16", self.power_level))
-        payload = power_level
-        return payload
-
 
 class StatePower(Message):
+    fields = (Field('power_level', 'H', 'Power'),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.power_level = payload["power_level"]
         super(StatePower, self).__init__(MSG_IDS[StatePower], target_addr, source_id, seq_num, ack_requested,
                                          response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Power", self.power_level))
-        power_level = little_endian(bitstring.pack("16", self.power_level))
-        payload = power_level
-        return payload
-
 
 class GetLabel(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -200,40 +160,22 @@ class GetLabel(Message):
 
 
 class SetLabel(Message):
+    fields = (label_field(),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.label = payload["label"]
         super(SetLabel, self).__init__(MSG_IDS[SetLabel], target_addr, source_id, seq_num, ack_requested,
                                        response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Label", self.label))
-        field_len_bytes = 32
-        try:
-            label = b"".join(little_endian(bitstring.pack("8", c)) for c in self.label.encode('utf-8'))
-        except ValueError:  # because of differences in Python 2 and 3
-            label = b"".join(little_endian(bitstring.pack("8", ord(c))) for c in self.label.encode('utf-8'))
-        padding = b"".join(little_endian(bitstring.pack("8", 0)) for i in range(field_len_bytes - len(self.label)))
-        payload = label + padding
-        return payload
-
 
 class StateLabel(Message):
+    fields = (label_field(),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.label = payload["label"]
         super(StateLabel, self).__init__(MSG_IDS[StateLabel], target_addr, source_id, seq_num, ack_requested,
                                          response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Label", self.label))
-        field_len_bytes = 32
-        try:
-            label = b"".join(little_endian(bitstring.pack("8", c)) for c in self.label.encode('utf-8'))
-        except ValueError:  # because of differences in Python 2 and 3
-            label = b"".join(little_endian(bitstring.pack("8", ord(c))) for c in self.label.encode('utf-8'))
-        padding = b"".join(little_endian(bitstring.pack("8", 0)) for i in range(field_len_bytes - len(self.label)))
-        payload = label + padding
-        return payload
-
 
 class GetVersion(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -244,6 +186,10 @@ class GetVersion(Message):
 
 
 class StateVersion(Message):
+    fields = (Field('vendor', 'I', 'Vendor'),
+              Field('product', 'I', 'Product'),
+              Field('version', 'I', 'Version'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.vendor = payload["vendor"]
         self.product = payload["product"]
@@ -251,16 +197,6 @@ class StateVersion(Message):
         super(StateVersion, self).__init__(MSG_IDS[StateVersion], target_addr, source_id, seq_num, ack_requested,
                                            response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Vendor", self.vendor))
-        self.payload_fields.append(("Reserved", self.product))
-        self.payload_fields.append(("Version", self.version))
-        vendor = little_endian(bitstring.pack("32", self.vendor))
-        product = little_endian(bitstring.pack("32", self.product))
-        version = little_endian(bitstring.pack("32", self.version))
-        payload = vendor + product + version
-        return payload
-
 
 class GetInfo(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -271,6 +207,10 @@ class GetInfo(Message):
 
 
 class StateInfo(Message):
+    fields = (Field('time', 'Q', 'Current Time'),
+              Field('uptime', 'Q', 'Uptime (ns)'),
+              Field('downtime', 'Q', 'Last Downtime Duration (ns) (5 second error)'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.time = payload["time"]
         self.uptime = payload["uptime"]
@@ -278,16 +218,6 @@ class StateInfo(Message):
         super(StateInfo, self).__init__(MSG_IDS[StateInfo], target_addr, source_id, seq_num, ack_requested,
                                         response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Current Time", self.time))
-        self.payload_fields.append(("Uptime (ns)", self.uptime))
-        self.payload_fields.append(("Last Downtime Duration (ns) (5 second error)", self.downtime))
-        time = little_endian(bitstring.pack("64", self.time))
-        uptime = little_endian(bitstring.pack("64", self.uptime))
-        downtime = little_endian(bitstring.pack("64", self.downtime))
-        payload = time + uptime + downtime
-        return payload
-
 
 class GetLocation(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -298,6 +228,10 @@ class GetLocation(Message):
 
 
 class StateLocation(Message):
+    fields = (byte_array_field('location', 'Location', 16),
+              label_field(),
+              Field('updated_at', 'Q', 'Updated At'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.location = payload["location"]
         self.label = payload["label"]
@@ -305,21 +239,6 @@ class StateLocation(Message):
         super(StateLocation, self).__init__(MSG_IDS[StateLocation], target_addr, source_id, seq_num, ack_requested,
                                             response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Location", self.location))
-        self.payload_fields.append(("Label", self.label))
-        self.payload_fields.append(("Updated At", self.updated_at))
-        location = b"".join(little_endian(bitstring.pack("8", b)) for b in self.location)
-        try:
-            label = b"".join(little_endian(bitstring.pack("8", c)) for c in self.label.encode('utf-8'))
-        except ValueError:  # because of differences in Python 2 and 3
-            label = b"".join(little_endian(bitstring.pack("8", ord(c))) for c in self.label.encode('utf-8'))
-        label_padding = b"".join(little_endian(bitstring.pack("8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        updated_at = little_endian(bitstring.pack("64", self.updated_at))
-        payload = location + label + updated_at
-        return payload
-
 
 class GetGroup(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -330,6 +249,10 @@ class GetGroup(Message):
 
 
 class StateGroup(Message):
+    fields = (byte_array_field('group', 'Group', 16),
+              label_field(),
+              Field('updated_at', 'Q', 'Updated At'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.group = payload["group"]
         self.label = payload["label"]
@@ -337,21 +260,6 @@ class StateGroup(Message):
         super(StateGroup, self).__init__(MSG_IDS[StateGroup], target_addr, source_id, seq_num, ack_requested,
                                          response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Group", self.group))
-        self.payload_fields.append(("Label", self.label))
-        self.payload_fields.append(("Updated At", self.updated_at))
-        group = b"".join(little_endian(bitstring.pack("8", b)) for b in self.group)
-        try:
-            label = b"".join(little_endian(bitstring.pack("8", c)) for c in self.label.encode('utf-8'))
-        except ValueError:  # because of differences in Python 2 and 3
-            label = b"".join(little_endian(bitstring.pack("8", ord(c))) for c in self.label.encode('utf-8'))
-        label_padding = b"".join(little_endian(bitstring.pack("8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        updated_at = little_endian(bitstring.pack("64", self.updated_at))
-        payload = group + label + updated_at
-        return payload
-
 
 class Acknowledgement(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -362,36 +270,22 @@ class Acknowledgement(Message):
 
 
 class EchoRequest(Message):
+    fields = (byte_array_field('byte_array', 'Byte Array', 64),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.byte_array = payload["byte_array"]
         super(EchoRequest, self).__init__(MSG_IDS[EchoRequest], target_addr, source_id, seq_num, ack_requested,
                                           response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Byte Array", self.byte_array))
-        field_len = 64
-        byte_array = b"".join(little_endian(bitstring.pack("8", b)) for b in self.byte_array)
-        byte_array_len = len(byte_array)
-        if byte_array_len < field_len:
-            byte_array += b"".join(little_endian(bitstring.pack("8", 0)) for i in range(field_len - byte_array_len))
-        elif byte_array_len > field_len:
-            byte_array = byte_array[:field_len]
-        payload = byte_array
-        return payload
-
 
 class EchoResponse(Message):
+    fields = (byte_array_field('byte_array', 'Byte Array', 64),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.byte_array = payload["byte_array"]
         super(EchoResponse, self).__init__(MSG_IDS[EchoResponse], target_addr, source_id, seq_num, ack_requested,
                                            response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Byte Array", self.byte_array))
-        byte_array = b"".join(little_endian(bitstring.pack("8", b)) for b in self.byte_array)
-        payload = byte_array
-        return payload
-
 
 ##### LIGHT MESSAGES #####
 
@@ -405,23 +299,26 @@ class LightGet(Message):
 
 
 class LightSetColor(Message):
+    fields = (Field('reserved', 'B', 'Reserved'),
+              color_field(label='Color'),
+              Field('duration', 'I', 'Duration'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.color = payload["color"]
         self.duration = payload["duration"]
         super(LightSetColor, self).__init__(MSG_IDS[LightSetColor], target_addr, source_id, seq_num, ack_requested,
                                             response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Color", self.color))
-        self.payload_fields.append(("Duration", self.duration))
-        reserved_8 = little_endian(bitstring.pack("8", self.reserved))
-        color = b"".join(little_endian(bitstring.pack("16", field)) for field in self.color)
-        duration = little_endian(bitstring.pack("32", self.duration))
-        payload = reserved_8 + color + duration
-        return payload
-
 
 class LightSetWaveform(Message):
+    fields = (Field('reserved', 'B', 'Reserved'),
+              Field('transient', 'B', 'Is Transient'),
+              color_field(label='Color'),
+              Field('period', 'I', 'Period'),
+              Field('cycles', 'f', 'Cycles'),
+              Field('skew_ratio', 'h', 'Skew Ratio'),
+              Field('waveform', 'B', 'Waveform'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.transient = payload["transient"]
         self.color = payload["color"]
@@ -432,25 +329,14 @@ class LightSetWaveform(Message):
         super(LightSetWaveform, self).__init__(MSG_IDS[LightSetWaveform], target_addr, source_id, seq_num,
                                                ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Is Transient", self.transient))
-        self.payload_fields.append(("Color", self.color))
-        self.payload_fields.append(("Period", self.period))
-        self.payload_fields.append(("Cycles", self.cycles))
-        self.payload_fields.append(("Skew Ratio", self.skew_ratio))
-        self.payload_fields.append(("Waveform", self.waveform))
-        reserved_8 = little_endian(bitstring.pack("8", self.reserved))
-        transient = little_endian(bitstring.pack("uint:8", self.transient))
-        color = b"".join(little_endian(bitstring.pack("16", field)) for field in self.color)
-        period = little_endian(bitstring.pack("uint:32", self.period))
-        cycles = little_endian(bitstring.pack("float:32", self.cycles))
-        duty_cycle = little_endian(bitstring.pack("int:16", self.skew_ratio))
-        waveform = little_endian(bitstring.pack("uint:8", self.waveform))
-        payload = reserved_8 + transient + color + period + cycles + duty_cycle + waveform
-        return payload
-
 
 class LightState(Message):
+    fields = (color_field(),
+              Field('reserved1', 'H', 'Reserved'),
+              Field('power_level', 'H', 'Power Level'),
+              label_field(),
+              Field('reserved2', 'Q', 'Reserved'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.color = payload["color"]
         self.reserved1 = payload["reserved1"]
@@ -460,25 +346,6 @@ class LightState(Message):
         super(LightState, self).__init__(MSG_IDS[LightState], target_addr, source_id, seq_num, ack_requested,
                                          response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        self.payload_fields.append(("Reserved", self.reserved1))
-        self.payload_fields.append(("Power Level", self.power_level))
-        self.payload_fields.append(("Label", self.label))
-        self.payload_fields.append(("Reserved", self.reserved2))
-        color = b"".join(little_endian(bitstring.pack("16", field)) for field in self.color)
-        reserved1 = little_endian(bitstring.pack("16", self.reserved1))
-        power_level = little_endian(bitstring.pack("16", self.power_level))
-        try:
-            label = b"".join(little_endian(bitstring.pack("8", c)) for c in self.label.encode('utf-8'))
-        except ValueError:  # because of differences in Python 2 and 3
-            label = b"".join(little_endian(bitstring.pack("8", ord(c))) for c in self.label.encode('utf-8'))
-        label_padding = b"".join(little_endian(bitstring.pack("8", 0)) for i in range(32 - len(self.label)))
-        label += label_padding
-        reserved2 = little_endian(bitstring.pack("64", self.reserved1))
-        payload = color + reserved1 + power_level + label + reserved2
-        return payload
-
 
 class LightGetPower(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
@@ -489,33 +356,24 @@ class LightGetPower(Message):
 
 
 class LightSetPower(Message):
+    fields = (Field('power_level', 'H', 'Power Level'),
+              Field('duration', 'I', 'Duration'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.power_level = payload["power_level"]
         self.duration = payload["duration"]
         super(LightSetPower, self).__init__(MSG_IDS[LightSetPower], target_addr, source_id, seq_num, ack_requested,
                                             response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Power Level", self.power_level))
-        self.payload_fields.append(("Duration", self.duration))
-        power_level = little_endian(bitstring.pack("16", self.power_level))
-        duration = little_endian(bitstring.pack("32", self.duration))
-        payload = power_level + duration
-        return payload
-
 
 class LightStatePower(Message):
+    fields = (Field('power_level', 'H', 'Power Level'),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.power_level = payload["power_level"]
         super(LightStatePower, self).__init__(MSG_IDS[LightStatePower], target_addr, source_id, seq_num, ack_requested,
                                               response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Power Level", self.power_level))
-        power_level = little_endian(bitstring.pack("16", self.power_level))
-        payload = power_level
-        return payload
-
 
 ##### INFRARED MESSAGES #####
 
@@ -528,34 +386,30 @@ class LightGetInfrared(Message):
 
 
 class LightStateInfrared(Message):
+    fields = (Field('infrared_brightness', 'H', 'Infrared Brightness'),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.infrared_brightness = payload["infrared_brightness"]
         super(LightStateInfrared, self).__init__(MSG_IDS[LightStateInfrared], target_addr, source_id, seq_num,
                                                  ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Infrared Brightness", self.infrared_brightness))
-        infrared_brightness = little_endian(bitstring.pack("16", self.infrared_brightness))
-        payload = infrared_brightness
-        return payload
-
 
 class LightSetInfrared(Message):
+    fields = (Field('infrared_brightness', 'H', 'Infrared Brightness'),)
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.infrared_brightness = payload["infrared_brightness"]
         super(LightSetInfrared, self).__init__(MSG_IDS[LightSetInfrared], target_addr, source_id, seq_num,
                                                ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Infrared Brightness", self.infrared_brightness))
-        infrared_brightness = little_endian(bitstring.pack("16", self.infrared_brightness))
-        payload = infrared_brightness
-        return payload
-
 
 ##### MULTIZONE MESSAGES #####
 
 class MultizoneStateMultizone(Message):
+    fields = (Field('count', 'B', 'Count'),
+              Field('index', 'B', 'Index'),
+              colors_field('color', 'Color (HSBK)', 8))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.count = payload["count"]
         self.index = payload["index"]
@@ -563,19 +417,12 @@ class MultizoneStateMultizone(Message):
         super(MultizoneStateMultizone, self).__init__(MSG_IDS[MultizoneStateMultizone], target_addr, source_id, seq_num,
                                                       ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Count", self.count))
-        self.payload_fields.append(("Index", self.index))
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        count = little_endian(bitstring.pack("8", self.count))
-        index = little_endian(bitstring.pack("8", self.index))
-        payload = count + index
-        for color in self.color:
-            payload += b"".join(little_endian(bitstring.pack("16", field)) for field in color)
-        return payload
-
 
 class MultizoneStateZone(Message):  # 503
+    fields = (Field('count', 'B', 'Count'),
+              Field('index', 'B', 'Index'),
+              color_field())
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.count = payload["count"]
         self.index = payload["index"]
@@ -583,18 +430,14 @@ class MultizoneStateZone(Message):  # 503
         super(MultizoneStateZone, self).__init__(MSG_IDS[MultizoneStateZone], target_addr, source_id, seq_num,
                                                  ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Count", self.count))
-        self.payload_fields.append(("Index", self.index))
-        self.payload_fields.append(("Color (HSBK)", self.color))
-        count = little_endian(bitstring.pack("8", self.count))
-        index = little_endian(bitstring.pack("8", self.index))
-        color = b"".join(little_endian(bitstring.pack("16", field)) for field in self.color)
-        payload = count + index + color
-        return payload
-
 
 class MultizoneSetColorZones(Message):
+    fields = (Field('start_index', 'B', 'Start Index'),
+              Field('end_index', 'B', 'End Index'),
+              color_field(label='Color'),
+              Field('duration', 'I', 'Duration'),
+              Field('apply', 'B', 'Apply'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.start_index = payload["start_index"]
         self.end_index = payload["end_index"]
@@ -604,39 +447,40 @@ class MultizoneSetColorZones(Message):
         super(MultizoneSetColorZones, self).__init__(MSG_IDS[MultizoneSetColorZones], target_addr, source_id, seq_num,
                                                      ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Start Index", self.start_index))
-        self.payload_fields.append(("End Index", self.end_index))
-        self.payload_fields.append(("Color", self.color))
-        self.payload_fields.append(("Duration", self.duration))
-        self.payload_fields.append(("Apply", self.apply))
-        start_index = little_endian(bitstring.pack("8", self.start_index))
-        end_index = little_endian(bitstring.pack("8", self.end_index))
-        color = b"".join(little_endian(bitstring.pack("16", field)) for field in self.color)
-        duration = little_endian(bitstring.pack("32", self.duration))
-        apply = little_endian(bitstring.pack("8", self.apply))
-        payload = start_index + end_index + color + duration + apply
-        return payload
-
 
 class MultizoneGetColorZones(Message):
+    fields = (Field('start_index', 'B', 'Start Index'),
+              Field('end_index', 'B', 'End Index'))
+
     def __init__(self, target_addr, source_id, seq_num, payload, ack_requested=False, response_requested=False):
         self.start_index = payload["start_index"]
         self.end_index = payload["end_index"]
         super(MultizoneGetColorZones, self).__init__(MSG_IDS[MultizoneGetColorZones], target_addr, source_id, seq_num,
                                                      ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Start Index", self.start_index))
-        self.payload_fields.append(("End Index", self.end_index))
-        start_index = little_endian(bitstring.pack("8", self.start_index))
-        end_index = little_endian(bitstring.pack("8", self.end_index))
-        payload = start_index + end_index
-        return payload
-
 
 ##### TILE MESSAGES #####
 
+MAX_TILES = 16
+TILE_FORMAT = 'hhhhffBBBIIIQQII'
+TILE_KEYS = ('reserved1', 'reserved2', 'reserved3', 'reserved4', 'user_x', 'user_y', 'width', 'height', 'reserved5',
+             'device_version_vendor', 'device_version_product', 'device_version_version', 'firmware_build',
+             'reserved6', 'firmware_version', 'reserved7')
+
+
+def _encode_tiles(tile_devices):
+    """flatten tile dicts, padding with empty tiles up to `MAX_TILES`"""
+    tile_devices = list(tile_devices)[:MAX_TILES]
+    vals = [tile[k] for tile in tile_devices for k in TILE_KEYS]
+    vals.extend(0 for _ in range(len(TILE_KEYS) * (MAX_TILES - len(tile_devices))))
+    return vals
+
+
+def _decode_tiles(vals):
+    n = len(TILE_KEYS)
+    return [dict(zip(TILE_KEYS, vals[i:i + n])) for i in range(0, len(vals), n)]
+
+
 class GetDeviceChain(Message):
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
@@ -647,6 +491,10 @@ class GetDeviceChain(Message):
 
 
 class StateDeviceChain(Message):
+    fields = (Field('start_index', 'B', 'Start Index'),
+              Field('tile_devices', TILE_FORMAT * MAX_TILES, 'Tile Devices', _encode_tiles, _decode_tiles),
+              Field('total_count', 'B', 'Total Count'))
+
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
         payload = payload or {}
@@ -657,37 +505,13 @@ class StateDeviceChain(Message):
         super(StateDeviceChain, self).__init__(MSG_IDS[StateDeviceChain], target_addr, source_id, seq_num,
                                                ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Start Index", self.start_index))
-        self.payload_fields.append(("Total Count", self.total_count))
-        self.payload_fields.append(("Tile Devices", self.tile_devices))
-        payload = little_endian(bitstring.pack("uint:8", self.start_index))
-        for tile in self.tile_devices:
-            accel_meas_x = little_endian(bitstring.pack("int:16", tile['reserved1']))
-            accel_meas_y = little_endian(bitstring.pack("int:16", tile['reserved2']))
-            accel_meas_z = little_endian(bitstring.pack("int:16", tile['reserved3']))
-            reserved4 = little_endian(bitstring.pack("int:16", tile['reserved4']))
-            user_x = little_endian(bitstring.pack("float:32", tile['user_x']))
-            user_y = little_endian(bitstring.pack("float:32", tile['user_y']))
-            width = little_endian(bitstring.pack("uint:8", tile['width']))
-            height = little_endian(bitstring.pack("uint:8", tile['height']))
-            reserved5 = little_endian(bitstring.pack("uint:8", tile['reserved5']))
-            device_version_vendor = little_endian(bitstring.pack("uint:32", tile['device_version_vendor']))
-            device_version_product = little_endian(bitstring.pack("uint:32", tile['device_version_product']))
-            device_version_version = little_endian(bitstring.pack("uint:32", tile['device_version_version']))
-            firmware_build = little_endian(bitstring.pack("uint:64", tile['firmware_build']))
-            reserved6 = little_endian(bitstring.pack("uint:64", tile['reserved6']))
-            firmware_version = little_endian(bitstring.pack("uint:32", tile['firmware_version']))
-            reserved7 = little_endian(bitstring.pack("uint:32", tile['reserved7']))
-            payload += (accel_meas_x + accel_meas_y + accel_meas_z + reserved4 + user_x + user_y + width + height +
-                        reserved5 + device_version_vendor + device_version_product + device_version_version +
-                        firmware_build + reserved6 + firmware_version + reserved7)
-        total_count = little_endian(bitstring.pack("uint:8", self.total_count))
-        payload += total_count
-        return payload
-
 
 class SetUserPosition(Message):
+    fields = (Field('tile_index', 'B', 'Tile Index'),
+              Field('reserved', 'H', 'Reserved'),
+              Field('user_x', 'f', 'User X'),
+              Field('user_y', 'f', 'User Y'))
+
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
         payload = payload or {}
@@ -699,20 +523,15 @@ class SetUserPosition(Message):
         super(SetUserPosition, self).__init__(MSG_IDS[SetUserPosition], target_addr, source_id, seq_num, ack_requested,
                                               response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Tile Index", self.tile_index))
-        self.payload_fields.append(("Reserved", self.reserved))
-        self.payload_fields.append(("User X", self.user_x))
-        self.payload_fields.append(("User Y", self.user_y))
-        tile_index = little_endian(bitstring.pack("uint:8", self.tile_index))
-        reserved = little_endian(bitstring.pack("uint:16", self.reserved))
-        user_x = little_endian(bitstring.pack("float:32", self.user_x))
-        user_y = little_endian(bitstring.pack("float:32", self.user_y))
-        payload = tile_index + reserved + user_x + user_y
-        return payload
-
 
 class GetTileState64(Message):
+    fields = (Field('tile_index', 'B', 'Tile Index'),
+              Field('length', 'B', 'Length'),
+              Field('reserved', 'B', 'Reserved'),
+              Field('x', 'B', 'X'),
+              Field('y', 'B', 'Y'),
+              Field('width', 'B', 'Width'))
+
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
         payload = payload or {}
@@ -726,24 +545,15 @@ class GetTileState64(Message):
         super(GetTileState64, self).__init__(MSG_IDS[GetTileState64], target_addr, source_id, seq_num, ack_requested,
                                              response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Tile Index", self.tile_index))
-        self.payload_fields.append(("Length", self.length))
-        self.payload_fields.append(("Reserved", self.reserved))
-        self.payload_fields.append(("X", self.x))
-        self.payload_fields.append(("Y", self.y))
-        self.payload_fields.append(("Width", self.width))
-        tile_index = little_endian(bitstring.pack("uint:8", self.tile_index))
-        length = little_endian(bitstring.pack("uint:8", self.length))
-        reserved = little_endian(bitstring.pack("uint:8", self.reserved))
-        x = little_endian(bitstring.pack("uint:8", self.x))
-        y = little_endian(bitstring.pack("uint:8", self.y))
-        width = little_endian(bitstring.pack("uint:8", self.width))
-        payload = tile_index + length + reserved + x + y + width
-        return payload
-
 
 class StateTileState64(Message):
+    fields = (Field('tile_index', 'B', 'Tile Index'),
+              Field('reserved', 'B', 'Reserved'),
+              Field('x', 'B', 'X'),
+              Field('y', 'B', 'Y'),
+              Field('width', 'B', 'Width'),
+              colors_field('colors', 'Colors[64]', 64))
+
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
         payload = payload or {}
@@ -757,25 +567,17 @@ class StateTileState64(Message):
         super(StateTileState64, self).__init__(MSG_IDS[StateTileState64], target_addr, source_id, seq_num,
                                                ack_requested, response_requested)
 
-    def get_payload(self):
-        self.payload_fields.append(("Tile Index", self.tile_index))
-        self.payload_fields.append(("Reserved", self.reserved))
-        self.payload_fields.append(("X", self.x))
-        self.payload_fields.append(("Y", self.y))
-        self.payload_fields.append(("Width", self.width))
-        self.payload_fields.append(("Colors[64]", self.colors))
-        tile_index = little_endian(bitstring.pack("uint:8", self.tile_index))
-        reserved = little_endian(bitstring.pack("uint:8", self.reserved))
-        x = little_endian(bitstring.pack("uint:8", self.x))
-        y = little_endian(bitstring.pack("uint:8", self.y))
-        width = little_endian(bitstring.pack("uint:8", self.width))
-        payload = tile_index + reserved + x + y + width
-        for color in self.colors:
-            payload += b"".join(little_endian(bitstring.pack("16", field)) for field in color)
-        return payload
-
 
 class SetTileState64(Message):
+    fields = (Field('tile_index', 'B', 'Tile Index'),
+              Field('length', 'B', 'Length'),
+              Field('reserved', 'B', 'Reserved'),
+              Field('x', 'B', 'X'),
+              Field('y', 'B', 'Y'),
+              Field('width', 'B', 'Width'),
+              Field('duration', 'I', 'Duration'),
+              colors_field('colors', 'Colors', 64))
+
     def __init__(self, target_addr, source_id, seq_num, payload: Optional[Dict] = None, ack_requested=False,
                  response_requested=False):
         payload = payload or {}
@@ -791,42 +593,6 @@ class SetTileState64(Message):
         super(SetTileState64, self).__init__(MSG_IDS[SetTileState64], target_addr, source_id, seq_num, ack_requested,
                                              response_requested)
 
-    def get_payload_orig(self):
-        tile_index = little_endian(bitstring.pack("uint:8", self.tile_index))
-        length = little_endian(bitstring.pack("uint:8", self.length))
-        reserved = little_endian(bitstring.pack("uint:8", self.reserved))
-        x = little_endian(bitstring.pack("uint:8", self.x))
-        y = little_endian(bitstring.pack("uint:8", self.y))
-        width = little_endian(bitstring.pack("uint:8", self.width))
-        duration = little_endian(bitstring.pack("32", self.duration))
-        payload = tile_index + length + reserved + x + y + width + duration
-        for color in self.colors:
-            payload += b"".join(little_endian(bitstring.pack("16", field)) for field in color)
-        return payload
-
-    def get_payload(self):
-        """about 3 orders of magnitude faster than the original"""
-        self.payload_fields.append(("Tile Index", self.tile_index))
-        self.payload_fields.append(("Length", self.length))
-        self.payload_fields.append(("Reserved", self.reserved))
-        self.payload_fields.append(("X", self.x))
-        self.payload_fields.append(("Y", self.y))
-        self.payload_fields.append(("Width", self.width))
-        self.payload_fields.append(("Duration", self.duration))
-        self.payload_fields.append(("Colors", self.colors))
-        s1 = Struct('<B')
-
-        res = []
-        res.append(s1.pack(self.tile_index))
-        res.append(s1.pack(self.length))
-        res.append(s1.pack(self.reserved))
-        res.append(s1.pack(self.x))
-        res.append(s1.pack(self.y))
-        res.append(s1.pack(self.width))
-        res.append(pack('<L', self.duration))
-        res.append(pack('<256H', *(v for c in self.colors for v in c)))
-        return b''.join(res)
-
 
 MSG_IDS = {GetService: 2,
            StateService: 3,
@@ -1,13 +1,15 @@
 import time
-from socket import timeout
-from typing import Optional, Dict, Type
+from queue import Empty
+from typing import Optional, Dict, Type, Iterator, Iterable, Set
 
 import netifaces as ni
 
 from .message import Message
-from .unpack import unpack_lifx_message, Acknowledgement
-from lifxlan3.settings import TOTAL_NUM_LIGHTS
-from lifxlan3.utils import init_socket, init_log
+from .transport import get_transport
+from .msgtypes import GetService, StateService
+from .unpack import Acknowledgement
+from lifxlan3.settings import TOTAL_NUM_LIGHTS, BROADCAST_ADDRS, BROADCAST_PORT
+from lifxlan3.utils import init_log
 
 __author__ = 'acushner'
 
@@ -26,13 +28,125 @@ def _get_broadcast_addrs():
     return broadcast_addrs
 
 
-UDP_BROADCAST_IP_ADDRS = _get_broadcast_addrs()
-UDP_BROADCAST_PORT = 56700
+UDP_BROADCAST_IP_ADDRS = BROADCAST_ADDRS.split(',') if BROADCAST_ADDRS else _get_broadcast_addrs()
+UDP_BROADCAST_PORT = BROADCAST_PORT
 DEFAULT_TIMEOUT = .7  # second
 DEFAULT_ATTEMPTS = 4
 BROADCAST_MAC = "00:00:00:00:00:00"
 MessageType = Type[Message]
 
+# discovery: rebroadcast with exponential backoff and stop once no new device has answered for a while
+DISCOVERY_INITIAL_INTERVAL = .1  # second
+DISCOVERY_MAX_INTERVAL = 1.
+DISCOVERY_MIN_BROADCASTS = 2
+DISCOVERY_QUIET_SECS = .6
+DISCOVERY_MAX_SECS = 5.
+
+SWEEP_TIMEOUT = .5  # second
+BROADCAST_REPEATS = 3
+
+
+def set_broadcast_addrs(ip_addrs: Iterable[str], port: Optional[int] = None):
+    """
+    send discovery and other broadcasts to `ip_addrs` (and `port`) instead of the lan's broadcast addresses,
+    e.g. to point `LifxLAN` at a `lifxlan3.sim.Simulator` on localhost
+    """
+    global UDP_BROADCAST_PORT
+    UDP_BROADCAST_IP_ADDRS[:] = ip_addrs  # in place: other modules hold a reference to this list
+    if port is not None:
+        UDP_BROADCAST_PORT = port
+
+
+class DiscoverySchedule:
+    """
+    when to rebroadcast during discovery and when to give up
+
+    broadcasts go out at 0, .1, .3, .7, 1.5, 2.5... seconds (doubling up to `max_interval`).
+    discovery is over when `quiet_secs` pass without a new responder (but only after
+    `min_broadcasts`, since a single broadcast packet may simply have been lost),
+    when `total_num_lights` have responded, or after `max_secs`
+    """
+
+    def __init__(self, total_num_lights: Optional[int] = None, quiet_secs=DISCOVERY_QUIET_SECS,
+                 max_secs=DISCOVERY_MAX_SECS, initial_interval=DISCOVERY_INITIAL_INTERVAL,
+                 max_interval=DISCOVERY_MAX_INTERVAL, min_broadcasts=DISCOVERY_MIN_BROADCASTS):
+        self.total_num_lights = total_num_lights
+        self.quiet_secs = quiet_secs
+        self.max_interval = max_interval
+        self.min_broadcasts = min_broadcasts
+
+        self.start = time.monotonic()
+        self.end = self.start + max_secs
+        self.last_new = self.start
+        self.next_broadcast = self.start
+        self.interval = initial_interval
+        self.num_broadcasts = 0
+        self.num_found = 0
+
+    def should_broadcast(self) -> bool:
+        now = time.monotonic()
+        if now < self.next_broadcast:
+            return False
+        self.num_broadcasts += 1
+        self.next_broadcast = now + self.interval
+        self.interval = min(2 * self.interval, self.max_interval)
+        return True
+
+    def found(self):
+        self.num_found += 1
+        self.last_new = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        now = time.monotonic()
+        if self.total_num_lights is not None and self.num_found >= self.total_num_lights:
+            return True
+        quiet = self.num_broadcasts >= self.min_broadcasts and now - self.last_new >= self.quiet_secs
+        return quiet or now >= self.end
+
+    @property
+    def wait_secs(self) -> float:
+        """how long to wait for a response before something needs doing"""
+        quiet_at = self.last_new + self.quiet_secs
+        return max(0., min(self.next_broadcast, quiet_at, self.end) - time.monotonic())
+
+
+def discover(source_id, msg_type: MessageType = GetService, response_type: MessageType = StateService,
+             payload: Optional[Dict] = None, *, total_num_lights: Optional[int] = None,
+             quiet_secs=DISCOVERY_QUIET_SECS, max_secs=DISCOVERY_MAX_SECS, verbose=False) -> Iterator[Message]:
+    """
+    broadcast `msg_type` and yield each device's `response_type` as soon as it arrives
+
+    see `DiscoverySchedule` for when broadcasts are resent and when discovery stops.
+    `total_num_lights` is only a hint to stop early; leaving it out costs at most `quiet_secs`
+    """
+    transport = get_transport()
+    msg = _create_msg(msg_type, response_type, source_id, payload or {},
+                      transport.next_seq_num(source_id, BROADCAST_MAC))
+    schedule = DiscoverySchedule(total_num_lights, quiet_secs, max_secs)
+    addr_seen = set()
+
+    def is_response(r):
+        return type(r) == response_type and r.source_id == source_id and r.seq_num == msg.seq_num
+
+    with transport.subscribe(is_response) as queue:
+        while not schedule.done:
+            if schedule.should_broadcast():
+                for ip_addr in UDP_BROADCAST_IP_ADDRS:
+                    transport.sendto(msg.packed_message, (ip_addr, UDP_BROADCAST_PORT))
+                if verbose:
+                    print("SEND: " + str(msg))
+            try:
+                response = queue.get(timeout=schedule.wait_secs)
+            except Empty:
+                continue
+            if verbose:
+                print("RECV: " + str(response))
+            if response.target_addr not in addr_seen and response.target_addr != BROADCAST_MAC:
+                addr_seen.add(response.target_addr)
+                schedule.found()
+                yield response
+
 
 def broadcast_with_resp(msg_type: MessageType, response_type: MessageType, source_id, payload: Optional[Dict] = None,
                         timeout_secs=DEFAULT_TIMEOUT,
@@ -40,7 +154,9 @@ def broadcast_with_resp(msg_type: MessageType, response_type: MessageType, sourc
                         total_num_lights=TOTAL_NUM_LIGHTS,
                         *, verbose=False):
     payload = payload or {}
-    msg = _create_msg(msg_type, response_type, source_id, payload)
+    transport = get_transport()
+    msg = _create_msg(msg_type, response_type, source_id, payload,
+                      transport.next_seq_num(source_id, BROADCAST_MAC))
     responses = []
     addr_seen = set()
     attempts = 0
@@ -48,49 +164,107 @@ def broadcast_with_resp(msg_type: MessageType, response_type: MessageType, sourc
     def found_all_lights():
         return not (total_num_lights is None or len(addr_seen) < total_num_lights)
 
-    with init_socket(timeout_secs) as sock:
+    def is_response(r):
+        return type(r) == response_type and r.source_id == source_id and r.seq_num == msg.seq_num
+
+    with transport.subscribe(is_response) as queue:
         while not found_all_lights() and attempts < max_attempts:
-            sent = False
-            start_time = time.time()
-            timedout = False
             attempts += 1
+            for ip_addr in UDP_BROADCAST_IP_ADDRS:
+                transport.sendto(msg.packed_message, (ip_addr, UDP_BROADCAST_PORT))
+            if verbose:
+                print("SEND: " + str(msg))
 
-            while not found_all_lights() and not timedout:
-                if not sent:
-                    for ip_addr in UDP_BROADCAST_IP_ADDRS:
-                        sock.sendto(msg.packed_message, (ip_addr, UDP_BROADCAST_PORT))
-                    sent = True
-                    if verbose:
-                        print("SEND: " + str(msg))
-
+            end_time = time.time() + timeout_secs
+            while not found_all_lights():
                 try:
-                    response = _get_response(response_type, source_id, sock, verbose)
-                    if response.target_addr not in addr_seen and response.target_addr != BROADCAST_MAC:
-                        addr_seen.add(response.target_addr)
-                        responses.append(response)
-                except timeout:
-                    timedout = time.time() - start_time > timeout_secs
+                    response = queue.get(timeout=max(0, end_time - time.time()))
+                except Empty:
+                    break
+                if verbose:
+                    print("RECV: " + str(response))
+                if response.target_addr not in addr_seen and response.target_addr != BROADCAST_MAC:
+                    addr_seen.add(response.target_addr)
+                    responses.append(response)
     return responses
 
 
-def _create_msg(msg_type, response_type, source_id, payload):
+def broadcast(msg_type: MessageType, source_id, payload: Optional[Dict] = None, num_repeats=BROADCAST_REPEATS,
+              *, verbose=False):
+    """send a tagged message to every device on the lan without waiting for anything back"""
+    transport = get_transport()
+    msg = msg_type(BROADCAST_MAC, source_id, seq_num=transport.next_seq_num(source_id, BROADCAST_MAC),
+                   payload=payload or {}, ack_requested=False, response_requested=False)
+    for _ in range(num_repeats):
+        for ip_addr in UDP_BROADCAST_IP_ADDRS:
+            transport.sendto(msg.packed_message, (ip_addr, UDP_BROADCAST_PORT))
+        if verbose:
+            print("SEND: " + str(msg))
+
+
+def sweep(source_id, msg_types: Dict[MessageType, MessageType], *,
+          payloads: Optional[Dict[MessageType, Dict]] = None,
+          expected: Optional[Dict[MessageType, Iterable[str]]] = None,
+          timeout_secs=SWEEP_TIMEOUT, verbose=False) -> Dict[MessageType, Dict[str, Message]]:
+    """
+    broadcast each request type in `msg_types` ({msg_type: response_type}) once
+    and collect every device's answers in a single window.
+    a response type of `Acknowledgement` broadcasts a set message (with its `payloads` entry) and collects the acks
+
+    return {msg_type: {mac_addr: response}}. the window closes after `timeout_secs`, or as soon as
+    every mac in `expected[msg_type]` has answered every type. following up on whoever
+    is missing is up to the caller
+    """
+    transport = get_transport()
+    payloads = payloads or {}
+    msgs = [_create_msg(msg_type, response_type, source_id, payloads.get(msg_type, {}),
+                        transport.next_seq_num(source_id, BROADCAST_MAC))
+            for msg_type, response_type in msg_types.items()]
+    by_seq_num = {msg.seq_num: msg for msg in msgs}
+    res: Dict[MessageType, Dict[str, Message]] = {type(msg): {} for msg in msgs}
+    remaining: Dict[MessageType, Set[str]] = {msg_type: set(expected.get(msg_type, ())) if expected else None
+                                              for msg_type in msg_types}
+
+    def is_response(r):
+        msg = by_seq_num.get(r.seq_num)
+        return msg is not None and r.source_id == source_id and type(r) == msg_types[type(msg)]
+
+    def done():
+        return expected is not None and not any(remaining.values())
+
+    with transport.subscribe(is_response) as queue:
+        for msg in msgs:
+            for ip_addr in UDP_BROADCAST_IP_ADDRS:
+                transport.sendto(msg.packed_message, (ip_addr, UDP_BROADCAST_PORT))
+            if verbose:
+                print("SEND: " + str(msg))
+
+        end_time = time.monotonic() + timeout_secs
+        while not done():
+            try:
+                response = queue.get(timeout=max(0, end_time - time.monotonic()))
+            except Empty:
+                break
+            if verbose:
+                print("RECV: " + str(response))
+            if response.target_addr == BROADCAST_MAC:
+                continue
+            msg_type = type(by_seq_num[response.seq_num])
+            res[msg_type].setdefault(response.target_addr, response)
+            if remaining[msg_type]:
+                remaining[msg_type].discard(response.target_addr)
+    return res
+
+
+def _create_msg(msg_type, response_type, source_id, payload, seq_num=0):
     if response_type == Acknowledgement:
-        return msg_type(BROADCAST_MAC, source_id, seq_num=0, payload=payload, ack_requested=True,
+        return msg_type(BROADCAST_MAC, source_id, seq_num=seq_num, payload=payload, ack_requested=True,
                         response_requested=False)
 
-    return msg_type(BROADCAST_MAC, source_id, seq_num=0, payload=payload, ack_requested=False,
+    return msg_type(BROADCAST_MAC, source_id, seq_num=seq_num, payload=payload, ack_requested=False,
                     response_requested=True)
 
 
-def _get_response(response_type, source_id, sock, verbose):
-    data, (ip_addr, port) = sock.recvfrom(1024)
-    response = unpack_lifx_message(data)
-    response.ip_addr = ip_addr
-    if verbose:
-        print("RECV: " + str(response))
-    if type(response) == response_type and response.source_id == source_id:
-        return response
-
 # Not currently implemented, although the LIFX LAN protocol supports this kind of workflow natively
 # def _broadcast_with_ack_resp(msg_type, response_type, payload={}, timeout_secs=DEFAULT_TIMEOUT + 0.5,
 #                             max_attempts=DEFAULT_ATTEMPTS):
@@ -0,0 +1,76 @@
+from typing import NamedTuple, Optional
+
+__author__ = 'acushner'
+
+# rfc 6298 smoothing gains
+ALPHA = 1 / 8
+BETA = 1 / 4
+
+INITIAL_RTO = .5  # second, until a device has answered something
+MIN_RTO = .1
+MAX_RTO = 1.
+MIN_HEDGE = .01
+
+
+class RttStats(NamedTuple):
+    """snapshot of a device's round trip estimate, for diagnostics"""
+    srtt: Optional[float]
+    rttvar: Optional[float]
+    rto: float
+    num_samples: int
+    num_timeouts: int
+    consecutive_timeouts: int
+    last_rtt: Optional[float]
+
+
+class RttEstimator:
+    """
+    tcp-style smoothed round trip time and retransmit timeout for one device (rfc 6298)
+
+    fed with every request/response pair, except ones that were retransmitted: with the
+    same seq_num on every attempt there's no telling which one was answered (karn's algorithm)
+    """
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.num_samples = 0
+        self.num_timeouts = 0
+        self.consecutive_timeouts = 0
+        self.last_rtt: Optional[float] = None
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.last_rtt = rtt
+        self.num_samples += 1
+        self.consecutive_timeouts = 0
+
+    def timed_out(self):
+        self.num_timeouts += 1
+        self.consecutive_timeouts += 1
+
+    @property
+    def rto(self) -> float:
+        if self.srtt is None:
+            return INITIAL_RTO
+        return min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+
+    def timeout_secs(self, attempt: int) -> float:
+        """retransmit timeout for the `attempt`th send (1-based), doubling after each timeout"""
+        return min(MAX_RTO, self.rto * 2 ** (attempt - 1))
+
+    @property
+    def hedge_secs(self) -> Optional[float]:
+        """when a latency-sensitive request should be sent again without waiting out the rto"""
+        if self.srtt is None:
+            return None
+        return max(MIN_HEDGE, self.srtt + 2 * self.rttvar)
+
+    @property
+    def stats(self) -> RttStats:
+        return RttStats(self.srtt, self.rttvar, self.rto, self.num_samples, self.num_timeouts,
+                        self.consecutive_timeouts, self.last_rtt)
@@ -0,0 +1,130 @@
+import time
+from collections import deque
+from typing import Optional, Dict, List, Hashable, Deque, Type, Tuple, TYPE_CHECKING
+
+from .encode import Packed, Payload
+from .message import Message
+from .msgtypes import LightSetColor, LightSetPower, SetPower, SetTileState64
+
+if TYPE_CHECKING:
+    from .transport import Addr, PendingRequest
+
+__author__ = 'acushner'
+
+# set messages where only the latest unsent one matters, and the payload fields that say what they set
+_coalesced: Dict[Type[Message], Tuple[Hashable, Tuple[str, ...]]] = {
+    LightSetColor: ('color', ()),
+    LightSetPower: ('power', ()),
+    SetPower: ('power', ()),
+    SetTileState64: ('tile', ('tile_index', 'length', 'x', 'y', 'width')),
+}
+
+
+def coalesce_key(msg_type: Type[Message], payload: Payload) -> Optional[Hashable]:
+    """messages with the same key set the same state, so a newer one supersedes an unsent older one"""
+    if isinstance(payload, Packed):
+        return payload.coalesce_key
+    try:
+        name, fields = _coalesced[msg_type]
+    except KeyError:
+        return None
+    return (name,) + tuple(payload.get(f) for f in fields)
+
+
+class TokenBucket:
+    """allow `rate` sends per second on average, in bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    def _fill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self, now: float) -> bool:
+        self._fill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def force(self, now: float):
+        """spend a token whether or not one is available, e.g. for a retransmit that can't wait"""
+        self._fill(now)
+        self.tokens -= 1
+
+    def wait_secs(self, now: float) -> float:
+        """how long until a token is available"""
+        self._fill(now)
+        return max(0., (1 - self.tokens) / self.rate)
+
+
+class Outgoing:
+    """
+    one queued message: either a fire-and-forget packet sent `repeats` times,
+    or a transport request whose retransmit timer starts once it's actually sent
+    """
+
+    def __init__(self, data: bytes, addrs: List['Addr'], key: Optional[Hashable], repeats: int = 1,
+                 req: Optional['PendingRequest'] = None, verbose=False):
+        self.data = data  # the packed message
+        self.addrs = addrs
+        self.key = key
+        self.repeats = repeats
+        self.req = req
+        self.verbose = verbose
+
+
+class SendQueue:
+    """
+    one device's outbound messages
+
+    sent strictly in order at no more than the device's rate. a new message with the same `coalesce_key`
+    as unsent ones replaces them and goes to the back of the queue, so nothing queued before it can overwrite
+    the state it sets
+    """
+
+    def __init__(self, rate: float):
+        self.bucket = TokenBucket(rate)
+        self.entries: Deque[Outgoing] = deque()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    @rate.setter
+    def rate(self, rate: float):
+        self.bucket.rate = self.bucket.burst = rate
+
+    def push(self, entry: Outgoing) -> List[Outgoing]:
+        """queue `entry`, returning any entries it supersedes"""
+        superseded = self.discard(entry.key) if entry.key is not None else []
+        self.entries.append(entry)
+        return superseded
+
+    def discard(self, key: Hashable) -> List[Outgoing]:
+        """remove and return unsent entries with coalesce key `key`"""
+        res = [e for e in self.entries if e.key == key]
+        if res:
+            self.entries = deque(e for e in self.entries if e.key != key)
+        return res
+
+    def pop_ready(self, now: float) -> List[Outgoing]:
+        """entries to send right now, once per send (an entry with repeats left stays at the front)"""
+        res = []
+        while self.entries and self.bucket.take(now):
+            e = self.entries[0]
+            e.repeats -= 1
+            res.append(e)
+            if e.repeats <= 0:
+                self.entries.popleft()
+        return res
+
+    def wait_secs(self, now: float) -> Optional[float]:
+        """how long until the next queued entry can go, or None if nothing's queued"""
+        if not self.entries:
+            return None
+        return self.bucket.wait_secs(now)
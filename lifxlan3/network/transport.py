@@ -0,0 +1,533 @@
+import atexit
+import heapq
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from itertools import count
+from queue import Queue
+from select import select
+from socket import AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, SO_RCVBUF, SO_REUSEADDR, socket
+from threading import Lock, Thread, Event
+from typing import Callable, Optional, List, Tuple, Dict, Iterable, Type, Container, Set, Hashable
+
+from .encode import Packed, Payload, encode_cached
+from .health import CircuitBreaker, Health, Outcome
+from .message import Message, HEADER_SIZE_BYTES
+from .msgtypes import EchoRequest, EchoResponse
+from .rtt import RttEstimator, RttStats
+from .sendqueue import Outgoing, SendQueue, coalesce_key
+from .unpack import unpack_lifx_message
+from lifxlan3.utils import init_log
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+Addr = Tuple[str, int]
+Predicate = Callable[[Message], bool]
+RequestKey = Tuple[int, str, int]  # source_id, target mac, seq_num
+
+RECV_BUFSIZE = 4096
+SOCKET_RCVBUF = 1 << 20  # room for every device answering a broadcast at once
+MAX_WAIT_SECS = 1.0
+
+
+class NoResponse(Exception):
+    """raised when no response is recv'd"""
+
+
+class CircuitOpen(NoResponse):
+    """raised without sending anything when a device has stopped responding"""
+
+
+def outcome(fut: Future) -> Outcome:
+    """what happened to a request, for reporting per-device results of group operations"""
+    try:
+        fut.result()
+    except CircuitOpen:
+        return Outcome.skipped
+    except NoResponse:
+        return Outcome.failed
+    return Outcome.ok
+
+
+class SeqNums:
+    """rolling 8-bit sequence numbers per (source_id, device), skipping any still awaiting a response"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[int, str], Iterable[int]] = {}
+
+    def next(self, source_id: int, mac_addr: str, in_flight: Container[RequestKey]) -> int:
+        counter = self._counters.get((source_id, mac_addr))
+        if counter is None:
+            counter = self._counters[source_id, mac_addr] = count()
+        for _ in range(256):
+            seq_num = next(counter) & 0xff
+            if (source_id, mac_addr, seq_num) not in in_flight:
+                return seq_num
+        raise RuntimeError(f'all 256 sequence numbers for {mac_addr!r} are awaiting responses')
+
+
+def _encode(msg_type: Type[Message], mac_addr: str, source_id: int, seq_num: int, payload: Payload,
+            ack_requested=False, response_requested=False) -> bytes:
+    if isinstance(payload, Packed):
+        return payload.finish(seq_num, ack_requested, response_requested)
+    return encode_cached(msg_type, mac_addr, source_id, seq_num, payload, ack_requested, response_requested)
+
+
+class Subscription:
+    """receive every message that satisfies `predicate` until unsubscribed"""
+
+    def __init__(self, predicate: Predicate, queue: Optional[Queue] = None):
+        self.predicate = predicate
+        self.queue: 'Queue[Message]' = Queue() if queue is None else queue
+
+
+class PendingRequest:
+    """a request waiting on its response; resolved or retransmitted by the receiver thread"""
+
+    def __init__(self, key: RequestKey, msg_type: Type[Message], data: bytes, addrs: List[Addr],
+                 response_types: Tuple[Type[Message], ...], timeout_secs: Optional[float], max_attempts: int,
+                 name: str, verbose: bool, rtt: RttEstimator, hedge: bool = False):
+        self.key = key
+        self.msg_type = msg_type
+        self.data = data  # the packed message
+        self.addrs = addrs
+        self.response_types = response_types
+        self.timeout_secs = timeout_secs  # None: adaptive, from `rtt`
+        self.max_attempts = max_attempts
+        self.name = name
+        self.verbose = verbose
+        self.rtt = rtt
+        self.hedge = hedge
+        self.attempts = 0
+        self.num_sends = 0  # including hedges
+        self.first_sent = 0.0
+        self.deadline = 0.0
+        self.future: 'Future[Message]' = Future()
+        self.future.set_running_or_notify_cancel()  # so it can't be cancelled out from under the receiver thread
+
+    @property
+    def attempt_timeout_secs(self) -> float:
+        if self.timeout_secs is None:
+            return self.rtt.timeout_secs(self.attempts)
+        return self.timeout_secs
+
+    def no_response(self) -> NoResponse:
+        return NoResponse(f'WorkflowException: Did not receive {list(self.response_types)!r} from {self.key[1]!r} '
+                          f'(Name: {self.name!r}) in response to {self.msg_type!r}')
+
+
+class Transport:
+    """
+    one long-lived UDP socket shared by every device for sending and receiving
+
+    requests without a fixed `timeout_secs` retransmit on each device's adaptive rto (see `network.rtt`).
+    requests to a device whose circuit is open (see `network.health`) fail fast with `CircuitOpen`
+
+    a single background thread reads from the socket and:
+        - resolves pending requests, which are keyed by (source_id, target mac, seq_num)
+        - retransmits/fails pending requests whose timeouts have expired
+        - drains per-device send queues as their rate limits allow
+        - hands everything else to the subscriptions interested in it (e.g. broadcast discovery)
+
+    so callers never read from the socket themselves, and any number of requests
+    can be in flight at once without a thread per request
+    """
+
+    def __init__(self, bind_addr: Addr = ('', 0)):
+        self._sock = socket(AF_INET, SOCK_DGRAM)
+        self._sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._sock.setsockopt(SOL_SOCKET, SO_BROADCAST, 1)
+        self._sock.setsockopt(SOL_SOCKET, SO_RCVBUF, SOCKET_RCVBUF)
+        try:
+            self._sock.bind(bind_addr)
+        except Exception as err:
+            self._sock.close()
+            raise ConnectionError(f'WorkflowException: error {str(err)} while trying to open socket')
+
+        self._subscriptions: List[Subscription] = []
+        self._pending: Dict[RequestKey, PendingRequest] = {}
+        self._deadlines: List[Tuple[float, int, PendingRequest]] = []
+        self._tiebreak = count()
+        self._seq_nums = SeqNums()
+        self._queues: Dict[str, SendQueue] = {}
+        self._rtts: Dict[str, RttEstimator] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._backlogged: Set[str] = set()
+        self._lock = Lock()
+        self._wakeup_at = 0.0
+        self._closed = Event()
+        self._receiver = Thread(target=self._recv_loop, name='lifx-transport', daemon=True)
+        self._receiver.start()
+
+    @property
+    def port(self) -> int:
+        return self._sock.getsockname()[1]
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    @property
+    def num_pending(self) -> int:
+        return len(self._pending)
+
+    # ==================================================================================================================
+    # SENDING
+    # ==================================================================================================================
+
+    def next_seq_num(self, source_id: int, mac_addr: str) -> int:
+        """rolling 8-bit sequence number per (source_id, device), skipping any still awaiting a response"""
+        with self._lock:
+            return self._seq_nums.next(source_id, mac_addr, self._pending)
+
+    def sendto(self, data: bytes, addr: Addr):
+        self._sock.sendto(data, addr)
+
+    def send(self, msg_type: Type[Message], mac_addr: str, source_id: int, payload: Payload, addrs: List[Addr], *,
+             num_repeats=1, rate: Optional[float] = None, verbose=False):
+        """
+        fire and forget a message `num_repeats` times
+
+        with a `rate`, it goes through the device's send queue instead of straight out.
+        `payload` is a dict of `msg_type`'s fields, or the whole message already `Packed`
+        """
+        with self._lock:
+            seq_num = self._seq_nums.next(source_id, mac_addr, self._pending)
+        entry = Outgoing(_encode(msg_type, mac_addr, source_id, seq_num, payload), addrs,
+                         coalesce_key(msg_type, payload), num_repeats, verbose=verbose)
+        if rate is not None:
+            return self._enqueue(mac_addr, rate, entry)
+        for _ in range(num_repeats):
+            self._transmit(entry)
+
+    def request(self, msg_type: Type[Message], mac_addr: str, source_id: int, payload: Payload, addrs: List[Addr],
+                response_types: Iterable[Type[Message]], *, ack_requested: bool, timeout_secs: Optional[float],
+                max_attempts: int, name: str = '', verbose=False, rate: Optional[float] = None,
+                hedge=False) -> 'Future[Message]':
+        """
+        send a message and return a future for its response
+
+        the message is retransmitted every `timeout_secs` (or, if None, on the device's adaptive rto with
+        exponential backoff) up to `max_attempts` times in total, after which the future fails with `NoResponse`.
+        `hedge`: for latency-sensitive calls, send a duplicate once the response is later than usual
+        instead of waiting out the whole rto.
+        with a `rate`, it goes through the device's send queue and its timer starts once it's sent
+        """
+        with self._lock:
+            breaker = self._breaker(mac_addr)
+            is_open = breaker.state is Health.open
+            probe = is_open and breaker.probe_due(time.monotonic())
+        if not is_open:
+            return self._request(msg_type, mac_addr, source_id, payload, addrs, response_types, ack_requested,
+                                 timeout_secs, max_attempts, name, verbose, rate, hedge)
+
+        if ack_requested:
+            # a set might still land, so send it once without waiting on it
+            self.send(msg_type, mac_addr, source_id, payload, addrs, rate=rate, verbose=verbose)
+        if probe:
+            self._request(EchoRequest, mac_addr, source_id, dict(byte_array=bytes(64)), addrs, [EchoResponse],
+                          False, None, 1, name, verbose, rate, False)
+        res = Future()
+        res.set_exception(CircuitOpen(f'WorkflowException: {mac_addr!r} (Name: {name!r}) is not responding; '
+                                      f'not waiting on {msg_type!r}'))
+        return res
+
+    def _request(self, msg_type, mac_addr, source_id, payload, addrs, response_types, ack_requested, timeout_secs,
+                 max_attempts, name, verbose, rate, hedge) -> 'Future[Message]':
+        with self._lock:
+            seq_num = self._seq_nums.next(source_id, mac_addr, self._pending)
+            data = _encode(msg_type, mac_addr, source_id, seq_num, payload, ack_requested, not ack_requested)
+            req = PendingRequest((source_id, mac_addr, seq_num), msg_type, data, addrs, tuple(response_types),
+                                 timeout_secs, max_attempts, name, verbose, self._rtt(mac_addr), hedge)
+            self._pending[req.key] = req
+            if rate is None:
+                deadline = self._send_attempt(req)
+                wakeup = deadline < self._wakeup_at
+        if rate is not None:
+            self._enqueue(mac_addr, rate, Outgoing(data, addrs, coalesce_key(msg_type, payload), req=req))
+        elif wakeup:
+            self._wakeup()
+        return req.future
+
+    def _enqueue(self, mac_addr: str, rate: float, entry: Outgoing):
+        """queue `entry` behind the device's earlier messages and send whatever its rate limit allows now"""
+        with self._lock:
+            q = self._queues.get(mac_addr)
+            if q is None:
+                q = self._queues[mac_addr] = SendQueue(rate)
+            elif q.rate != rate:
+                q.rate = rate
+            superseded = q.push(entry)
+            for e in superseded:
+                if e.req is not None:
+                    del self._pending[e.req.key]
+            now = time.monotonic()
+            due = [self._transmit(e) for e in q.pop_ready(now)]
+            wait_secs = q.wait_secs(now)
+            if wait_secs is not None:
+                due.append(now + wait_secs)
+            wakeup = min(filter(None, due), default=self._wakeup_at) < self._wakeup_at
+            if wait_secs is not None:
+                self._backlogged.add(mac_addr)
+
+        for e in superseded:
+            self._supersede(e, entry)
+        if wakeup:
+            self._wakeup()
+
+    def discard_queued(self, mac_addrs: Iterable[str], key: Hashable) -> bool:
+        """
+        drop unsent messages with coalesce `key` from the devices' send queues, e.g. because a broadcast
+        sets the same state. return whether nothing else is left queued for any of them
+        """
+        superseded = []
+        with self._lock:
+            empty = True
+            for mac_addr in mac_addrs:
+                q = self._queues.get(mac_addr)
+                if q is None:
+                    continue
+                for e in q.discard(key):
+                    if e.req is not None:
+                        del self._pending[e.req.key]
+                    superseded.append(e)
+                if q.entries:
+                    empty = False
+                else:
+                    self._backlogged.discard(mac_addr)
+
+        for e in superseded:
+            if e.req is not None:
+                e.req.future.set_result(None)
+        return empty
+
+    @staticmethod
+    def _supersede(old: Outgoing, new: Outgoing):
+        """a superseded request resolves along with the one that replaced it"""
+        if old.req is None:
+            return
+        if new.req is None:
+            old.req.future.set_result(None)
+            return
+
+        def _copy(fut: 'Future[Message]'):
+            if fut.exception() is not None:
+                old.req.future.set_exception(fut.exception())
+            else:
+                old.req.future.set_result(fut.result())
+
+        new.req.future.add_done_callback(_copy)
+
+    def _transmit(self, entry: Outgoing) -> Optional[float]:
+        """send a dequeued entry, returning when the receiver next needs to look at it, if ever"""
+        if entry.req is not None:
+            return self._send_attempt(entry.req)
+        for addr in entry.addrs:
+            self._sock.sendto(entry.data, addr)
+        if entry.verbose:
+            log.info("SEND: " + str(unpack_lifx_message(entry.data)))
+
+    def _send_attempt(self, req: PendingRequest) -> float:
+        """send `req` and schedule its deadline (and hedge, if wanted). must hold `self._lock`"""
+        now = time.monotonic()
+        req.attempts += 1
+        if req.attempts == 1:
+            req.first_sent = now
+        req.deadline = now + req.attempt_timeout_secs
+        heapq.heappush(self._deadlines, (req.deadline, next(self._tiebreak), req))
+        first = req.deadline
+        if req.hedge and req.attempts == 1 and req.rtt.hedge_secs is not None:
+            hedge_at = now + req.rtt.hedge_secs
+            if hedge_at < req.deadline:
+                heapq.heappush(self._deadlines, (hedge_at, next(self._tiebreak), req))
+                first = hedge_at
+        self._send(req)
+        return first
+
+    def _send(self, req: PendingRequest):
+        req.num_sends += 1
+        for addr in req.addrs:
+            self._sock.sendto(req.data, addr)
+        if req.verbose:
+            log.info("SEND: " + str(unpack_lifx_message(req.data)))
+
+    def _rtt(self, mac_addr: str) -> RttEstimator:
+        """must hold `self._lock`"""
+        res = self._rtts.get(mac_addr)
+        if res is None:
+            res = self._rtts[mac_addr] = RttEstimator()
+        return res
+
+    def _breaker(self, mac_addr: str) -> CircuitBreaker:
+        """must hold `self._lock`"""
+        res = self._breakers.get(mac_addr)
+        if res is None:
+            res = self._breakers[mac_addr] = CircuitBreaker()
+        return res
+
+    def health(self, mac_addr: str) -> Health:
+        with self._lock:
+            return self._breaker(mac_addr).state
+
+    def rtt_stats(self, mac_addr: str) -> RttStats:
+        """current round trip estimate for a device"""
+        with self._lock:
+            return self._rtt(mac_addr).stats
+
+    @contextmanager
+    def subscribe(self, predicate: Predicate, queue: Optional[Queue] = None) -> 'Queue[Message]':
+        """
+        yield a queue that receives every matching message while inside the `with` block
+
+        `queue`: anything with a thread-safe `put` to use instead of a new `Queue`,
+        e.g. one that hands messages to an event loop
+        """
+        sub = Subscription(predicate, queue)
+        with self._lock:
+            self._subscriptions.append(sub)
+        try:
+            yield sub.queue
+        finally:
+            with self._lock:
+                self._subscriptions.remove(sub)
+
+    # ==================================================================================================================
+    # RECEIVING
+    # ==================================================================================================================
+
+    def _recv_loop(self):
+        while not self._closed.is_set():
+            try:
+                readable, _, _ = select([self._sock], [], [], self._wait_secs())
+                if readable:
+                    data, (ip_addr, port) = self._sock.recvfrom(RECV_BUFSIZE)
+                    if len(data) >= HEADER_SIZE_BYTES:
+                        self._dispatch(data, ip_addr)
+            except OSError as e:
+                if self._closed.is_set():
+                    break
+                log.debug(f'error receiving: {e!r}')
+            self._expire()
+
+    def _wait_secs(self) -> float:
+        """how long the receiver can block before the next retransmit is due"""
+        with self._lock:
+            now = time.monotonic()
+            wait_secs = MAX_WAIT_SECS
+            if self._deadlines:
+                wait_secs = min(wait_secs, max(.001, self._deadlines[0][0] - now))
+            for mac_addr in self._backlogged:
+                wait_secs = min(wait_secs, max(.001, self._queues[mac_addr].wait_secs(now)))
+            self._wakeup_at = now + wait_secs
+            return wait_secs
+
+    def _wakeup(self):
+        try:
+            self._sock.sendto(b'', ('127.0.0.1', self.port))
+        except OSError:
+            pass
+
+    def _dispatch(self, data: bytes, ip_addr: str):
+        try:
+            msg = unpack_lifx_message(data)
+        except Exception as e:
+            log.debug(f'dropping malformed packet from {ip_addr}: {e!r}')
+            return
+        msg.ip_addr = ip_addr
+
+        with self._lock:
+            breaker = self._breakers.get(msg.target_addr)
+            if breaker is not None:
+                breaker.succeeded()  # anything at all from a device means it's reachable
+            req = self._pending.get((msg.source_id, msg.target_addr, msg.seq_num))
+            if req is not None and isinstance(msg, req.response_types):
+                del self._pending[req.key]
+                if req.num_sends == 1:
+                    req.rtt.sample(time.monotonic() - req.first_sent)
+            else:
+                req = None
+                subs = list(self._subscriptions)
+
+        if req is not None:
+            if req.verbose:
+                log.info("RECV: " + str(msg))
+            req.future.set_result(msg)
+            return
+
+        for sub in subs:
+            if sub.predicate(msg):
+                sub.queue.put(msg)
+
+    def _expire(self):
+        """send whatever queued messages are due, and retransmit or fail requests whose deadlines have passed"""
+        failed = []
+        with self._lock:
+            now = time.monotonic()
+            self._drain(now)
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, _, req = heapq.heappop(self._deadlines)
+                if self._pending.get(req.key) is not req:
+                    continue  # already answered
+                if deadline < req.deadline:
+                    self._send(req)  # hedge: same message again, without giving up on the first
+                    continue
+                req.rtt.timed_out()
+                if req.attempts < req.max_attempts:
+                    q = self._queues.get(req.key[1])
+                    if q is not None:
+                        q.bucket.force(now)
+                    self._send_attempt(req)
+                else:
+                    del self._pending[req.key]
+                    self._breaker(req.key[1]).failed(now)
+                    failed.append(req)
+        for req in failed:
+            req.future.set_exception(req.no_response())
+
+    def _drain(self, now: float):
+        """send from every backlogged device queue as far as its rate allows. must hold `self._lock`"""
+        for mac_addr in list(self._backlogged):
+            q = self._queues[mac_addr]
+            for e in q.pop_ready(now):
+                self._transmit(e)
+            if not q.entries:
+                self._backlogged.discard(mac_addr)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wakeup()
+        self._receiver.join(2)
+        self._sock.close()
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+            self._deadlines.clear()
+            self._queues.clear()
+            self._backlogged.clear()
+        for req in pending:
+            req.future.set_exception(ConnectionError('transport closed'))
+
+
+_transport: Optional[Transport] = None
+_transport_lock = Lock()
+
+
+def get_transport() -> Transport:
+    """module-level transport shared by all devices; (re)created lazily"""
+    global _transport
+    with _transport_lock:
+        if _transport is None or _transport.closed:
+            _transport = Transport()
+        return _transport
+
+
+@atexit.register
+def close_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+            _transport = None
@@ -14,12 +14,18 @@ from typing import Optional, Dict, Union, Tuple
 from PIL import Image
 
 from lifxlan3 import TileChain, LifxLAN, Color, Colors, cycle, init_log, timer, Dir
-from lifxlan3.routines.tile.tile_utils import ColorMatrix, default_shape, tile_map, RC, default_color
+from lifxlan3.devices.framebuffer import Framebuffer, Placement
+from lifxlan3.routines.tile.tile_utils import ColorMatrix, default_shape, tile_map, RC, default_color, \
+    origin_rotations
 
 __author__ = 'acushner'
 
 log = init_log(__name__)
 
+mini_map = RC(2, -1)  # the tile in `tile_map` that shows the whole image shrunk down
+mini_map_offset = RC(16, 0)  # where that tile sits on the framebuffer, below the others
+tile_bg = Color(1, 1, 100, 9000)
+
 
 @lru_cache()
 def get_tile_chain() -> Optional[TileChain]:
@@ -28,6 +34,16 @@ def get_tile_chain() -> Optional[TileChain]:
         return lifx.tilechain_lights[0]
 
 
+@lru_cache()
+def get_framebuffer() -> Framebuffer:
+    """tiles on a 24x16 canvas where `tile_map` puts them, oriented by their origins, with the mini map below"""
+    placements = []
+    for rc, ti in tile_map.items():
+        r, c = mini_map_offset if rc == mini_map else (8 * rc.r, 8 * rc.c)
+        placements.append(Placement(ti.idx, r, c, origin_rotations[ti.origin]))
+    return get_tile_chain().framebuffer((24, 16), placements)
+
+
 def _cm_test(c: Color) -> ColorMatrix:
     cm = ColorMatrix.from_shape(default_shape)
     cm[0, 0] = cm[0, 1] = cm[1, 0] = cm[1, 1] = c
@@ -160,20 +176,20 @@ def set_cm(cm: ColorMatrix, offset=RC(0, 0), size=RC(16, 16),
         return
 
     cm.set_max_brightness_pct(60)
-    tiles = cm.to_tiles()
+    mini = cm.resize((8, 8)) if with_mini else None
+    cm.replace({default_color: tile_bg})
 
-    idx_colors_map = {}
-    for t_idx, t_cm in tiles.items():
-        t_info = tile_map[t_idx]
-        t_cm.replace({default_color: Color(1, 1, 100, 9000)})
-        idx_colors_map[t_info.idx] = t_cm.flattened
+    fb = get_framebuffer()
+    fb.fill(tile_bg)
+    fb.draw(cm)
+    num_rows, num_cols = cm.shape
+    tile_idxs = [tile_map[rc].idx for rc in RC(0, 0).to(RC(ceil(num_rows / 8), ceil(num_cols / 8)))]
 
     if with_mini:
-        ti = tile_map[RC(2, -1)]
-        idx_colors_map[ti.idx] = cm.resize((8, 8)).rotate_from_origin(ti.origin).flattened
+        fb.draw(mini, mini_map_offset)
+        tile_idxs.append(tile_map[mini_map].idx)
 
-    tc = get_tile_chain()
-    tc.set_tilechain_colors(idx_colors_map, duration=duration_msec)
+    fb.flush(duration_msec, tile_idxs=tile_idxs)
 
 
 def _cmp_colors(idx_colors_map):
@@ -78,6 +78,12 @@ tile_map: Dict[RC, TileInfo] = {RC(1, 1): TileInfo(2, RC(0, 0)),
                                 RC(2, -1): TileInfo(0, RC(1, 1)),
                                 RC(0, 0): TileInfo(4, RC(1, 0))}
 
+# clockwise quarter turns that orient a tile whose origin is in this corner
+origin_rotations: Dict[RC, int] = {RC(0, 0): 0,
+                                   RC(0, 1): 3,
+                                   RC(1, 1): 2,
+                                   RC(1, 0): 1}
+
 
 class DupesValids(NamedTuple):
     """
@@ -201,7 +207,7 @@ class ColorMatrix(List[List[Color]]):
 
     def set_max_brightness_pct(self, brightness_pct):
         """set brightness in all colors to at most `brightness_pct` pct"""
-        brightness = 65535 * min(100.0, max(0.0, brightness_pct)) // 100
+        brightness = int(65535 * min(100.0, max(0.0, brightness_pct)) // 100)
         for rc, c in self.by_coords:
             self[rc] = c._replace(brightness=min(c.brightness, brightness))
 
@@ -310,11 +316,7 @@ class ColorMatrix(List[List[Color]]):
                 for tile_idx, cm in res.items()}
 
     def rotate_from_origin(self, origin: RC) -> 'ColorMatrix':
-        n_r = {RC(0, 0): 0,
-               RC(0, 1): 3,
-               RC(1, 1): 2,
-               RC(1, 0): 1}
-        return self.rotate_clockwise(n_r[origin])
+        return self.rotate_clockwise(origin_rotations[origin])
 
     def rotate_clockwise(self, n=1) -> 'ColorMatrix':
         m = self.copy()
@@ -3,8 +3,14 @@ from enum import Enum
 
 UNKNOWN = 'UNKNOWN'
 TOTAL_NUM_LIGHTS = int(os.environ.get('LIFX_NUM_LIGHTS', 22))
+INVENTORY_PATH = os.environ.get('LIFX_INVENTORY_PATH') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'lifxlan3', 'inventory.json')
 DEFAULT_KELVIN = 3200
 
+# override where discovery broadcasts go, e.g. `LIFX_BROADCAST_ADDRS=127.0.0.1` for a local simulator
+BROADCAST_ADDRS = os.environ.get('LIFX_BROADCAST_ADDRS')  # comma-separated
+BROADCAST_PORT = int(os.environ.get('LIFX_BROADCAST_PORT', 56700))
+
 
 class Waveform(Enum):
     saw = 0
@@ -0,0 +1,3 @@
+from .devices import VirtualDevice, VirtualLight, VirtualMultizone, VirtualTileChain, VirtualTile
+from .simulator import Simulator, fleet
+from .faults import Faults, PERFECT, WIFI
@@ -0,0 +1,342 @@
+import time
+from hashlib import md5
+from typing import Callable, Dict, List, Optional, Tuple, Type, Iterable
+
+from .faults import Faults
+from lifxlan3.network.message import Message
+from lifxlan3.network.msgtypes import *
+
+__author__ = 'acushner'
+
+Reply = Tuple[Type[Message], Dict]
+HSBK = Tuple[int, int, int, int]
+
+VENDOR = 1
+HOST_FIRMWARE = 3 << 16 | 70  # 3.70
+WIFI_FIRMWARE = 1 << 16 | 0
+FIRMWARE_BUILD = 1_548_000_000_000_000_000  # ns
+SIGNAL = 1e-5  # mW, a decent connection
+DEFAULT_COLOR: HSBK = 0, 0, 65535, 3500
+ZONES_PER_MESSAGE = 8
+COLORS_PER_TILE = 64
+OFF: HSBK = 0, 0, 0, 0
+
+
+def handles(*msg_types: Type[Message], is_set=False):
+    """
+    register a `VirtualDevice` method as the handler for `msg_types`
+
+    the method returns the replies a real device would send. for `is_set` messages,
+    a real device only sends them when asked to with `response_requested`
+    """
+
+    def decorator(func):
+        func._handles = msg_types, is_set
+        return func
+
+    return decorator
+
+
+def _id_bytes(label: str) -> bytes:
+    """stable 16-byte location/group id for a label, so devices sharing a label share an id"""
+    return md5(label.encode()).digest()
+
+
+class VirtualDevice:
+    """
+    state and protocol behavior of one emulated device
+
+    answers every Get with the matching State and applies every Set to its state, the same way real
+    hardware does. networking (sockets, acks, which device a packet is for) is up to the `Simulator`
+    """
+    product = 27
+    _handlers: Dict[Type[Message], Tuple[Callable, bool]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._collect_handlers()
+
+    @classmethod
+    def _collect_handlers(cls):
+        cls._handlers = {}
+        for klass in reversed(cls.__mro__):
+            for func in vars(klass).values():
+                for msg_type in getattr(func, '_handles', ((), False))[0]:
+                    cls._handlers[msg_type] = func, func._handles[1]
+
+    def __init__(self, mac_addr: str, label: str = '', *, group='Simulated', location='Home', power_level=0,
+                 product: Optional[int] = None, faults: Optional[Faults] = None):
+        self.mac_addr = mac_addr
+        self.label = label or f'sim {mac_addr[-5:]}'
+        self.group = group
+        self.location = location
+        self.power_level = power_level
+        if product is not None:
+            self.product = product
+        self.faults = faults  # None: whatever the simulator's are
+        self.port = 0  # assigned when the simulator binds this device's socket
+        self.rx_bytes = self.tx_bytes = 0
+        self.started_at = time.time_ns()
+        self.updated_at = self.started_at
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.mac_addr!r}, {self.label!r})'
+
+    def handle(self, msg: Message) -> List[Reply]:
+        """apply `msg` and return the replies to send, not counting any ack"""
+        try:
+            func, is_set = self._handlers[type(msg)]
+        except KeyError:
+            return []
+        replies = func(self, msg)
+        if is_set and not msg.response_requested:
+            return []
+        return replies
+
+    # ==================================================================================================================
+    # DEVICE MESSAGES
+    # ==================================================================================================================
+
+    @handles(GetService)
+    def _service(self, _) -> List[Reply]:
+        return [(StateService, dict(service=1, port=self.port))]
+
+    @handles(GetHostInfo)
+    def _host_info(self, _) -> List[Reply]:
+        return [(StateHostInfo, dict(signal=SIGNAL, tx=self.tx_bytes, rx=self.rx_bytes, reserved1=0))]
+
+    @handles(GetHostFirmware)
+    def _host_firmware(self, _) -> List[Reply]:
+        return [(StateHostFirmware, dict(build=FIRMWARE_BUILD, reserved1=0, version=HOST_FIRMWARE))]
+
+    @handles(GetWifiInfo)
+    def _wifi_info(self, _) -> List[Reply]:
+        return [(StateWifiInfo, dict(signal=SIGNAL, tx=self.tx_bytes, rx=self.rx_bytes, reserved1=0))]
+
+    @handles(GetWifiFirmware)
+    def _wifi_firmware(self, _) -> List[Reply]:
+        return [(StateWifiFirmware, dict(build=FIRMWARE_BUILD, reserved1=0, version=WIFI_FIRMWARE))]
+
+    @handles(GetPower)
+    def _power(self, _) -> List[Reply]:
+        return [(StatePower, dict(power_level=self.power_level))]
+
+    @handles(SetPower, is_set=True)
+    def _set_power(self, msg) -> List[Reply]:
+        self.power_level = msg.power_level
+        return self._power(msg)
+
+    @handles(GetLabel)
+    def _label(self, _) -> List[Reply]:
+        return [(StateLabel, dict(label=self.label))]
+
+    @handles(SetLabel, is_set=True)
+    def _set_label(self, msg) -> List[Reply]:
+        self.label = msg.label
+        return self._label(msg)
+
+    @handles(GetVersion)
+    def _version(self, _) -> List[Reply]:
+        return [(StateVersion, dict(vendor=VENDOR, product=self.product, version=0))]
+
+    @handles(GetInfo)
+    def _info(self, _) -> List[Reply]:
+        now = time.time_ns()
+        return [(StateInfo, dict(time=now, uptime=now - self.started_at, downtime=0))]
+
+    @handles(GetLocation)
+    def _location(self, _) -> List[Reply]:
+        return [(StateLocation, dict(location=_id_bytes(self.location), label=self.location,
+                                     updated_at=self.updated_at))]
+
+    @handles(GetGroup)
+    def _group(self, _) -> List[Reply]:
+        return [(StateGroup, dict(group=_id_bytes(self.group), label=self.group, updated_at=self.updated_at))]
+
+    @handles(EchoRequest)
+    def _echo(self, msg) -> List[Reply]:
+        return [(EchoResponse, dict(byte_array=msg.byte_array))]
+
+
+VirtualDevice._collect_handlers()
+
+
+class VirtualLight(VirtualDevice):
+    """a color bulb"""
+    product = 27  # LIFX A19
+
+    def __init__(self, mac_addr: str, label: str = '', *, color: HSBK = DEFAULT_COLOR, infrared_brightness=0,
+                 **kwargs):
+        super().__init__(mac_addr, label, **kwargs)
+        self.color = tuple(color)
+        self.infrared_brightness = infrared_brightness
+
+    def _set_color(self, color: HSBK):
+        self.color = tuple(color)
+
+    # ==================================================================================================================
+    # LIGHT MESSAGES
+    # ==================================================================================================================
+
+    @handles(LightGet)
+    def _state(self, _) -> List[Reply]:
+        return [(LightState, dict(color=self.color, reserved1=0, power_level=self.power_level, label=self.label,
+                                  reserved2=0))]
+
+    @handles(LightSetColor, is_set=True)
+    def _light_set_color(self, msg) -> List[Reply]:
+        self._set_color(msg.color)
+        return self._state(msg)
+
+    @handles(LightSetWaveform, is_set=True)
+    def _set_waveform(self, msg) -> List[Reply]:
+        """the waveform itself isn't emulated: a non-transient one just ends on its color"""
+        if not msg.transient:
+            self._set_color(msg.color)
+        return self._state(msg)
+
+    @handles(LightGetPower)
+    def _light_power(self, _) -> List[Reply]:
+        return [(LightStatePower, dict(power_level=self.power_level))]
+
+    @handles(LightSetPower, is_set=True)
+    def _light_set_power(self, msg) -> List[Reply]:
+        self.power_level = msg.power_level
+        return self._light_power(msg)
+
+    @handles(LightGetInfrared)
+    def _infrared(self, _) -> List[Reply]:
+        return [(LightStateInfrared, dict(infrared_brightness=self.infrared_brightness))]
+
+    @handles(LightSetInfrared, is_set=True)
+    def _set_infrared(self, msg) -> List[Reply]:
+        self.infrared_brightness = msg.infrared_brightness
+        return self._infrared(msg)
+
+
+class VirtualMultizone(VirtualLight):
+    """a LIFX Z strip, `num_zones` long"""
+    product = 32  # LIFX Z 2
+
+    def __init__(self, mac_addr: str, label: str = '', *, num_zones=16, **kwargs):
+        super().__init__(mac_addr, label, **kwargs)
+        self.zones: List[HSBK] = [self.color] * num_zones
+        self._pending: Dict[int, HSBK] = {}  # zone colors sent with `apply=0`, waiting for an apply
+
+    def _set_color(self, color: HSBK):
+        super()._set_color(color)
+        self.zones = [self.color] * len(self.zones)
+        self._pending.clear()
+
+    def _zone_range(self, start_index, end_index) -> range:
+        return range(start_index, min(end_index, len(self.zones) - 1) + 1)
+
+    @handles(MultizoneGetColorZones)
+    def _color_zones(self, msg) -> List[Reply]:
+        """a single zone as a `StateZone`, otherwise every 8-zone chunk touching the range as `StateMultizone`"""
+        count = len(self.zones)
+        zones = self._zone_range(msg.start_index, msg.end_index)
+        if len(zones) == 1:
+            return [(MultizoneStateZone, dict(count=count, index=zones[0], color=self.zones[zones[0]]))]
+
+        res = []
+        for index in range(zones.start - zones.start % ZONES_PER_MESSAGE, zones.stop, ZONES_PER_MESSAGE):
+            colors = self.zones[index:index + ZONES_PER_MESSAGE]
+            colors += [OFF] * (ZONES_PER_MESSAGE - len(colors))
+            res.append((MultizoneStateMultizone, dict(count=count, index=index, color=colors)))
+        return res
+
+    @handles(MultizoneSetColorZones, is_set=True)
+    def _set_color_zones(self, msg) -> List[Reply]:
+        """`apply` 0 queues the change, 1 applies it along with anything queued, 2 only applies what's queued"""
+        if msg.apply != 2:
+            self._pending.update(dict.fromkeys(self._zone_range(msg.start_index, msg.end_index), tuple(msg.color)))
+        if msg.apply:
+            for i, c in self._pending.items():
+                self.zones[i] = c
+            self._pending.clear()
+            self.color = self.zones[0]
+        return self._color_zones(msg)
+
+
+class VirtualTile:
+    """one 8x8 tile in a chain"""
+
+    def __init__(self, user_x: float, user_y: float, width=8, height=8, color: HSBK = DEFAULT_COLOR):
+        self.user_x = user_x
+        self.user_y = user_y
+        self.width = width
+        self.height = height
+        self.colors: List[HSBK] = [tuple(color)] * (width * height)
+
+    def as_payload(self, product: int) -> Dict:
+        """this tile's entry in a `StateDeviceChain`"""
+        return dict(reserved1=0, reserved2=0, reserved3=0, reserved4=0, user_x=self.user_x, user_y=self.user_y,
+                    width=self.width, height=self.height, reserved5=0, device_version_vendor=VENDOR,
+                    device_version_product=product, device_version_version=0, firmware_build=FIRMWARE_BUILD,
+                    reserved6=0, firmware_version=HOST_FIRMWARE, reserved7=0)
+
+    def _rect(self, x, y, width) -> Iterable[Tuple[int, int]]:
+        """(color index in a 64-color message, index into this tile) for a rectangle `width` wide at (x, y)"""
+        for i in range(COLORS_PER_TILE):
+            col, row = x + i % width, y + i // width
+            if col < self.width and row < self.height:
+                yield i, row * self.width + col
+
+    def get(self, x, y, width) -> List[HSBK]:
+        res = [OFF] * COLORS_PER_TILE
+        for i, idx in self._rect(x, y, width):
+            res[i] = self.colors[idx]
+        return res
+
+    def set(self, x, y, width, colors: List[HSBK]):
+        for i, idx in self._rect(x, y, width):
+            if i < len(colors):
+                self.colors[idx] = tuple(colors[i])
+
+
+class VirtualTileChain(VirtualLight):
+    """
+    a LIFX Tile chain, laid out in a row by default
+
+    `tile_positions` gives each tile's (user_x, user_y) in tile widths, as reported by `StateDeviceChain`
+    """
+    product = 55  # LIFX Tile
+
+    def __init__(self, mac_addr: str, label: str = '', *, num_tiles=5,
+                 tile_positions: Optional[List[Tuple[float, float]]] = None, **kwargs):
+        super().__init__(mac_addr, label, **kwargs)
+        tile_positions = tile_positions or [(float(i), 0.) for i in range(num_tiles)]
+        self.tiles = [VirtualTile(x, y, color=self.color) for x, y in tile_positions]
+
+    def _set_color(self, color: HSBK):
+        super()._set_color(color)
+        for t in self.tiles:
+            t.colors = [self.color] * len(t.colors)
+
+    def _tile_range(self, tile_index, length) -> range:
+        return range(tile_index, min(tile_index + max(length, 1), len(self.tiles)))
+
+    @handles(GetDeviceChain)
+    def _device_chain(self, _) -> List[Reply]:
+        return [(StateDeviceChain, dict(start_index=0, tile_devices=[t.as_payload(self.product) for t in self.tiles],
+                                        total_count=len(self.tiles)))]
+
+    @handles(SetUserPosition, is_set=True)
+    def _set_user_position(self, msg) -> List[Reply]:
+        if msg.tile_index < len(self.tiles):
+            t = self.tiles[msg.tile_index]
+            t.user_x, t.user_y = msg.user_x, msg.user_y
+        return self._device_chain(msg)
+
+    @handles(GetTileState64)
+    def _tile_state(self, msg) -> List[Reply]:
+        return [(StateTileState64, dict(tile_index=i, reserved=0, x=msg.x, y=msg.y, width=msg.width,
+                                        colors=self.tiles[i].get(msg.x, msg.y, msg.width)))
+                for i in self._tile_range(msg.tile_index, msg.length)]
+
+    @handles(SetTileState64, is_set=True)
+    def _set_tile_state(self, msg) -> List[Reply]:
+        for i in self._tile_range(msg.tile_index, msg.length):
+            self.tiles[i].set(msg.x, msg.y, msg.width, msg.colors)
+        return self._tile_state(msg)
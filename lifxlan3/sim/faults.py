@@ -0,0 +1,52 @@
+from random import Random
+from typing import NamedTuple, Optional
+
+from lifxlan3.devices.products import DEFAULT_SEND_RATE
+
+__author__ = 'acushner'
+
+
+class Faults(NamedTuple):
+    """
+    how badly a virtual device's network behaves. the default is a perfect network
+
+    `loss`: chance each packet, in either direction, is dropped
+    `latency_secs`: fixed delay before every reply
+    `jitter_secs`: mean of an exponentially distributed extra delay (a long tail, like wi-fi)
+    `reorder`: chance a reply is held back another `reorder_secs`, so later replies overtake it
+    `duplicate`: chance a reply is sent twice
+    `rate_limit`: messages per second the device can keep up with. like real bulbs, it silently drops
+        whatever arrives beyond that once its buffer (one second's worth) is full
+    """
+    loss: float = 0.
+    latency_secs: float = 0.
+    jitter_secs: float = 0.
+    reorder: float = 0.
+    reorder_secs: float = .05
+    duplicate: float = 0.
+    rate_limit: Optional[float] = None
+
+    def drops(self, rng: Random) -> bool:
+        return bool(self.loss) and rng.random() < self.loss
+
+    def duplicates(self, rng: Random) -> bool:
+        return bool(self.duplicate) and rng.random() < self.duplicate
+
+    def delay_secs(self, rng: Random) -> float:
+        res = self.latency_secs
+        if self.jitter_secs:
+            res += rng.expovariate(1 / self.jitter_secs)
+        if self.reorder and rng.random() < self.reorder:
+            res += self.reorder_secs
+        return res
+
+    @property
+    def is_perfect(self) -> bool:
+        return self == PERFECT
+
+
+PERFECT = Faults()
+
+# a busy home network: the 2-5% loss range real setups see, a few ms of latency with a tail,
+# and bulbs that fall over past ~20 messages per second
+WIFI = Faults(loss=.03, latency_secs=.003, jitter_secs=.005, reorder=.01, duplicate=.005, rate_limit=DEFAULT_SEND_RATE)
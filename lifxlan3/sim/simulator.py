@@ -0,0 +1,278 @@
+"""
+emulate a lan of lifx devices on localhost
+
+    with Simulator(fleet(num_lights=10, num_strips=2, num_chains=1)):
+        lifx = LifxLAN()
+
+    with Simulator(fleet(num_lights=10), faults=Faults(loss=.05, jitter_secs=.01), seed=42):
+        ...
+
+or, for another process to talk to:
+
+    python -m lifxlan3.sim.simulator --lights 10 --strips 2 --chains 1 --port 56700 [--wifi]
+    LIFX_BROADCAST_ADDRS=127.0.0.1 LIFX_BROADCAST_PORT=56700 python my_script.py
+"""
+import argparse
+import heapq
+import selectors
+import sys
+import time
+from collections import Counter
+from itertools import count
+from random import Random
+from socket import AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF, socket
+from threading import Event, Thread
+from typing import Dict, Iterable, List, Optional, Type, Tuple
+
+from .devices import VirtualDevice, VirtualLight, VirtualMultizone, VirtualTileChain
+from .faults import Faults, PERFECT, WIFI
+from lifxlan3.network import network
+from lifxlan3.network.message import BROADCAST_MAC, Message
+from lifxlan3.network.msgtypes import Acknowledgement
+from lifxlan3.network.sendqueue import TokenBucket
+from lifxlan3.network.unpack import unpack_lifx_message
+from lifxlan3.utils import init_log
+
+__author__ = 'acushner'
+
+log = init_log(__name__)
+
+RCVBUF_BYTES = 1 << 20
+POLL_SECS = .1  # how often the serving thread checks whether it's been stopped
+
+
+def packed(msg_type: Type[Message], mac_addr: str, source_id: int, seq_num: int, payload: Dict) -> bytes:
+    """a reply from `mac_addr`. some message types insist on a broadcast target, which no real device replies with"""
+    msg = msg_type(mac_addr, source_id, seq_num, payload)
+    if msg.target_addr != mac_addr:
+        msg.target_addr, msg.tagged = mac_addr, 0
+        return msg.generate_packed_message()
+    return msg.packed_message
+
+
+def fleet(num_lights=0, num_strips=0, num_chains=0, **kwargs) -> List[VirtualDevice]:
+    """virtual devices with sequential macs: color bulbs, then multizone strips, then tile chains"""
+    types = [VirtualLight] * num_lights + [VirtualMultizone] * num_strips + [VirtualTileChain] * num_chains
+    return [t(f'd0:73:d5:{i >> 16 & 0xff:02x}:{i >> 8 & 0xff:02x}:{i & 0xff:02x}', **kwargs)
+            for i, t in enumerate(types)]
+
+
+class Simulator:
+    """
+    serve virtual devices over udp from a single background thread
+
+    each device has its own socket, and so its own port, which it reports in `StateService` just like real
+    hardware reports its ip. one more socket stands in for the lan's broadcast address: every device handles
+    what arrives there, and answers from its own socket.
+
+    as a context manager, it also points the library's broadcasts at itself for the duration.
+
+    `faults` degrade the network of every device without its own `faults`, and can be changed while serving.
+    `seed` makes which packets get dropped/delayed/duplicated reproducible.
+    `stats` counts packets received, sent, lost, dropped by overloaded devices, duplicated and delayed
+    """
+
+    def __init__(self, devices: Iterable[VirtualDevice], host='127.0.0.1', port=0, *, faults: Faults = PERFECT,
+                 seed: Optional[int] = None):
+        self.devices: Dict[str, VirtualDevice] = {d.mac_addr: d for d in devices}
+        self.host = host
+        self._port = port
+        self.faults = faults
+        self.stats = Counter()
+
+        self._rng = Random(seed)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._delayed: List[Tuple[float, int, socket, bytes, Tuple]] = []  # heap of replies not yet due
+        self._delayed_count = count()
+
+        self._sockets: Dict[str, socket] = {}
+        self._broadcast_sock: Optional[socket] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._prev_broadcast = None
+
+    def __getitem__(self, mac_addr) -> VirtualDevice:
+        return self.devices[mac_addr]
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def __len__(self):
+        return len(self.devices)
+
+    @property
+    def port(self) -> int:
+        """where broadcasts should be sent"""
+        return self._port
+
+    # ==================================================================================================================
+    # LIFECYCLE
+    # ==================================================================================================================
+
+    def _bind(self, port=0) -> socket:
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, RCVBUF_BYTES)
+        sock.bind((self.host, port))
+        sock.setblocking(False)
+        return sock
+
+    def start(self) -> 'Simulator':
+        self._selector = selectors.DefaultSelector()
+        self._broadcast_sock = self._bind(self._port)
+        self._port = self._broadcast_sock.getsockname()[1]
+        self._selector.register(self._broadcast_sock, selectors.EVENT_READ, None)
+        for d in self.devices.values():
+            sock = self._sockets[d.mac_addr] = self._bind()
+            d.port = sock.getsockname()[1]
+            self._selector.register(sock, selectors.EVENT_READ, d)
+
+        self._stop.clear()
+        self._thread = Thread(target=self._serve, name='lifxlan3-sim', daemon=True)
+        self._thread.start()
+        log.info(f'simulating {len(self.devices)} devices, broadcast address {self.host}:{self.port}')
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for sock in [self._broadcast_sock, *self._sockets.values()]:
+            if sock:
+                sock.close()
+        self._sockets.clear()
+        self._broadcast_sock = None
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+
+    def __enter__(self) -> 'Simulator':
+        self.start()
+        self._prev_broadcast = list(network.UDP_BROADCAST_IP_ADDRS), network.UDP_BROADCAST_PORT
+        network.set_broadcast_addrs([self.host], self.port)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        network.set_broadcast_addrs(*self._prev_broadcast)
+        self.stop()
+
+    # ==================================================================================================================
+    # SERVING
+    # ==================================================================================================================
+
+    def faults_for(self, device: VirtualDevice) -> Faults:
+        return device.faults or self.faults
+
+    def _serve(self):
+        while not self._stop.is_set():
+            timeout = POLL_SECS
+            if self._delayed:
+                timeout = min(timeout, max(0., self._delayed[0][0] - time.monotonic()))
+            for key, _ in self._selector.select(timeout):
+                while True:
+                    try:
+                        data, addr = key.fileobj.recvfrom(4096)
+                    except (BlockingIOError, OSError):
+                        break
+                    try:
+                        self._receive(key.data, data, addr)
+                    except Exception as e:
+                        log.warning(f'unable to handle packet from {addr}: {e!r}')
+            self._send_delayed()
+
+    def _send_delayed(self):
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, sock, data, addr = heapq.heappop(self._delayed)
+            self._sendto(sock, data, addr)
+
+    def _sendto(self, sock: socket, data: bytes, addr):
+        try:
+            sock.sendto(data, addr)
+        except OSError:  # closed by `stop`
+            return
+        self.stats['sent'] += 1
+
+    def _receive(self, device: Optional[VirtualDevice], data: bytes, addr):
+        """`device` is None for packets to the broadcast address"""
+        self.stats['received'] += 1
+        msg = unpack_lifx_message(data)
+        to_all = msg.tagged or msg.target_addr == BROADCAST_MAC
+        if device is None:
+            devices = self.devices.values() if to_all else filter(None, [self.devices.get(msg.target_addr)])
+        else:
+            devices = [device] if to_all or msg.target_addr == device.mac_addr else []
+
+        for d in devices:
+            if self._accepts(d):
+                d.rx_bytes += len(data)
+                self._reply(d, msg, addr)
+
+    def _accepts(self, device: VirtualDevice) -> bool:
+        """whether a packet for `device` survives the network and finds room in the device's buffer"""
+        faults = self.faults_for(device)
+        if faults.drops(self._rng):
+            self.stats['lost'] += 1
+            return False
+        if faults.rate_limit:
+            bucket = self._buckets.get(device.mac_addr)
+            if bucket is None:
+                bucket = self._buckets[device.mac_addr] = TokenBucket(faults.rate_limit)
+            elif bucket.rate != faults.rate_limit:
+                bucket.rate = bucket.burst = faults.rate_limit
+            if not bucket.take(time.monotonic()):
+                self.stats['overloaded'] += 1
+                return False
+        return True
+
+    def _reply(self, device: VirtualDevice, msg: Message, addr):
+        sock = self._sockets[device.mac_addr]
+        faults = self.faults_for(device)
+        replies = [(Acknowledgement, {})] if msg.ack_requested else []
+        replies.extend(device.handle(msg))
+        for msg_type, payload in replies:
+            data = packed(msg_type, device.mac_addr, msg.source_id, msg.seq_num, payload)
+            device.tx_bytes += len(data)
+            if faults.is_perfect:
+                self._sendto(sock, data, addr)
+                continue
+
+            num_copies = 2 if faults.duplicates(self._rng) else 1
+            self.stats['duplicated'] += num_copies - 1
+            for _ in range(num_copies):
+                if faults.drops(self._rng):
+                    self.stats['lost'] += 1
+                    continue
+                delay = faults.delay_secs(self._rng)
+                if not delay:
+                    self._sendto(sock, data, addr)
+                    continue
+                self.stats['delayed'] += 1
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._delayed_count), sock, data, addr))
+
+
+def __main(args: List[str]):
+    parser = argparse.ArgumentParser(description='simulate lifx devices on localhost')
+    parser.add_argument('--lights', type=int, default=0)
+    parser.add_argument('--strips', type=int, default=0)
+    parser.add_argument('--chains', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=network.UDP_BROADCAST_PORT)
+    parser.add_argument('--wifi', action='store_true', help='simulate a lossy, rate-limited wi-fi network')
+    parser.add_argument('--seed', type=int)
+    opts = parser.parse_args(args)
+
+    sim = Simulator(fleet(opts.lights, opts.strips, opts.chains), opts.host, opts.port,
+                    faults=WIFI if opts.wifi else PERFECT, seed=opts.seed).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == '__main__':
+    __main(sys.argv[1:])
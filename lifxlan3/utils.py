@@ -1,13 +1,14 @@
+import asyncio
 import logging
 import time
 from collections import deque
-from concurrent.futures import wait
+from concurrent.futures import Future, wait
 from concurrent.futures.thread import ThreadPoolExecutor
 from contextlib import contextmanager
 from functools import wraps
 from itertools import cycle
 from socket import AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_BROADCAST, SO_REUSEADDR, socket
-from threading import local
+from threading import Lock, local
 from typing import Optional, List, Any, Union, Iterable
 
 
@@ -26,6 +27,17 @@ log = init_log(__name__)
 
 
 def timer(func):
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                log.info(f'func {func.__name__!r} took {time.perf_counter() - start_time} seconds')
+
+        return wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.perf_counter()
@@ -46,30 +58,102 @@ def localtimer():
         print(f'localtimer took {time.time() - start_time}')
 
 
+SHARED_POOL_THREADS = 64
+
+
+class _Task(Future):
+    """
+    a future that knows how to run itself
+
+    either a pool thread or a thread waiting on it, whichever gets there first, runs it exactly once
+    """
+
+    def __init__(self, fn, args, kwargs):
+        super().__init__()
+        self._fn, self._args, self._kwargs = fn, args, kwargs
+        self._claimed = False
+        self._claim_lock = Lock()
+
+    def run(self):
+        with self._claim_lock:
+            if self._claimed:
+                return
+            self._claimed = True
+        if not self.set_running_or_notify_cancel():
+            return
+        try:
+            self.set_result(self._fn(*self._args, **self._kwargs))
+        except BaseException as e:
+            self.set_exception(e)
+        finally:
+            self._fn = self._args = self._kwargs = None
+
+
+class SharedExecutor:
+    """
+    one bounded thread pool for the whole library
+
+    fan-out can nest (e.g. a group waiting on lights waiting on their own requests) without deadlocking
+    even when every thread is busy: a thread waiting on tasks from this executor runs the ones that haven't
+    started yet itself, so it only ever blocks on tasks that are already running
+    """
+
+    def __init__(self, max_workers: int = SHARED_POOL_THREADS):
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix='lifxlan3')
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        task = _Task(fn, args, kwargs)
+        self._pool.submit(task.run)
+        return task
+
+    @staticmethod
+    def wait(futures: Iterable[Future]):
+        futures = list(futures)
+        for f in futures:
+            if isinstance(f, _Task):
+                f.run()
+        wait(futures)
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait)
+
+
+_executor: Optional[SharedExecutor] = None
+_executor_lock = Lock()
+
+
+def get_executor() -> SharedExecutor:
+    """the process-wide executor, started on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = SharedExecutor()
+    return _executor
+
+
 class WaitPool:
     """
-    allow jobs to be submitted to either an existing pool or a dynamically-created one,
+    allow jobs to be submitted to either an existing pool or the shared executor,
     wait for it to complete, and have access to the futures outside the `with` block
+
+    cheap to create: it owns no threads unless handed its own `ThreadPoolExecutor`
     """
-    threads_per_pool = 8
 
-    def __init__(self, pool: Optional[Union[int, ThreadPoolExecutor]] = None):
+    def __init__(self, pool: Optional[Union[int, ThreadPoolExecutor, SharedExecutor]] = None):
         self._pool = self._init_pool(pool)
         self._local = local()
 
     @staticmethod
-    def _init_pool(pool: Optional[Union[int, ThreadPoolExecutor]]):
-        if isinstance(pool, ThreadPoolExecutor):
+    def _init_pool(pool: Optional[Union[int, ThreadPoolExecutor, SharedExecutor]]):
+        if isinstance(pool, (ThreadPoolExecutor, SharedExecutor)):
             return pool
 
-        if isinstance(pool, int):
-            num_threads = pool
-        elif pool is None:
-            num_threads = WaitPool.threads_per_pool
-        else:
-            raise ValueError(f'invalid value for `pool`: {pool!r}')
+        if pool is None or isinstance(pool, int):
+            # a size is accepted for compatibility; concurrency is bounded by the shared executor instead
+            return get_executor()
 
-        return ThreadPoolExecutor(num_threads)
+        raise ValueError(f'invalid value for `pool`: {pool!r}')
 
     @property
     def futures(self):
@@ -84,7 +168,10 @@ class WaitPool:
         return [f.result() for f in self.futures]
 
     def wait(self):
-        wait(self.futures)
+        if isinstance(self._pool, SharedExecutor):
+            self._pool.wait(self.futures)
+        else:
+            wait(self.futures)
 
     def __getattr__(self, item):
         """proxy for underlying pool object"""
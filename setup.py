@@ -4,7 +4,7 @@ import re
 
 with open("lifxlan3/__init__.py") as meta_file:
     metadata = dict(re.findall("__([a-z]+)__\s*=\s*'([^']+)'", meta_file.read()))
-packages = 'lifxlan3 lifxlan3.devices lifxlan3.network lifxlan3.routines lifxlan3.routines.light lifxlan3.routines.tile'.split()
+packages = 'lifxlan3 lifxlan3.devices lifxlan3.network lifxlan3.routines lifxlan3.routines.light lifxlan3.routines.tile lifxlan3.bench lifxlan3.aio lifxlan3.sim'.split()
 setup(name='lifxlan3',
       version=metadata['version'],
       description=metadata['description'],
@@ -0,0 +1,53 @@
+import time
+from contextlib import ExitStack
+
+import pytest
+
+from lifxlan3 import LifxLAN
+from lifxlan3.network.transport import close_transport
+from lifxlan3.sim import Simulator, fleet
+
+__author__ = 'acushner'
+
+SEED = 42
+
+
+@pytest.fixture
+def sim_lan():
+    """
+    call with `fleet` sizes to serve them from a `Simulator` and discover them: returns (sim, lan)
+
+    the shared transport is closed afterwards, so no device's health or rtt leaks into the next test
+    """
+    with ExitStack() as stack:
+        def start(num_lights=0, num_strips=0, num_chains=0, **kwargs):
+            sim = stack.enter_context(Simulator(fleet(num_lights, num_strips, num_chains), seed=SEED, **kwargs))
+            return sim, LifxLAN()
+
+        yield start
+    close_transport()
+
+
+@pytest.fixture
+def chain(sim_lan):
+    """(sim, tile chain, its virtual device), with the chain's layout already fetched"""
+    sim, lan = sim_lan(num_chains=1)
+    tc = lan.tilechain_lights[0]
+    assert tc.tile_count == 5
+    sim.stats.clear()
+    return sim, tc, sim[tc.mac_addr]
+
+
+@pytest.fixture
+def wait_for():
+    """call with a predicate: polls it until it's true, returning False if it still isn't after `timeout_secs`"""
+
+    def wait(predicate, timeout_secs=3.):
+        end = time.monotonic() + timeout_secs
+        while not predicate():
+            if time.monotonic() > end:
+                return False
+            time.sleep(.01)
+        return True
+
+    return wait
@@ -0,0 +1,80 @@
+import asyncio
+
+from lifxlan3.aio import AsyncLifxLAN, AsyncLight, AsyncMultizoneLight, AsyncTileChain, batch
+from lifxlan3.colors import Colors
+from lifxlan3.network.health import Outcome
+from lifxlan3.network.msgtypes import LightGet, LightState
+from lifxlan3.network.transport import get_transport
+from lifxlan3.sim import Faults
+
+__author__ = 'acushner'
+
+
+def test_discover_and_set(sim_lan):
+    sim, _ = sim_lan(num_lights=2, num_strips=1, num_chains=1)
+
+    async def main():
+        lan = await AsyncLifxLAN.discover()
+        assert [type(d) for d in lan] == [AsyncLight, AsyncLight, AsyncMultizoneLight, AsyncTileChain]
+        assert set((await lan.set_color(Colors.BLUE, rapid=False)).values()) == {Outcome.ok}
+        return lan
+
+    lan = asyncio.run(main())
+    for l in lan:
+        assert sim[l.mac_addr].color == tuple(Colors.BLUE)
+
+
+def test_refresh_reports_unreachable_lights(sim_lan):
+    sim, _ = sim_lan(num_lights=3)
+
+    async def main():
+        lan = await AsyncLifxLAN.discover()
+        for i, vl in enumerate(sim):
+            vl.color = 1000 * i, 65535, 65535, 3500
+        lost = lan.lights[0]
+        sim[lost.mac_addr].faults = Faults(loss=1.)
+        outcomes = await lan.refresh_color()
+        return lan, lost, outcomes
+
+    lan, lost, outcomes = asyncio.run(main())
+    assert outcomes[lost] is Outcome.failed
+    for l in lan.lights[1:]:
+        assert outcomes[l] is Outcome.ok
+        assert tuple(l.color) == sim[l.mac_addr].color
+
+
+def test_multizone_and_tiles(sim_lan):
+    sim, _ = sim_lan(num_strips=1, num_chains=1)
+    colors = [Colors.RED, Colors.GREEN, Colors.BLUE]
+
+    async def main():
+        lan = await AsyncLifxLAN.discover()
+        mz, tc = lan.multizone_lights[0], lan.tilechain_lights[0]
+        async with batch():
+            await mz.set_zone_colors(colors)
+            await tc.set_tilechain_colors({1: [Colors.GREEN] * 64}, rapid=False)
+        return mz, tc, await mz.refresh_color_zones()
+
+    mz, tc, zones = asyncio.run(main())
+    assert sim[mz.mac_addr].zones[:3] == list(map(tuple, colors))
+    assert list(zones[:3]) == colors
+    assert sim[tc.mac_addr].tiles[1].colors == [tuple(Colors.GREEN)] * 64
+
+
+def test_cancelled_request_leaves_transport_running(sim_lan):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+
+    async def main():
+        lan = await AsyncLifxLAN.discover()
+        sim[l.mac_addr].faults = Faults(latency_secs=.5)
+        task = asyncio.ensure_future(lan.lights[0].refresh_light_state())
+        await asyncio.sleep(.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+        sim[l.mac_addr].faults = None
+        return await lan.lights[0].req_with_resp(LightGet, LightState)
+
+    assert isinstance(asyncio.run(main()), LightState)
+    assert not get_transport().closed
@@ -0,0 +1,134 @@
+import pytest
+
+from lifxlan3.bench.codec import PAYLOADS, MAC, SOURCE_ID, COLOR, sample
+from lifxlan3.network.encode import (encode, encode_cached, packet_cache_info, clear_packet_cache, encode_set_power,
+                                     encode_light_set_power, encode_light_set_color, encode_set_color_zones,
+                                     encode_set_tile_state64, encode_set_tile_state64_into)
+from lifxlan3.network.message import Message, HEADER_SIZE_BYTES
+from lifxlan3.network.msgtypes import (LightState, StatePower, SetPower, LightSetPower, LightSetColor,
+                                       MultizoneSetColorZones, SetTileState64)
+from lifxlan3.network.unpack import unpack_lifx_message
+
+__author__ = 'acushner'
+
+
+def _same(decoded, expected) -> bool:
+    """whether `decoded` is `expected`, allowing for 32-bit floats and fixed-size arrays padded with zeros"""
+    if isinstance(expected, float):
+        return decoded == pytest.approx(expected, rel=1e-6)
+    if isinstance(expected, bytes):
+        return bytes(decoded) == expected
+    if isinstance(expected, list):
+        return len(decoded) >= len(expected) and all(map(_same, decoded, expected))
+    if isinstance(expected, dict):
+        return all(_same(decoded[k], v) for k, v in expected.items())
+    return decoded == expected
+
+
+# ======================================================================================================================
+# SCHEMA CODEC
+
+@pytest.mark.parametrize('msg_type', PAYLOADS, ids=lambda t: t.__name__)
+def test_round_trip(msg_type):
+    payload = PAYLOADS[msg_type]
+    data = encode(msg_type, MAC, SOURCE_ID, 7, payload, ack_requested=True)
+    assert data == sample(msg_type).packed_message
+
+    msg = unpack_lifx_message(data)
+    assert type(msg) is msg_type
+    assert (msg.source_id, msg.seq_num, msg.ack_requested) == (SOURCE_ID, 7, True)
+    if not msg.tagged:
+        assert msg.target_addr == MAC
+    for name, value in payload.items():
+        assert _same(getattr(msg, name), value), name
+
+
+# ======================================================================================================================
+# PACKET CACHE
+
+@pytest.mark.parametrize('msg_type', PAYLOADS, ids=lambda t: t.__name__)
+def test_cached_packets_match_encode(msg_type):
+    for seq_num in 0, 1, 7, 255:
+        for ack_requested in False, True:
+            args = msg_type, MAC, SOURCE_ID, seq_num, PAYLOADS[msg_type], ack_requested
+            assert encode_cached(*args) == encode(*args), (seq_num, ack_requested)
+
+
+def test_packet_cache_counts_hits_and_misses():
+    clear_packet_cache()
+    power = dict(power_level=65535)
+    for seq_num in range(3):
+        encode_cached(SetPower, MAC, SOURCE_ID, seq_num, power)
+    assert packet_cache_info()[:2] == (2, 1)
+
+    encode_cached(SetPower, MAC, SOURCE_ID, 3, dict(power_level=0))
+    encode_cached(SetPower, MAC, SOURCE_ID, 4, power, ack_requested=True)
+    assert packet_cache_info()[:2] == (2, 3)
+
+    tile = dict(tile_index=0, length=1, x=0, y=0, width=8, duration=0, colors=[(1, 2, 3, 3500)] * 64)
+    for seq_num in range(3):
+        assert encode_cached(SetTileState64, MAC, SOURCE_ID, seq_num, tile) == \
+               encode(SetTileState64, MAC, SOURCE_ID, seq_num, tile)
+    info = packet_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (4, 4, 4)
+
+    clear_packet_cache()
+    assert packet_cache_info()[:2] == (0, 0)
+
+
+# ======================================================================================================================
+# SPECIALIZED ENCODERS
+
+TILE_COLORS = [(i, 65535 - i, i * 2, 3500) for i in range(64)]
+
+
+def test_specialized_encoders_match_encode():
+    def generic(msg_type, **payload):
+        return encode(msg_type, MAC, SOURCE_ID, 7, payload, ack_requested=True)
+
+    assert encode_set_power(MAC, SOURCE_ID, 7, 65535, True) == generic(SetPower, power_level=65535)
+    assert encode_light_set_power(MAC, SOURCE_ID, 7, 0, 100, True) == \
+           generic(LightSetPower, power_level=0, duration=100)
+    assert encode_light_set_color(MAC, SOURCE_ID, 7, COLOR, 0, True) == \
+           encode(LightSetColor, MAC, SOURCE_ID, 7, PAYLOADS[LightSetColor], ack_requested=True)
+    assert encode_set_color_zones(MAC, SOURCE_ID, 7, 2, 5, COLOR, 10, 0, True) == \
+           generic(MultizoneSetColorZones, start_index=2, end_index=5, color=COLOR, duration=10, apply=0)
+
+
+def test_set_tile_state64():
+    data = encode_set_tile_state64(MAC, SOURCE_ID, 7, 3, TILE_COLORS, ack_requested=True)
+    msg = unpack_lifx_message(data)
+    assert (msg.tile_index, msg.length, msg.width) == (3, 1, 8)
+    assert list(msg.colors) == TILE_COLORS
+
+    buf = bytearray(2 * len(data))
+    assert encode_set_tile_state64_into(buf, len(data), MAC, SOURCE_ID, 7, 3, TILE_COLORS, ack_requested=True) \
+           == len(data)
+    assert buf == bytes(len(data)) + data
+
+
+# ======================================================================================================================
+# RECEIVE PATH
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_unpack_any_buffer(wrap):
+    data = encode(LightState, MAC, SOURCE_ID, 9, PAYLOADS[LightState])
+    msg = unpack_lifx_message(wrap(data))
+    assert type(msg) is LightState
+    assert (msg.seq_num, msg.label, msg.color) == (9, 'kitchen', COLOR)
+
+
+def test_payload_is_decoded_on_first_access():
+    msg = unpack_lifx_message(encode(StatePower, MAC, SOURCE_ID, 1, dict(power_level=65535)))
+    assert 'power_level' not in vars(msg)
+    assert msg.power_level == 65535
+    assert vars(msg)['power_level'] == 65535
+
+
+def test_unknown_message_type_unpacks_as_message():
+    data = bytearray(encode(StatePower, MAC, SOURCE_ID, 3, dict(power_level=0)))
+    data[32:34] = (9999).to_bytes(2, 'little')  # message type
+    msg = unpack_lifx_message(bytes(data))
+    assert type(msg) is Message
+    assert (msg.message_type, msg.seq_num, msg.target_addr) == (9999, 3, MAC)
+    assert len(msg.packed_message) > HEADER_SIZE_BYTES
@@ -0,0 +1,44 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from lifxlan3.aio import AsyncLifxLAN
+from lifxlan3.network.msgtypes import GetVersion, GetLabel
+from lifxlan3.network.transport import Transport
+
+__author__ = 'acushner'
+
+
+@pytest.fixture
+def requests_sent(monkeypatch) -> Counter:
+    """counts every `Transport.request` by message type"""
+    res = Counter()
+    request = Transport.request
+
+    def counting(self, msg_type, *args, **kwargs):
+        res[msg_type] += 1
+        return request(self, msg_type, *args, **kwargs)
+
+    monkeypatch.setattr(Transport, 'request', counting)
+    return res
+
+
+def test_discovery_asks_each_device_its_version_once(sim_lan, requests_sent):
+    sim, lan = sim_lan(num_lights=2, num_strips=1, num_chains=1)
+    assert len(lan) == 4
+    assert requests_sent[GetVersion] == 4
+    assert requests_sent[GetLabel] == 4
+
+    requests_sent.clear()
+    assert lan.lights[0].refresh()
+    assert requests_sent[GetLabel] == 1
+    assert not requests_sent[GetVersion]
+
+
+def test_async_discovery_asks_each_device_its_version_once(sim_lan, requests_sent):
+    sim, _ = sim_lan(num_lights=2, num_strips=1, num_chains=1)
+    requests_sent.clear()
+    lan = asyncio.run(AsyncLifxLAN.discover())
+    assert len(lan) == 4
+    assert requests_sent[GetVersion] == 4
@@ -0,0 +1,84 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from lifxlan3.network import network
+from lifxlan3.network.network import DiscoverySchedule, discover
+from lifxlan3.network.transport import close_transport
+from lifxlan3.sim import Faults, Simulator, fleet
+
+__author__ = 'acushner'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """a fake `time.monotonic` for `DiscoverySchedule`: advance it by setting `clock.now`"""
+    res = SimpleNamespace(now=100.)
+    monkeypatch.setattr(network, 'time', SimpleNamespace(monotonic=lambda: res.now))
+    return res
+
+
+# ======================================================================================================================
+# SCHEDULE
+
+def test_broadcasts_back_off(clock):
+    s = DiscoverySchedule(quiet_secs=60, max_secs=60)
+    sent_at = []
+    for ms in range(0, 3000, 10):
+        clock.now = 100 + ms / 1000
+        if s.should_broadcast():
+            sent_at.append(ms / 1000)
+    assert sent_at == [0, .1, .3, .7, 1.5, 2.5]
+
+
+def test_quiet_period_restarts_on_each_new_device(clock):
+    s = DiscoverySchedule(quiet_secs=.6, max_secs=5, initial_interval=10, min_broadcasts=1)
+    assert s.should_broadcast()
+    clock.now = 100.5
+    s.found()
+    clock.now = 101
+    assert not s.done
+    assert s.wait_secs == pytest.approx(.1)
+    clock.now = 101.125
+    assert s.done
+
+
+def test_quiet_period_waits_for_min_broadcasts(clock):
+    s = DiscoverySchedule(quiet_secs=.6, max_secs=5, min_broadcasts=2)
+    assert s.should_broadcast()
+    clock.now += 1
+    assert not s.done, 'a single lost broadcast must not end discovery'
+    assert s.should_broadcast()
+    assert s.done
+
+
+def test_stops_at_total_num_lights_or_max_secs(clock):
+    s = DiscoverySchedule(total_num_lights=2, quiet_secs=60, max_secs=5)
+    s.found()
+    assert not s.done
+    s.found()
+    assert s.done
+
+    s = DiscoverySchedule(quiet_secs=60, max_secs=5)
+    s.found()
+    clock.now += 5
+    assert s.done
+
+
+# ======================================================================================================================
+# AGAINST THE SIMULATOR
+
+def test_discovery_ends_a_quiet_period_after_the_last_responder():
+    lights = fleet(3, 0, 0)
+    try:
+        with Simulator(lights, seed=42) as sim:
+            sim[lights[0].mac_addr].faults = Faults(latency_secs=.3)
+            start = time.monotonic()
+            found = [r.target_addr for r in discover(1234, quiet_secs=.4)]
+            elapsed = time.monotonic() - start
+    finally:
+        close_transport()
+    assert sorted(found) == sorted(sim.devices)
+    assert found[-1] == lights[0].mac_addr
+    assert .65 <= elapsed < 1.5
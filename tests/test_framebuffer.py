@@ -0,0 +1,72 @@
+import pytest
+
+from lifxlan3.colors import Colors
+from lifxlan3.devices.framebuffer import Framebuffer, Placement, COLORS_OFFSET, pack_colors
+from lifxlan3.network.encode import encode_set_tile_state64
+
+__author__ = 'acushner'
+
+RED = tuple(Colors.RED)
+
+
+def _pixel(row, col):
+    """a color that says where on the canvas it is"""
+    return row, col, 65535, 3500
+
+
+def _tile(fb, p: Placement):
+    """what's on the canvas under placed tile `p`, row by row, before any rotation"""
+    return [fb[p.row + r, p.col + c] for r in range(8) for c in range(8)]
+
+
+def test_draw_and_index(chain):
+    sim, tc, vtc = chain
+    fb = Framebuffer(tc, (8, 16), [Placement(0, 0, 0)])
+    fb.fill(RED)
+    assert fb[7, 15] == RED
+    fb.draw([[_pixel(r, c) for c in range(20)] for r in range(3)], offset=(1, -2))
+    assert fb[1, 0] == _pixel(0, 2)
+    assert fb[3, 15] == _pixel(2, 17)
+    assert fb[0, 0] == fb[4, 0] == RED
+    fb[7, 15] = Colors.BLUE
+    assert fb[7, 15] == tuple(Colors.BLUE)
+    with pytest.raises(IndexError):
+        fb[8, 0]
+
+
+def test_flush_lays_the_canvas_out_like_the_tiles(chain):
+    sim, tc, vtc = chain
+    fb = tc.framebuffer()
+    assert fb.shape == tuple(reversed(tc.canvas_dimensions))
+    assert len(fb.placements) == tc.tile_count
+    fb.draw([[_pixel(r, c) for c in range(fb.width)] for r in range(fb.height)])
+    fb.flush(rapid=False)
+    assert sim.stats['received'] == tc.tile_count
+    for i, p in fb.placements.items():
+        assert vtc.tiles[i].colors == _tile(fb, p)
+
+
+def test_packet_matches_encode(chain):
+    sim, tc, vtc = chain
+    p = Placement(0, 8, 0)
+    fb = Framebuffer(tc, (16, 8), [p])
+    fb.draw([[_pixel(r, c) for c in range(8)] for r in range(16)])
+    packet = fb.packet(0, duration=250)
+    colors = _tile(fb, p)
+    assert packet[COLORS_OFFSET:] == pack_colors(colors)
+    expected = encode_set_tile_state64(tc.mac_addr, tc.source_id, 0, 0, colors, duration=250)
+    assert packet == expected
+
+
+def test_rotated_placement(chain):
+    sim, tc, vtc = chain
+    fb = Framebuffer(tc, (8, 8), [Placement(0, 0, 0, rotation=1)])
+    fb[0, 0] = RED
+    fb.flush(rapid=False)
+    assert vtc.tiles[0].colors.index(RED) == 7  # top left turns clockwise to top right
+
+
+def test_placement_must_fit_on_the_canvas(chain):
+    sim, tc, vtc = chain
+    with pytest.raises(ValueError):
+        Framebuffer(tc, (8, 12), [Placement(0, 0, 5)])
@@ -0,0 +1,103 @@
+import time
+
+from lifxlan3 import LifxLAN
+from lifxlan3.colors import Colors, Color
+from lifxlan3.network.batch import batch
+from lifxlan3.network.health import Outcome
+from lifxlan3.sim import Faults
+
+__author__ = 'acushner'
+
+
+# ======================================================================================================================
+# SWEEP
+
+def _recolor(sim):
+    """change every virtual light's color behind the library's back"""
+    for i, vl in enumerate(sim):
+        vl.color = 1000 * i, 65535, 32768, 3500
+
+
+def test_sweep_follows_up_under_loss(sim_lan):
+    sim, lan = sim_lan(num_lights=8)
+    _recolor(sim)
+    sim.faults = Faults(loss=.1)
+
+    assert set(lan.refresh_color().values()) == {Outcome.ok}
+    assert sim.stats['lost']  # so some answers to the broadcast only came from follow-ups
+    for l in lan.lights:
+        assert tuple(l.color) == sim[l.mac_addr].color
+
+
+def test_sweep_reports_unreachable_devices(sim_lan):
+    sim, lan = sim_lan(num_lights=3)
+    _recolor(sim)
+    lost = lan.lights[0]
+    sim[lost.mac_addr].faults = Faults(loss=1.)
+
+    outcomes = lan.refresh_color()
+    assert outcomes[lost] is Outcome.failed
+    for l in lan.lights[1:]:
+        assert outcomes[l] is Outcome.ok
+        assert tuple(l.color) == sim[l.mac_addr].color
+    assert tuple(lost.color) != sim[lost.mac_addr].color
+
+    assert lan.sweep('light_state', follow_up=False) == [lost]
+
+
+# ======================================================================================================================
+# LAN-WIDE BROADCASTS
+
+def test_broadcast_after_batched_set(sim_lan, wait_for):
+    sim, lan = sim_lan(num_lights=3)
+    l0 = lan.lights[0]
+    with batch():
+        l0.set_color(Colors.RED, rapid=True)
+        lan.set_color(Colors.BLUE, rapid=True)
+
+    for l in lan.lights:
+        assert l.color == Colors.BLUE
+        assert wait_for(lambda: sim[l.mac_addr].color == tuple(Colors.BLUE))
+
+
+def test_broadcast_after_queued_set(sim_lan, wait_for):
+    sim, lan = sim_lan(num_lights=3)
+    l0 = lan.lights[0]
+    for i in range(3 * int(l0.send_rate)):  # more than the bucket holds, so the last red waits in the queue
+        l0.set_color(Color(i, 65535, 65535, 3500), rapid=True)
+        l0.set_power(i % 2, rapid=True)
+    l0.set_color(Colors.RED, rapid=True)
+    lan.set_color(Colors.GREEN, rapid=True)
+
+    assert wait_for(lambda: l0.transport.num_pending == 0)
+    time.sleep(3 / l0.send_rate)  # anything still queued would have gone out by now
+    for l in lan.lights:
+        assert l.color == Colors.GREEN
+        assert sim[l.mac_addr].color == tuple(Colors.GREEN)
+
+
+def test_broadcast_only_covers_own_lan(sim_lan):
+    sim, lan = sim_lan(num_lights=3)
+    other = LifxLAN()
+    assert lan._covers_lan(lan.color_lights) and other._covers_lan(other.color_lights)
+    assert lan.color_lights._covers_lan(lan.color_lights)
+    assert not lan[:2]._covers_lan(lan[:2])
+
+
+def test_unclassified_responder_disables_broadcast(sim_lan, monkeypatch):
+    sim, lan = sim_lan(num_lights=3)
+    unknown = lan.lights[0].mac_addr
+    init_device = LifxLAN._init_device
+    monkeypatch.setattr(LifxLAN, '_init_device', lambda self, r: None if r.target_addr == unknown
+                        else init_device(self, r))
+    partial = LifxLAN()
+    assert len(partial) == 2
+    assert not partial._covers_lan(partial.color_lights)
+    assert lan._covers_lan(lan.color_lights)
+
+    before = sim[unknown].color
+    sim.stats.clear()
+    partial.set_color(Colors.BLUE, rapid=True)
+    time.sleep(.2)
+    assert sim[unknown].color == before
+    assert sim.stats['received'] == 2
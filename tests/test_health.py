@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from lifxlan3.colors import Colors
+from lifxlan3.network import health
+from lifxlan3.network.health import Health, Outcome
+from lifxlan3.network.msgtypes import LightGet, LightState, EchoRequest
+from lifxlan3.network.transport import get_transport, outcome, CircuitOpen, NoResponse
+from lifxlan3.sim import Faults
+
+__author__ = 'acushner'
+
+PROBE_BACKOFF = .1  # second
+
+
+@pytest.fixture
+def unreachable(sim_lan, monkeypatch):
+    """a discovered light that's stopped answering, and the sim serving it"""
+    monkeypatch.setattr(health, 'PROBE_INITIAL_BACKOFF', PROBE_BACKOFF)
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    sim[l.mac_addr].faults = Faults(loss=1.)
+    return sim, l
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """(msg_type, time) of every request that actually goes out from here on"""
+    res = []
+    transport = get_transport()
+    request = transport._request
+
+    def recording(msg_type, *args):
+        res.append((msg_type, time.monotonic()))
+        return request(msg_type, *args)
+
+    monkeypatch.setattr(transport, '_request', recording)
+    return res
+
+
+def _open(l):
+    for _ in range(health.OPEN_AFTER):
+        outcome(_get(l))
+    assert get_transport().health(l.mac_addr) is Health.open
+
+
+def _get(l):
+    return l.send_request(LightGet, LightState, timeout_secs=.05, max_attempts=1)
+
+
+def test_circuit_opens_and_fails_fast(unreachable):
+    sim, l = unreachable
+    transport = get_transport()
+    assert transport.health(l.mac_addr) is Health.healthy
+    for expected in Health.suspect, Health.open:
+        assert outcome(_get(l)) is Outcome.failed
+        assert transport.health(l.mac_addr) is expected
+
+    sim.stats.clear()
+    fut = _get(l)
+    assert fut.done()
+    with pytest.raises(CircuitOpen):
+        fut.result()
+    assert outcome(fut) is Outcome.skipped
+    assert not sim.stats['lost']  # nothing was sent
+
+    with pytest.raises(CircuitOpen):
+        l.set_color(Colors.RED)
+    assert sim.stats['lost'] == 1  # a set still goes out once, in case it lands
+
+
+def test_probe_rejoins_a_device_that_answers_again(unreachable, sent, wait_for):
+    sim, l = unreachable
+    _open(l)
+    del sent[:]
+    sim[l.mac_addr].faults = None
+    assert outcome(_get(l)) is Outcome.skipped
+    assert sent == [], 'probed before the backoff was up'
+
+    time.sleep(PROBE_BACKOFF)
+    assert outcome(_get(l)) is Outcome.skipped
+    assert [msg_type for msg_type, _ in sent] == [EchoRequest]
+    assert wait_for(lambda: get_transport().health(l.mac_addr) is Health.healthy)
+    assert isinstance(_get(l).result(), LightState)
+
+
+def test_unanswered_probes_back_off(unreachable, sent):
+    sim, l = unreachable
+    _open(l)
+    del sent[:]
+    end = time.monotonic() + 11 * PROBE_BACKOFF
+    while time.monotonic() < end:
+        with pytest.raises(NoResponse):
+            _get(l).result()
+        time.sleep(.01)
+    probes = [t for _, t in sent]
+    assert len(probes) == 3  # at 1, 3 and 7 backoffs after opening, and the next not until 15
+    gaps = [b - a for a, b in zip(probes, probes[1:])]
+    assert gaps[0] > 2 * PROBE_BACKOFF - .01 and gaps[1] > 4 * PROBE_BACKOFF - .01
@@ -0,0 +1,57 @@
+import json
+from socket import socket, AF_INET, SOCK_DGRAM
+
+from lifxlan3 import LifxLAN
+from lifxlan3.devices.light import Light
+from lifxlan3.devices.multizonelight import MultizoneLight
+from lifxlan3.inventory import Inventory, DeviceRecord, INVENTORY_VERSION
+
+__author__ = 'acushner'
+
+
+def _unused_port() -> int:
+    with socket(AF_INET, SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_save_and_load(sim_lan, tmp_path):
+    sim, lan = sim_lan(num_lights=1, num_strips=1)
+    inventory = Inventory(str(tmp_path / 'inventory.json'))
+    inventory.save(lan)
+    records = inventory.load()
+    assert records == {d.mac_addr: DeviceRecord.from_device(d) for d in lan}
+
+    devices = [r.to_device(lan.source_id) for r in records.values()]
+    assert [type(d) for d in devices] == [Light, MultizoneLight]
+    assert [(d.label, d.port, d.product_info) for d in devices] == [(d.label, d.port, d.product_info) for d in lan]
+
+
+def test_unusable_inventory_loads_empty(tmp_path):
+    path = tmp_path / 'inventory.json'
+    assert Inventory(str(path)).load() == {}
+    path.write_text('{not json')
+    assert Inventory(str(path)).load() == {}
+    path.write_text(json.dumps(dict(version=INVENTORY_VERSION + 1, devices=[])))
+    assert Inventory(str(path)).load() == {}
+
+
+def test_warm_start_picks_up_a_moved_device(sim_lan, tmp_path):
+    sim, lan = sim_lan(num_lights=3)
+    path = tmp_path / 'inventory.json'
+    Inventory(str(path)).save(lan)
+    moved = lan.lights[0].mac_addr
+    data = json.loads(path.read_text())
+    for r in data['devices']:
+        if r['mac_addr'] == moved:
+            r['port'] = _unused_port()
+    path.write_text(json.dumps(data))
+
+    warm = LifxLAN(inventory=str(path))
+    assert {d.mac_addr for d in warm} == set(sim.devices) - {moved}
+    assert not warm._covers(warm), 'the moved device would get broadcasts it is not counted for'
+
+    warm.wait_for_reconcile()
+    assert {d.mac_addr: d.port for d in warm} == {vd.mac_addr: vd.port for vd in sim}
+    assert warm._covers(warm)
+    assert Inventory(str(path)).load()[moved].port == sim[moved].port
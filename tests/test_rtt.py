@@ -0,0 +1,82 @@
+import pytest
+
+from lifxlan3.network.msgtypes import LightGet, LightState
+from lifxlan3.network.rtt import RttEstimator, INITIAL_RTO, MIN_RTO, MAX_RTO, MIN_HEDGE
+from lifxlan3.network.transport import get_transport
+from lifxlan3.sim import Faults
+
+__author__ = 'acushner'
+
+
+# ======================================================================================================================
+# ESTIMATOR
+
+def test_initial_estimate():
+    rtt = RttEstimator()
+    assert rtt.rto == INITIAL_RTO
+    assert rtt.hedge_secs is None
+    assert [rtt.timeout_secs(a) for a in (1, 2, 3)] == [INITIAL_RTO, 2 * INITIAL_RTO, MAX_RTO]
+
+
+def test_samples_are_smoothed():
+    rtt = RttEstimator()
+    rtt.sample(.04)
+    assert (rtt.srtt, rtt.rttvar) == (.04, .02)
+    assert rtt.rto == pytest.approx(.12)
+    assert rtt.hedge_secs == pytest.approx(.08)
+
+    rtt.sample(.08)
+    assert rtt.srtt == pytest.approx(.045)
+    assert rtt.rttvar == pytest.approx(.025)
+
+
+def test_timeouts_back_off_within_bounds():
+    rtt = RttEstimator()
+    rtt.sample(.001)
+    assert rtt.rto == MIN_RTO
+    assert rtt.hedge_secs == MIN_HEDGE
+    assert [rtt.timeout_secs(a) for a in range(1, 6)] == pytest.approx([.1, .2, .4, .8, MAX_RTO])
+
+    rtt.timed_out()
+    rtt.timed_out()
+    assert (rtt.num_timeouts, rtt.consecutive_timeouts) == (2, 2)
+    rtt.sample(.001)
+    assert (rtt.num_timeouts, rtt.consecutive_timeouts) == (2, 0)
+
+    rtt.sample(10.)
+    assert rtt.rto == MAX_RTO
+
+
+# ======================================================================================================================
+# AGAINST THE SIMULATOR
+
+def test_retransmitted_request_is_not_sampled(sim_lan):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    before = get_transport().rtt_stats(l.mac_addr)
+    assert before.num_samples and before.rto < MAX_RTO / 2
+
+    sim[l.mac_addr].faults = Faults(latency_secs=1.5 * before.rto)  # answered, but only after a retransmit
+    sim.stats.clear()
+    assert isinstance(l.req_with_resp(LightGet, LightState), LightState)
+    after = get_transport().rtt_stats(l.mac_addr)
+    assert sim.stats['received'] == 2
+    assert after.num_samples == before.num_samples
+    assert after.num_timeouts == before.num_timeouts + 1
+
+
+def test_hedge_resends_once_a_response_is_later_than_usual(sim_lan):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    stats = get_transport().rtt_stats(l.mac_addr)
+    hedge_secs = max(MIN_HEDGE, stats.srtt + 2 * stats.rttvar)
+    assert hedge_secs < stats.rto
+    sim[l.mac_addr].faults = Faults(latency_secs=(hedge_secs + stats.rto) / 2)  # after the hedge, before the rto
+
+    sim.stats.clear()
+    assert isinstance(l.req_with_resp(LightGet, LightState, hedge=True), LightState)
+    assert sim.stats['received'] == 2
+
+    sim.stats.clear()
+    assert isinstance(l.req_with_resp(LightGet, LightState), LightState)
+    assert sim.stats['received'] == 1
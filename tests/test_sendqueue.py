@@ -0,0 +1,71 @@
+from lifxlan3.colors import Color
+from lifxlan3.network.health import Outcome
+from lifxlan3.network.msgtypes import Acknowledgement, LightGet, LightSetColor, LightSetPower, SetPower, SetTileState64
+from lifxlan3.network.sendqueue import SendQueue, Outgoing, coalesce_key
+from lifxlan3.network.transport import get_transport, outcome
+
+__author__ = 'acushner'
+
+
+def _entry(key, data=b'') -> Outgoing:
+    return Outgoing(data, [], key)
+
+
+def test_coalesce_keys():
+    assert coalesce_key(LightSetPower, dict(power_level=0)) == coalesce_key(SetPower, dict(power_level=65535))
+    tile = dict(tile_index=0, length=1, x=0, y=0, width=8)
+    assert coalesce_key(SetTileState64, tile) != coalesce_key(SetTileState64, dict(tile, tile_index=1))
+    assert coalesce_key(LightSetColor, {}) != coalesce_key(SetPower, {})
+
+
+def test_newer_entry_supersedes_and_goes_last():
+    q = SendQueue(rate=1)
+    first_color, power, no_key = _entry(('color',), b'1'), _entry(('power',)), _entry(None)
+    for e in first_color, power, no_key:
+        assert q.push(e) == []
+
+    color = _entry(('color',), b'2')
+    assert q.push(color) == [first_color]
+    assert list(q.entries) == [power, no_key, color]
+    assert q.push(_entry(None)) == []
+
+    assert q.discard(('power',)) == [power]
+    assert q.discard(('power',)) == []
+    assert len(q.entries) == 3
+
+
+def test_queued_sets_end_on_the_last_one(sim_lan, wait_for):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    vl = sim[l.mac_addr]
+    num_sets = 100
+    sim.stats.clear()
+
+    colors = [Color(100 * i, 65535, 65535, 3500) for i in range(num_sets)]
+    for i, c in enumerate(colors):
+        l.set_color(c, rapid=True)
+        l.set_power(i % 2, rapid=True)
+
+    last = tuple(colors[-1]), (num_sets - 1) % 2 * 65535
+    assert wait_for(lambda: (vl.color, vl.power_level) == last)
+    assert wait_for(lambda: l.transport.num_pending == 0)
+    assert sim.stats['received'] < 2 * num_sets  # most were superseded before their turn
+
+
+def test_superseded_request_resolves_with_its_replacement(sim_lan):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    transport = get_transport()
+    args = l.mac_addr, l.source_id
+    for _ in range(2 * int(l.send_rate)):  # nothing to coalesce, so the requests below wait behind these
+        transport.send(LightGet, *args, {}, l._addrs, rate=l.send_rate)
+
+    def set_color(*hsbk):
+        return transport.request(LightSetColor, *args, dict(color=Color(*hsbk), duration=0), l._addrs,
+                                 [Acknowledgement], ack_requested=True, timeout_secs=None, max_attempts=4,
+                                 rate=l.send_rate)
+
+    first, second = set_color(1, 2, 3, 3500), set_color(4, 5, 6, 3500)
+    assert outcome(second) is Outcome.ok
+    assert first.result() is second.result()
+    assert sim[l.mac_addr].color == (4, 5, 6, 3500)
@@ -0,0 +1,46 @@
+from lifxlan3.colors import Colors
+from lifxlan3.devices.light import Light
+from lifxlan3.devices.multizonelight import MultizoneLight
+from lifxlan3.devices.tilechain import TileChain
+
+__author__ = 'acushner'
+
+
+def test_discovers_every_virtual_device(sim_lan):
+    sim, lan = sim_lan(num_lights=2, num_strips=1, num_chains=1)
+    assert {d.mac_addr for d in lan} == set(sim.devices)
+    assert [type(d) for d in lan] == [Light, Light, MultizoneLight, TileChain]
+    for d in lan:
+        assert d.label == sim[d.mac_addr].label
+
+
+def test_gets_report_device_state(sim_lan):
+    sim, lan = sim_lan(num_lights=1)
+    l = lan.lights[0]
+    vl = sim[l.mac_addr]
+    vl.color, vl.power_level, vl.label = (1, 2, 3, 3500), 65535, 'porch'
+    assert l.refresh()
+    assert (tuple(l.color), l.power_level, l.label) == (vl.color, vl.power_level, vl.label)
+
+
+def test_sets_change_device_state(sim_lan):
+    sim, lan = sim_lan(num_lights=1, num_strips=1)
+    l, mz = lan.lights
+    l.set_color(Colors.RED)
+    assert sim[l.mac_addr].color == tuple(Colors.RED)
+
+    colors = [Colors.RED, Colors.GREEN, Colors.BLUE]
+    mz.set_zone_colors(colors)
+    assert sim[mz.mac_addr].zones[:3] == list(map(tuple, colors))
+
+
+def test_tile_chain_layout_and_colors(sim_lan):
+    sim, lan = sim_lan(num_chains=1)
+    tc = lan.tilechain_lights[0]
+    vtc = sim[tc.mac_addr]
+    assert tc.tile_count == len(vtc.tiles)
+    assert [(t.user_x, t.user_y) for t in tc.tile_info] == [(t.user_x, t.user_y) for t in vtc.tiles]
+
+    vtc.tiles[1].colors = [tuple(Colors.GREEN)] * 64
+    states = tc.get_tilechain_colors(1, 1)
+    assert [tuple(c) for c in states[0].colors] == vtc.tiles[1].colors
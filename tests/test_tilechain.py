@@ -0,0 +1,84 @@
+import time
+
+from lifxlan3.colors import Colors
+from lifxlan3.devices.tilechain import RESEND_AFTER
+from lifxlan3.sim import Faults
+
+__author__ = 'acushner'
+
+RED, BLUE = tuple(Colors.RED), tuple(Colors.BLUE)
+
+
+def test_unchanged_tiles_are_skipped(chain):
+    sim, tc, vtc = chain
+    frame = {i: [RED] * 64 for i in range(tc.tile_count)}
+    tc.set_tilechain_colors(frame, rapid=False)
+    assert sim.stats['received'] == tc.tile_count
+
+    tc.set_tilechain_colors(frame, rapid=False)
+    assert sim.stats['received'] == tc.tile_count
+
+    tc.set_tilechain_colors({**frame, 2: [BLUE] * 64}, rapid=False)
+    assert sim.stats['received'] == tc.tile_count + 1
+    assert vtc.tiles[2].colors == [BLUE] * 64 and vtc.tiles[1].colors == [RED] * 64
+
+    tc.set_tilechain_colors(frame, rapid=False, only_changed=False)
+    assert sim.stats['received'] == 2 * tc.tile_count + 1
+
+
+def test_failed_send_is_not_remembered(chain):
+    sim, tc, vtc = chain
+    frame = {0: [RED] * 64}
+    vtc.faults = Faults(loss=1.)
+    tc.set_tilechain_colors(frame, rapid=False)
+    vtc.faults = None
+
+    tc.set_tilechain_colors(frame, rapid=False)
+    assert vtc.tiles[0].colors == [RED] * 64
+
+
+def test_lost_rapid_send_is_repaired(chain, wait_for):
+    sim, tc, vtc = chain
+    frame = {0: [BLUE] * 64}
+    vtc.faults = Faults(loss=1.)
+    tc.set_tilechain_colors(frame)
+    time.sleep(.1)
+    vtc.faults = None
+
+    sim.stats.clear()
+    for _ in range(RESEND_AFTER - 1):
+        tc.set_tilechain_colors(frame)
+    time.sleep(.1)
+    assert not sim.stats['received']
+
+    tc.set_tilechain_colors(frame)
+    assert wait_for(lambda: vtc.tiles[0].colors == [BLUE] * 64)
+    assert sim.stats['received'] == 1
+
+
+def test_acked_tiles_are_not_resent(chain):
+    sim, tc, vtc = chain
+    frame = {0: [RED] * 64}
+    tc.set_tilechain_colors(frame, rapid=False)
+    for _ in range(2 * RESEND_AFTER):
+        tc.set_tilechain_colors(frame)
+    assert sim.stats['received'] == 1
+
+
+def test_recolor_forgets_sent_tiles(chain):
+    sim, tc, vtc = chain
+    frame = {0: [RED] * 64}
+    tc.set_tilechain_colors(frame, rapid=False)
+    tc.set_color(Colors.BLUE, rapid=False)
+    tc.set_tilechain_colors(frame, rapid=False)
+    assert vtc.tiles[0].colors == [RED] * 64
+    assert vtc.tiles[1].colors == [BLUE] * 64
+
+
+def test_framebuffer_flush_skips_unchanged_tiles(chain):
+    sim, tc, vtc = chain
+    fb = tc.framebuffer()
+    fb.flush(rapid=False)
+    assert sim.stats['received'] == tc.tile_count
+    fb.flush(rapid=False)
+    assert sim.stats['received'] == tc.tile_count
@@ -0,0 +1,86 @@
+from collections import Counter
+from threading import Thread, Lock
+
+import pytest
+
+from lifxlan3.utils import SharedExecutor, WaitPool
+
+__author__ = 'acushner'
+
+TIMEOUT_SECS = 5.
+
+
+@pytest.fixture
+def executor():
+    res = SharedExecutor(max_workers=2)
+    yield res
+    res.shutdown(wait=False)  # don't hang the run on a deadlocked pool
+
+
+def _in_thread(fn):
+    """run `fn` on its own thread and return its result, failing instead of hanging if it deadlocks"""
+    res = []
+    t = Thread(target=lambda: res.append(fn()), daemon=True)
+    t.start()
+    t.join(TIMEOUT_SECS)
+    assert not t.is_alive(), 'deadlocked'
+    return res[0]
+
+
+# ======================================================================================================================
+# SHARED EXECUTOR
+
+def test_nested_waits_do_not_deadlock(executor):
+    runs = Counter()
+    lock = Lock()
+
+    def fan_out(depth, path):
+        with lock:
+            runs[path] += 1
+        if not depth:
+            return 1
+        futures = [executor.submit(fan_out, depth - 1, path + (i,)) for i in range(4)]
+        executor.wait(futures)
+        return sum(f.result() for f in futures)
+
+    def main():
+        futures = [executor.submit(fan_out, 3, (i,)) for i in range(4)]  # more than there are pool threads
+        executor.wait(futures)
+        return [f.result() for f in futures]
+
+    assert _in_thread(main) == [4 ** 3] * 4
+    assert len(runs) == 4 + 4 ** 2 + 4 ** 3 + 4 ** 4
+    assert set(runs.values()) == {1}, 'every task runs exactly once'
+
+
+def test_wait_surfaces_exceptions(executor):
+    def fail():
+        raise ValueError('nope')
+
+    fut = executor.submit(fail)
+    executor.wait([fut])
+    with pytest.raises(ValueError):
+        fut.result()
+
+
+# ======================================================================================================================
+# WAIT POOL
+
+def test_wait_pool_nests_on_the_shared_executor(executor):
+    def inner(i):
+        with WaitPool(executor) as wp:
+            wp.map(lambda x: x * i, range(3))
+        return sum(wp.results)
+
+    def main():
+        with WaitPool(executor) as wp:
+            for i in range(6):
+                wp.submit(inner, i)
+        return wp.results
+
+    assert _in_thread(main) == [3 * i for i in range(6)]
+
+
+def test_wait_pool_rejects_unknown_pools():
+    with pytest.raises(ValueError):
+        WaitPool('threads')